@@ -1,6 +1,13 @@
-import streamlit as st
-import requests
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
 
 st.set_page_config(page_title="Wakanda Control Center", layout="wide", page_icon="🏙️")
 
@@ -8,6 +15,11 @@ st.title("🏙️ Wakanda Smart City - Panel de Control")
 st.markdown("**Conectado vía API Gateway (Entrada Unificada)**")
 
 GATEWAY_URL = os.getenv("GATEWAY_URL", "http://gateway_api:8080")
+REQUEST_TIMEOUT = float(os.getenv("DASHBOARD_REQUEST_TIMEOUT", 3.0))
+# Los datos en vivo se comparten entre todos los operadores durante este tiempo.
+CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", 2.0))
+REFRESH_SECONDS = int(os.getenv("DASHBOARD_REFRESH_SECONDS", 5))
+HISTORY_POINTS = int(os.getenv("DASHBOARD_HISTORY_POINTS", 360))
 
 SERVICES = {
     "trafico":   f"{GATEWAY_URL}/gestion_trafico",
@@ -17,6 +29,134 @@ SERVICES = {
     "seguridad": f"{GATEWAY_URL}/seguridad_vigilancia"
 }
 
+# Paneles en vivo: el snapshot trae las cinco secciones en una sola llamada al Gateway.
+LIVE_PANELS = {
+    "snapshot": f"{GATEWAY_URL}/city/snapshot",
+    "traffic_summary": f"{SERVICES['trafico']}/summary",
+}
+
+
+@st.cache_resource
+def http_session() -> requests.Session:
+    """Una sesión para todo el proceso: Streamlit relanza el script en cada interacción y así se
+    reutilizan las conexiones keep-alive al Gateway en lugar de abrir una por petición."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def fetch_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=len(LIVE_PANELS), thread_name_prefix="dashboard-fetch")
+
+
+def get_json(session: requests.Session, url: str) -> dict:
+    try:
+        r = session.get(url, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+    except (requests.RequestException, ValueError) as e:
+        return {"error": str(e)}
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_live() -> dict:
+    """Todos los paneles en paralelo. La caché es común a todas las sesiones: N operadores con el
+    modo en vivo generan una consulta al Gateway por TTL, no N."""
+    session, pool = http_session(), fetch_pool()
+    futures = {name: pool.submit(get_json, session, url) for name, url in LIVE_PANELS.items()}
+    data = {name: future.result() for name, future in futures.items()}
+    data["fetched_at"] = time.time()
+    return data
+
+
+class CityHistory:
+    """Serie temporal común a todas las sesiones: cada consulta nueva añade un punto; el histórico
+    no se vuelve a pedir al backend."""
+
+    def __init__(self, size: int):
+        self.points = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.last_fetch = None
+
+    def record(self, data: dict):
+        summary = data["traffic_summary"]
+        energy = data["snapshot"].get("sections", {}).get("energy", {}).get("data", {})
+        with self.lock:
+            # Las sesiones que leen la misma entrada de la caché no duplican el punto.
+            if data["fetched_at"] == self.last_fetch:
+                return
+            self.last_fetch = data["fetched_at"]
+            self.points.append({
+                "hora": pd.Timestamp.fromtimestamp(data["fetched_at"]),
+                "vehículos": summary.get("total_vehicles"),
+                "velocidad media (km/h)": summary.get("average_speed_kmh"),
+                "carga (MW)": energy.get("total_load_mw"),
+            })
+
+    def frame(self) -> pd.DataFrame:
+        with self.lock:
+            return pd.DataFrame(list(self.points)).set_index("hora") if self.points else pd.DataFrame()
+
+
+@st.cache_resource
+def city_history() -> CityHistory:
+    return CityHistory(HISTORY_POINTS)
+
+
+def section_metric(column, label: str, section: dict, value, detail: str = ""):
+    if section.get("status") == "ok":
+        column.metric(label, value)
+        column.caption(detail)
+    else:
+        column.metric(label, "—")
+        column.caption(f"⚠️ {section.get('status', 'sin datos')}")
+
+
+def live_overview():
+    data = fetch_live()
+    snapshot = data["snapshot"]
+    if "error" in snapshot:
+        st.error(f"Error de conexión con el Gateway: {snapshot['error']}")
+        return
+    summary = data["traffic_summary"]
+    if "error" not in summary:
+        city_history().record(data)
+
+    sections = snapshot.get("sections", {})
+    energy, water, waste, security = (sections.get(name, {}) for name in ("energy", "water", "waste", "security"))
+    grid = energy.get("data", {})
+    col1, col2, col3, col4, col5 = st.columns(5)
+    section_metric(col1, "🚦 Vehículos en la ciudad", {"status": "error" if "error" in summary else "ok"},
+                   f"{summary.get('total_vehicles', 0):,}", f"{summary.get('average_speed_kmh', 0)} km/h de media")
+    section_metric(col2, "⚡ Carga total", energy, f"{grid.get('total_load_mw', 0):,.1f} MW",
+                   f"{grid.get('renewable_contribution_percent', 0)} % renovable")
+    section_metric(col3, "💧 Red de agua", water, water.get("data", {}).get("status", "—"),
+                   f"{water.get('data', {}).get('leaking_sensors', 0)} sensores en fuga")
+    section_metric(col4, "♻️ Contenedores ≥ 70 %", waste, waste.get("data", {}).get("total", 0))
+    section_metric(col5, "🛡️ Eventos recientes", security, len(security.get("data", {}).get("items", [])))
+
+    frame = city_history().frame()
+    if not frame.empty:
+        chart1, chart2 = st.columns(2)
+        chart1.line_chart(frame[["vehículos"]])
+        chart2.line_chart(frame[["carga (MW)"]])
+    st.caption(f"Actualizado a las {time.strftime('%H:%M:%S', time.localtime(data['fetched_at']))} · "
+               f"datos compartidos entre operadores durante {CACHE_TTL:g} s")
+
+
+st.sidebar.header("Vista general")
+live = st.sidebar.toggle("🔴 Modo en vivo", value=False)
+interval = st.sidebar.slider("Refresco (s)", 2, 60, REFRESH_SECONDS, disabled=not live)
+
+# Solo el fragmento se vuelve a ejecutar en cada refresco; las pestañas y formularios no.
+fragment = getattr(st, "fragment", None) or st.experimental_fragment
+fragment(run_every=interval if live else None)(live_overview)()
+st.divider()
+
+session = http_session()
 
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["🚦 Tráfico", "⚡ Energía", "💧 Agua", "♻️ Residuos", "🛡️ Seguridad"])
 
@@ -28,7 +168,7 @@ with tab1:
         st.subheader("Estado Intersecciones")
         if st.button("🔄 Consultar Estado (GET)"):
             try:
-                r = requests.get(f"{SERVICES['trafico']}/traffic/status")
+                r = session.get(f"{SERVICES['trafico']}/traffic/status", timeout=REQUEST_TIMEOUT)
                 if r.status_code == 200:
                     st.success("Conexión OK vía Gateway")
                     st.json(r.json())
@@ -52,7 +192,7 @@ with tab1:
                     "duration": tiempo_verde
                 }
                 try:
-                    r = requests.post(f"{SERVICES['trafico']}/traffic/adjust", json=payload)
+                    r = session.post(f"{SERVICES['trafico']}/traffic/adjust", json=payload, timeout=REQUEST_TIMEOUT)
                     st.info(f"Respuesta: {r.status_code}")
                     st.json(r.json())
                 except Exception as e:
@@ -63,7 +203,7 @@ with tab2:
 
     if st.button("⚡ Consultar Grid (GET)"):
         try:
-            r = requests.get(f"{SERVICES['energia']}/energy/grid")
+            r = session.get(f"{SERVICES['energia']}/energy/grid", timeout=REQUEST_TIMEOUT)
             st.json(r.json())
         except Exception as e:
             st.error(f"Error: {e}")
@@ -75,8 +215,8 @@ with tab2:
         kwh = st.number_input("Consumo (kWh)", 0.0, 1000.0, 150.5)
         if st.form_submit_button("Enviar Lectura"):
             try:
-                r = requests.post(f"{SERVICES['energia']}/energy/report",
-                                  json={"meter_id": medidor, "consumption": kwh})
+                r = session.post(f"{SERVICES['energia']}/energy/report",
+                                  json={"meter_id": medidor, "consumption": kwh}, timeout=REQUEST_TIMEOUT)
                 st.success("Lectura enviada")
                 st.json(r.json())
             except Exception as e:
@@ -89,8 +229,8 @@ with tab3:
     zona = st.selectbox("Zona Afectada", ["Norte", "Sur", "Centro", "Puerto"])
     if st.button("🚨 Reportar Fuga (POST)"):
         try:
-            r = requests.post(f"{SERVICES['agua']}/water/leak_alert",
-                              json={"zone": zona, "severity": "high"})
+            r = session.post(f"{SERVICES['agua']}/water/leak_alert",
+                              json={"zone": zona, "severity": "high"}, timeout=REQUEST_TIMEOUT)
             st.warning(f"Alerta enviada para zona {zona}")
             st.json(r.json())
         except Exception as e:
@@ -101,12 +241,15 @@ with tab4:
     st.header("Recogida de Residuos")
     if st.button("🗑️ Estado Contenedores (GET)"):
         try:
-            r = requests.get(f"{SERVICES['residuos']}/waste/containers")
+            r = session.get(f"{SERVICES['residuos']}/waste/containers", timeout=REQUEST_TIMEOUT)
             data = r.json()
 
             st.write("📦 Datos recibidos del camión:")
 
-            if isinstance(data, list):
+            if isinstance(data, dict) and "items" in data:
+                st.success(f"Se han detectado {data['total']} contenedores (mostrando {len(data['items'])}).")
+                st.table(data["items"])
+            elif isinstance(data, list):
                 st.success(f"Se han detectado {len(data)} contenedores.")
                 st.table(data)
             else:
@@ -123,8 +266,8 @@ with tab5:
         st.write("Últimos Eventos")
         if st.button("Actualizar Eventos"):
             try:
-                r = requests.get(f"{SERVICES['seguridad']}/security/events")
-                st.table(r.json())
+                r = session.get(f"{SERVICES['seguridad']}/security/events", params={"limit": 50}, timeout=REQUEST_TIMEOUT)
+                st.table(r.json()["items"])
             except:
                 st.warning("No se pudo conectar con Seguridad")
 
@@ -132,8 +275,8 @@ with tab5:
         st.error("Panel de Emergencia")
         if st.button("📢 ALERTA GENERAL"):
             try:
-                r = requests.post(f"{SERVICES['seguridad']}/security/alert",
-                                  json={"type": "GENERAL", "location": "ALL"})
+                r = session.post(f"{SERVICES['seguridad']}/security/alert",
+                                  json={"type": "GENERAL", "location": "ALL"}, timeout=REQUEST_TIMEOUT)
                 st.toast("¡Alerta General Enviada!")
                 st.json(r.json())
             except Exception as e:
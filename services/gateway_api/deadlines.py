@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Dict, List, Mapping, Set, Tuple, TypeVar
+
+import httpx
+from prometheus_client import Counter
+
+from services.gateway_api.upstream_pool import CONNECT_TIMEOUT, POOL_TIMEOUT, READ_TIMEOUT, WRITE_TIMEOUT
+
+# Presupuesto restante en milisegundos; el cliente lo envía y el Gateway lo reenvía descontado.
+DEADLINE_HEADER = os.getenv("GATEWAY_DEADLINE_HEADER", "x-deadline-ms").lower()
+DEFAULT_DEADLINE = float(os.getenv("GATEWAY_DEFAULT_DEADLINE", 10.0))
+MAX_DEADLINE = float(os.getenv("GATEWAY_MAX_DEADLINE", 60.0))
+# Deadlines por ruta: "servicio/ruta=segundos" separadas por comas.
+DEADLINE_ROUTES = os.getenv("GATEWAY_DEADLINE_ROUTES", "gestion_energia/energy/readings/bulk=60")
+
+DEADLINES_EXCEEDED = Counter(
+    "gateway_deadline_exceeded_total",
+    "Peticiones abandonadas por agotar su deadline",
+    ["service"],
+)
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el tiempo de la petición; el trabajo pendiente ya se ha cancelado."""
+
+
+def parse_route_deadlines(spec: str) -> Dict[str, float]:
+    routes = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        route, seconds = item.rsplit("=", 1)
+        routes[route.strip().strip("/")] = min(float(seconds), MAX_DEADLINE)
+    return routes
+
+
+class Deadline:
+    """Instante absoluto (reloj monotónico) en el que la petición deja de tener sentido."""
+
+    __slots__ = ("expires_at", "_armed")
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+        self._armed: Set[asyncio.Task] = set()
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def headers(self) -> List[Tuple[str, str]]:
+        """Cabecera con el presupuesto que le queda al upstream."""
+        return [(DEADLINE_HEADER, str(int(self.remaining() * 1000)))]
+
+    def timeout(self) -> httpx.Timeout:
+        """Timeouts por fase del pool recortados a lo que queda de deadline."""
+        remaining = self.remaining()
+        return httpx.Timeout(
+            connect=min(CONNECT_TIMEOUT, remaining),
+            read=min(READ_TIMEOUT, remaining),
+            write=min(WRITE_TIMEOUT, remaining),
+            pool=min(POOL_TIMEOUT, remaining),
+        )
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """
+        Espera el resultado como mucho hasta el deadline; si se agota, cancela y lanza DeadlineExceeded.
+
+        Programa la cancelación de la propia tarea con call_at en lugar de usar asyncio.wait_for, que
+        crea una tarea por llamada; un run() anidado en la misma tarea lo vigila ya el exterior.
+        """
+        task = asyncio.current_task()
+        if task in self._armed:
+            return await awaitable
+        if self.remaining() <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded()
+        expired = False
+
+        def expire():
+            nonlocal expired
+            expired = True
+            task.cancel()
+
+        # El reloj del bucle es time.monotonic, el mismo que el de expires_at.
+        handle = asyncio.get_running_loop().call_at(self.expires_at, expire)
+        self._armed.add(task)
+        try:
+            return await awaitable
+        except asyncio.CancelledError:
+            if not expired:
+                raise
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            raise DeadlineExceeded() from None
+        finally:
+            handle.cancel()
+            self._armed.discard(task)
+
+
+class DeadlinePolicy:
+    """Deadline de cada petición: la cabecera del cliente o, si no la envía, el de la ruta."""
+
+    def __init__(self, routes: Dict[str, float], default: float = DEFAULT_DEADLINE, maximum: float = MAX_DEADLINE):
+        self.routes = routes
+        self.default = default
+        self.maximum = maximum
+
+    def for_request(self, route: str, headers: Mapping[str, str]) -> Deadline:
+        requested = headers.get(DEADLINE_HEADER)
+        if requested is not None:
+            try:
+                return Deadline.after(min(max(float(requested), 0.0) / 1000, self.maximum))
+            except ValueError:
+                pass
+        return self.for_route(route)
+
+    def for_route(self, route: str) -> Deadline:
+        """Deadline del servidor para la ruta, sin tener en cuenta al cliente (trabajo compartido)."""
+        return Deadline.after(self.routes.get(route, self.default))
+
+
+deadline_policy = DeadlinePolicy(parse_route_deadlines(DEADLINE_ROUTES))
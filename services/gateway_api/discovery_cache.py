@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from prometheus_client import Counter
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger("gateway_api.discovery_cache")
+
+DISCOVERY_TTL = float(os.getenv("GATEWAY_DISCOVERY_TTL", 15.0))
+DISCOVERY_NEGATIVE_TTL = float(os.getenv("GATEWAY_DISCOVERY_NEGATIVE_TTL", 2.0))
+# Tope de 404 recordados: cualquier cliente puede pedir nombres de servicio inventados.
+DISCOVERY_MAX_NEGATIVE = int(os.getenv("GATEWAY_DISCOVERY_MAX_NEGATIVE", 1024))
+
+DISCOVERY_LOOKUPS = Counter(
+    "gateway_discovery_lookups_total",
+    "Resoluciones de servicio en la caché de discovery por resultado",
+    ["result"],
+)
+DISCOVERY_REFRESH_ERRORS = Counter(
+    "gateway_discovery_refresh_errors_total",
+    "Consultas al Service Registry fallidas (se sirven las últimas instancias conocidas)",
+)
+
+
+class RegistryUnavailable(Exception):
+    """El Service Registry no respondió; distinto de 'servicio no registrado'."""
+
+
+class _Entry:
+    __slots__ = ("instances", "fetched_at", "expires_at")
+
+    def __init__(self, instances: Optional[List[str]], ttl: float):
+        now = time.monotonic()
+        self.instances = instances
+        self.fetched_at = now
+        self.expires_at = now + ttl
+
+
+class DiscoveryCache:
+    """
+    Caché local de resoluciones del Service Registry.
+
+    - Entradas frescas se sirven sin tocar la red.
+    - Entradas caducadas se sirven igualmente y se refrescan en segundo plano
+      (stale-while-revalidate).
+    - Los 404 se cachean durante DISCOVERY_NEGATIVE_TTL, hasta max_negative nombres.
+    - Búsquedas concurrentes del mismo servicio comparten una única consulta.
+    - Si el registro cae, se mantienen las últimas instancias conocidas.
+    """
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Optional[List[str]]]],
+                 ttl: float = DISCOVERY_TTL, negative_ttl: float = DISCOVERY_NEGATIVE_TTL,
+                 max_negative: int = DISCOVERY_MAX_NEGATIVE):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_negative = max_negative
+        self.entries: Dict[str, _Entry] = {}
+        # Entradas negativas en orden de inserción; con un único TTL, también en orden de caducidad.
+        self._negative: "OrderedDict[str, None]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, service_name: str) -> Optional[List[str]]:
+        entry = self.entries.get(service_name)
+        if entry is not None:
+            if time.monotonic() < entry.expires_at:
+                DISCOVERY_LOOKUPS.labels(result="hit" if entry.instances else "negative_hit").inc()
+                return entry.instances
+            if entry.instances is not None:
+                DISCOVERY_LOOKUPS.labels(result="stale").inc()
+                self._load(service_name)
+                return entry.instances
+
+        DISCOVERY_LOOKUPS.labels(result="miss").inc()
+        return await asyncio.shield(self._load(service_name))
+
+    def invalidate(self, service_name: str):
+        """Marca la entrada como caducada para que la próxima búsqueda la refresque."""
+        entry = self.entries.get(service_name)
+        if entry is not None:
+            entry.expires_at = 0.0
+
+    def _load(self, service_name: str) -> asyncio.Task:
+        task = self._inflight.get(service_name)
+        if task is None:
+            task = asyncio.create_task(self._refresh(service_name))
+            self._inflight[service_name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(service_name, None))
+        return task
+
+    async def _refresh(self, service_name: str) -> Optional[List[str]]:
+        try:
+            instances = await self._fetch(service_name)
+        except Exception as e:
+            # Cualquier fallo de la consulta cuenta como registro caído: si escapara, el refresco en
+            # segundo plano (nadie lo espera) acabaría en "Task exception was never retrieved".
+            DISCOVERY_REFRESH_ERRORS.inc()
+            if not isinstance(e, RegistryUnavailable):
+                logger.exception(f"Error inesperado resolviendo {service_name}")
+            entry = self.entries.get(service_name)
+            if entry is not None and entry.instances is not None:
+                # Se reintenta tras negative_ttl en lugar de en cada petición.
+                entry.expires_at = time.monotonic() + self.negative_ttl
+                logger.warning(f"⚠️ Registry no disponible, usando últimas instancias conocidas de {service_name}")
+                return entry.instances
+            return None
+
+        if not instances:
+            self._remember_missing(service_name)
+            return None
+        self._negative.pop(service_name, None)
+        self.entries[service_name] = _Entry(instances, self.ttl)
+        return instances
+
+    def _remember_missing(self, service_name: str):
+        """Cachea un 404 descartando los negativos caducados y, si sigue lleno, los más antiguos."""
+        self._negative.pop(service_name, None)
+        now = time.monotonic()
+        while self._negative:
+            oldest = next(iter(self._negative))
+            if len(self._negative) < self.max_negative and self.entries[oldest].expires_at > now:
+                break
+            del self._negative[oldest]
+            del self.entries[oldest]
+        if self.max_negative > 0:
+            self.entries[service_name] = _Entry(None, self.negative_ttl)
+            self._negative[service_name] = None
+        else:
+            self.entries.pop(service_name, None)
+
+
+class DiscoveryCacheCollector:
+    """Antigüedad de cada entrada en el momento del scrape."""
+
+    def __init__(self, cache: DiscoveryCache):
+        self.cache = cache
+
+    def collect(self):
+        age = GaugeMetricFamily(
+            "gateway_discovery_entry_age_seconds",
+            "Segundos desde la última resolución correcta de cada servicio",
+            labels=["service"],
+        )
+        stale = GaugeMetricFamily(
+            "gateway_discovery_entry_stale",
+            "1 si la entrada ha superado su TTL y está pendiente de refresco",
+            labels=["service"],
+        )
+        instances = GaugeMetricFamily(
+            "gateway_discovery_instances",
+            "Instancias sanas conocidas de cada servicio",
+            labels=["service"],
+        )
+        now = time.monotonic()
+        for name, entry in list(self.cache.entries.items()):
+            if entry.instances is None:
+                continue
+            age.add_metric([name], now - entry.fetched_at)
+            stale.add_metric([name], 1.0 if now >= entry.expires_at else 0.0)
+            instances.add_metric([name], len(entry.instances))
+        yield age
+        yield stale
+        yield instances
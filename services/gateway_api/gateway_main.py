@@ -1,77 +1,239 @@
+import asyncio
 import httpx
 import logging
 import os
+import time
 import aiobreaker
 from fastapi import FastAPI, HTTPException, Request, Response
-from datetime import timedelta
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+from prometheus_client import REGISTRY as METRICS_REGISTRY
+
+from services.gateway_api.deadlines import DEADLINES_EXCEEDED, Deadline, DeadlineExceeded, deadline_policy
+from services.gateway_api.discovery_cache import DiscoveryCache, DiscoveryCacheCollector, RegistryUnavailable
+from services.gateway_api.load_balancer import load_balancer
+from services.gateway_api.response_cache import response_cache
+from services.gateway_api.resilience import BulkheadFull, CircuitOpen, UpstreamServerError, upstream_guards
+from services.gateway_api.retries import retry_policy
+from services.gateway_api.streaming_proxy import buffered_error_response, stream_proxy
+from services.gateway_api.upstream_pool import upstream_pool
 
 try:
+    from wakanda_shared.diagnostics import setup_diagnostics
     from wakanda_shared.telemetry import setup_telemetry
 except ImportError:
-    def setup_telemetry(app, name):
+    def setup_telemetry(app, name, **kwargs):
+        pass
+
+    def setup_diagnostics(app):
         pass
 
 SERVICE_NAME = "gateway_api"
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://service_registry:8000")
+# "stream": reenvío byte a byte (estado, cabeceras y query intactos). "json": modo clásico.
+PROXY_MODE = os.getenv("GATEWAY_PROXY_MODE", "stream")
+SNAPSHOT_TIMEOUT = float(os.getenv("GATEWAY_SNAPSHOT_TIMEOUT", 1.5))
+
+# sección -> (servicio, ruta, deadline en segundos)
+SNAPSHOT_SECTIONS = {
+    "traffic": ("gestion_trafico", "status", SNAPSHOT_TIMEOUT),
+    "energy": ("gestion_energia", "energy/grid", SNAPSHOT_TIMEOUT),
+    "water": ("gestion_agua", "water/pressure", SNAPSHOT_TIMEOUT),
+    "waste": ("gestion_residuos", "waste/containers?min_fill=70&limit=20", SNAPSHOT_TIMEOUT),
+    "security": ("seguridad_vigilancia", "security/events?limit=20", SNAPSHOT_TIMEOUT),
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await upstream_pool.start(REGISTRY_URL)
+    yield
+    await upstream_pool.aclose()
+
+
+def is_registered_service(service_name: str) -> bool:
+    """Solo los servicios con instancias conocidas dan nombre a una serie de métricas."""
+    entry = discovery_cache.entries.get(service_name)
+    return entry is not None and bool(entry.instances)
+
+
+app = FastAPI(title="Wakanda Gateway", lifespan=lifespan)
+setup_telemetry(app, SERVICE_NAME, label_params={"service_name": is_registered_service})
+setup_diagnostics(app)
+
+async def fetch_service_instances(service_name: str) -> Optional[List[str]]:
+    """Consulta al Service Registry las URLs de las instancias sanas de un microservicio."""
+    try:
+        resp = await upstream_pool.request("GET", f"{REGISTRY_URL}/discover/{service_name}")
+    except httpx.RequestError as e:
+        logging.error("❌ No se puede contactar con el Service Registry")
+        raise RegistryUnavailable(str(e)) from e
+
+    if resp.status_code == 200:
+        data = resp.json()
+        return data.get("instances") or [data["url"]]
+    if resp.status_code == 404:
+        return None
+    raise RegistryUnavailable(f"Registry respondió {resp.status_code}")
+
+
+discovery_cache = DiscoveryCache(fetch_service_instances)
+METRICS_REGISTRY.register(DiscoveryCacheCollector(discovery_cache))
+
+
+async def get_service_url(service_name: str) -> Optional[str]:
+    """Resuelve la URL de una instancia del microservicio (caché de discovery + balanceador)."""
+    instances = await discovery_cache.get(service_name)
+    if not instances:
+        return None
+    return load_balancer.choose(service_name, instances)
+
+
+def instance_picker(service_name: str, first_base_url: str, path: str) -> Callable[[], Awaitable[str]]:
+    """El primer intento va a la instancia ya elegida; reintentos y hedges vuelven a pasar por el balanceador."""
+    first = [first_base_url]
 
-app = FastAPI(title="Wakanda Gateway")
-setup_telemetry(app, SERVICE_NAME)
+    async def pick() -> str:
+        base_url = first.pop() if first else (await get_service_url(service_name) or first_base_url)
+        return f"{base_url}/{path}"
 
-circuit_breaker = aiobreaker.CircuitBreaker(
-    fail_max=3,
-    timeout_duration=timedelta(seconds=30)
-)
+    return pick
 
 
-async def get_service_url(service_name: str) -> str:
-    """Consulta al Service Registry la URL de un microservicio."""
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(f"{REGISTRY_URL}/discover/{service_name}")
-            if resp.status_code == 200:
-                return resp.json()["url"]
-            else:
-                return None
-        except httpx.RequestError:
-            logging.error("❌ No se puede contactar con el Service Registry")
-            return None
+async def send_request(method: str, url: str, deadline: Deadline, json_data=None):
+    response = await upstream_pool.request(method, url, json=json_data, headers=deadline.headers(),
+                                           timeout=deadline.timeout())
+    response.raise_for_status()
+    return response
 
 
-@circuit_breaker
-async def make_request(method: str, url: str, json_data=None):
+async def make_request(service_name: str, method: str, url: str, deadline: Deadline, json_data=None):
+    """Envía la petición protegida por el breaker y el bulkhead de esa instancia."""
+    guard = upstream_guards.guard_for(service_name, url)
+    return await guard.call(send_request, method, url, deadline, json_data)
 
-    async with httpx.AsyncClient() as client:
-        response = await client.request(method, url, json=json_data)
-        response.raise_for_status()
-        return response
 
+async def request_upstream(service_name: str, route: str, method: str, pick: Callable[[], Awaitable[str]],
+                           deadline: Deadline, json_data=None):
+    """make_request con deadline; los GET se reintentan y, si la ruta lo tiene activado, se duplican (hedging)."""
+    async def attempt():
+        return await make_request(service_name, method, await pick(), deadline, json_data)
 
+    return await retry_policy.call(service_name, route, attempt, deadline, idempotent=method == "GET")
 
-@app.api_route("/{service_name}/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+
+async def fetch_section(service_name: str, path: str, deadline: Deadline):
+    target_base_url = await get_service_url(service_name)
+    if not target_base_url:
+        raise LookupError(f"Service '{service_name}' not found in registry")
+    route = f"{service_name}/{path.split('?', 1)[0]}"
+    upstream_response = await request_upstream(service_name, route, "GET",
+                                               instance_picker(service_name, target_base_url, path), deadline)
+    return upstream_response.json()
+
+
+async def snapshot_section(service_name: str, path: str, timeout: float) -> dict:
+    """Obtiene una sección del snapshot; nunca lanza, informa del fallo en 'status'."""
+    started = time.perf_counter()
+    section = {"service": service_name}
+    deadline = Deadline.after(timeout)
+    try:
+        section["data"] = await deadline.run(fetch_section(service_name, path, deadline))
+        section["status"] = "ok"
+    except DeadlineExceeded:
+        DEADLINES_EXCEEDED.labels(service_name).inc()
+        section["status"] = "timeout"
+    except aiobreaker.CircuitBreakerError:
+        section["status"] = "circuit_open"
+    except BulkheadFull:
+        section["status"] = "saturated"
+    except LookupError as e:
+        section["status"] = "not_registered"
+        section["detail"] = str(e)
+    except httpx.HTTPStatusError as e:
+        section["status"] = "error"
+        section["detail"] = f"Upstream respondió {e.response.status_code}"
+    except httpx.RequestError:
+        discovery_cache.invalidate(service_name)
+        section["status"] = "unreachable"
+    section["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return section
+
+
+@app.get("/city/snapshot")
+async def city_snapshot():
+    """Estado de toda la ciudad en una sola llamada: las cinco secciones se piden en paralelo."""
+    names = list(SNAPSHOT_SECTIONS)
+    sections = await asyncio.gather(*(snapshot_section(*SNAPSHOT_SECTIONS[name]) for name in names))
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "complete": all(section["status"] == "ok" for section in sections),
+        "sections": dict(zip(names, sections)),
+    }
+
+
+@app.api_route("/{service_name}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
 async def gateway_proxy(service_name: str, path: str, request: Request):
 
+    cache_route = response_cache.route_for(service_name, path, request.headers) if request.method == "GET" else None
+    cache_key = f"{service_name}/{path}?{request.url.query}"
+    if cache_route is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached.to_response(request, "HIT")
+
     target_base_url = await get_service_url(service_name)
 
     if not target_base_url:
         raise HTTPException(status_code=503, detail=f"Service '{service_name}' not found in registry")
 
-    target_url = f"{target_base_url}/{service_name}/{path}"
-    target_url = f"{target_base_url}/{path}"
-
-    body = await request.json() if request.method in ["POST", "PUT"] else None
+    route = f"{service_name}/{path.strip('/')}"
+    deadline = deadline_policy.for_request(route, request.headers)
+    pick = instance_picker(service_name, target_base_url, path)
 
     try:
-        upstream_response = await make_request(request.method, target_url, body)
+        if cache_route is not None:
+            query = f"?{request.url.query}" if request.url.query else ""
+            # La carga la comparten todas las peticiones agrupadas: usa el deadline de la ruta, no el de
+            # quien llegó primero. Cada cliente solo acota con el suyo su propia espera (fetch usa shield).
+            entry, cache_status = await deadline.run(response_cache.fetch(
+                cache_route, cache_key,
+                lambda: request_upstream(service_name, route, "GET",
+                                         instance_picker(service_name, target_base_url, f"{path}{query}"),
+                                         deadline_policy.for_route(route))
+            ))
+            return entry.to_response(request, cache_status)
+
+        if PROXY_MODE == "stream":
+            return await stream_proxy(service_name, route, pick, request, deadline)
+
+        body = await request.json() if request.method in ["POST", "PUT"] else None
+        upstream_response = await request_upstream(service_name, route, request.method, pick, deadline, body)
         return upstream_response.json()
 
-    except aiobreaker.CircuitBreakerError:
-        logging.warning(f"🔥 Circuit Breaker Abierto para {service_name}")
-        raise HTTPException(status_code=503, detail="Service temporarily unavailable (Circuit Breaker Open)")
+    except DeadlineExceeded:
+        DEADLINES_EXCEEDED.labels(service_name).inc()
+        raise HTTPException(status_code=504, detail=f"Deadline exceeded calling '{service_name}'")
+
+    except CircuitOpen as e:
+        # Con reintentos y balanceo, el breaker que rechazó puede no ser el de la primera instancia elegida.
+        logging.warning(f"🔥 Circuit Breaker Abierto para {service_name} ({e.instance})")
+        raise HTTPException(status_code=503, detail="Service temporarily unavailable (Circuit Breaker Open)",
+                            headers={"Retry-After": str(e.retry_after)})
+
+    except BulkheadFull as e:
+        raise HTTPException(status_code=503, detail=f"Service '{service_name}' saturated ({e.reason})",
+                            headers={"Retry-After": str(e.retry_after)})
+
+    except UpstreamServerError as e:
+        return buffered_error_response(e)
 
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
 
     except httpx.RequestError:
+        discovery_cache.invalidate(service_name)
         raise HTTPException(status_code=503, detail="Upstream service unreachable")
 
 
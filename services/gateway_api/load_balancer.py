@@ -0,0 +1,58 @@
+import itertools
+import os
+import random
+from typing import Dict, Iterator, List
+from urllib.parse import urlsplit
+
+from prometheus_client import Counter
+
+from services.gateway_api.resilience import UpstreamGuards, upstream_guards
+
+# round_robin | least_outstanding | p2c (power of two choices)
+LB_STRATEGY = os.getenv("GATEWAY_LB_STRATEGY", "p2c")
+
+LB_PICKS = Counter(
+    "gateway_lb_picks_total",
+    "Instancias elegidas por el balanceador",
+    ["service", "instance"],
+)
+
+
+class LoadBalancer:
+    """Elige una instancia entre las sanas devueltas por el registro."""
+
+    def __init__(self, guards: UpstreamGuards, strategy: str = LB_STRATEGY):
+        if strategy not in ("round_robin", "least_outstanding", "p2c"):
+            raise ValueError(f"Estrategia de balanceo desconocida: {strategy}")
+        self.guards = guards
+        self.strategy = strategy
+        self._counters: Dict[str, Iterator[int]] = {}
+
+    def outstanding(self, service_name: str, url: str) -> int:
+        guard = self.guards.peek(service_name, url)
+        return guard.bulkhead.in_flight + guard.bulkhead.waiting if guard is not None else 0
+
+    def _candidates(self, service_name: str, instances: List[str]) -> List[str]:
+        # Las instancias con el breaker abierto solo se usan si no queda ninguna otra.
+        closed = [url for url in instances
+                  if (guard := self.guards.peek(service_name, url)) is None or not guard.is_open()]
+        return closed or instances
+
+    def choose(self, service_name: str, instances: List[str]) -> str:
+        candidates = self._candidates(service_name, instances)
+        if len(candidates) == 1:
+            url = candidates[0]
+        elif self.strategy == "round_robin":
+            counter = self._counters.setdefault(service_name, itertools.count())
+            url = candidates[next(counter) % len(candidates)]
+        elif self.strategy == "least_outstanding":
+            # El desempate aleatorio evita concentrar la carga en la primera instancia.
+            url = min(candidates, key=lambda u: (self.outstanding(service_name, u), random.random()))
+        else:
+            a, b = random.sample(candidates, 2)
+            url = a if self.outstanding(service_name, a) <= self.outstanding(service_name, b) else b
+        LB_PICKS.labels(service_name, urlsplit(url).netloc).inc()
+        return url
+
+
+load_balancer = LoadBalancer(upstream_guards)
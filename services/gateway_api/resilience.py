@@ -0,0 +1,223 @@
+import asyncio
+import math
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiobreaker
+import httpx
+from prometheus_client import REGISTRY, Counter
+from prometheus_client.core import GaugeMetricFamily
+
+BREAKER_FAIL_MAX = int(os.getenv("GATEWAY_BREAKER_FAIL_MAX", 3))
+BREAKER_RESET_SECONDS = float(os.getenv("GATEWAY_BREAKER_RESET_SECONDS", 30.0))
+BULKHEAD_MAX_CONCURRENCY = int(os.getenv("GATEWAY_BULKHEAD_MAX_CONCURRENCY", 50))
+BULKHEAD_MAX_QUEUE = int(os.getenv("GATEWAY_BULKHEAD_MAX_QUEUE", 100))
+BULKHEAD_QUEUE_TIMEOUT = float(os.getenv("GATEWAY_BULKHEAD_QUEUE_TIMEOUT", 0.5))
+
+SHED_REQUESTS = Counter(
+    "gateway_upstream_shed_total",
+    "Peticiones rechazadas sin llegar al upstream",
+    ["service", "instance", "reason"],
+)
+
+
+class BulkheadFull(Exception):
+    """No hay hueco en el bulkhead del upstream (cola llena o espera agotada)."""
+
+    def __init__(self, service_name: str, reason: str):
+        super().__init__(f"{service_name}: {reason}")
+        self.reason = reason
+        self.retry_after = 1
+
+
+class CircuitOpen(aiobreaker.CircuitBreakerError):
+    """El breaker de la instancia rechazó la petición; retry_after sale de ese mismo breaker."""
+
+    def __init__(self, service_name: str, instance: str, retry_after: int, reopen_time: datetime):
+        super().__init__(f"{service_name}@{instance}: circuit open", reopen_time)
+        self.instance = instance
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    """Límite de concurrencia con cola de espera acotada y timeout de cola."""
+
+    def __init__(self, service_name: str, max_concurrency: int = BULKHEAD_MAX_CONCURRENCY,
+                 max_queue: int = BULKHEAD_MAX_QUEUE, queue_timeout: float = BULKHEAD_QUEUE_TIMEOUT):
+        self.service_name = service_name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self):
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise BulkheadFull(self.service_name, "queue_full")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise BulkheadFull(self.service_name, "queue_timeout")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class UpstreamServerError(Exception):
+    """El upstream respondió 5xx; el breaker lo cuenta como fallo."""
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"Upstream respondió {response.status_code}")
+        self.response = response
+
+
+def _is_client_error(exc: Exception) -> bool:
+    # Un 4xx es culpa del cliente, no del upstream: no debe abrir el breaker.
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code < 500
+
+
+class UpstreamGuard:
+    """Circuit breaker + bulkhead de una instancia concreta de un servicio."""
+
+    def __init__(self, service_name: str, instance: str):
+        self.service_name = service_name
+        self.instance = instance
+        self.breaker = aiobreaker.CircuitBreaker(
+            fail_max=BREAKER_FAIL_MAX,
+            timeout_duration=timedelta(seconds=BREAKER_RESET_SECONDS),
+            name=f"{service_name}@{instance}",
+        )
+        self.breaker.add_excluded_exceptions(BulkheadFull, _is_client_error)
+        self.bulkhead = Bulkhead(service_name)
+
+    async def call(self, func, *args, **kwargs):
+        return await self._call(self._guarded, func, *args, **kwargs)
+
+    async def call_stream(self, func, *args, **kwargs) -> Tuple[httpx.Response, Callable[[], None]]:
+        """
+        Como call(), pero el hueco del bulkhead sigue ocupado mientras se
+        transmite el cuerpo: devuelve (respuesta, release) y el llamante
+        debe invocar release() al cerrar la respuesta.
+        """
+        return await self._call(self._guarded_stream, func, *args, **kwargs)
+
+    async def _call(self, guarded, func, *args, **kwargs):
+        try:
+            return await self.breaker.call_async(guarded, func, *args, **kwargs)
+        except BulkheadFull as e:
+            SHED_REQUESTS.labels(self.service_name, self.instance, e.reason).inc()
+            raise
+        except aiobreaker.CircuitBreakerError as e:
+            SHED_REQUESTS.labels(self.service_name, self.instance, "circuit_open").inc()
+            raise CircuitOpen(self.service_name, self.instance, self.retry_after(), e.reopen_time) from e
+
+    async def _guarded(self, func, *args, **kwargs):
+        async with self.bulkhead.slot():
+            return await func(*args, **kwargs)
+
+    async def _guarded_stream(self, func, *args, **kwargs):
+        await self.bulkhead.acquire()
+        try:
+            response = await func(*args, **kwargs)
+        except BaseException:
+            self.bulkhead.release()
+            raise
+        return response, self.bulkhead.release
+
+    def _seconds_until_half_open(self) -> float:
+        # opens_at de aiobreaker mezcla now() y utcnow(); se calcula a partir de opened_at (UTC).
+        opened_at = self.breaker._state_storage.opened_at
+        if opened_at is None:
+            return 0.0
+        return (opened_at + self.breaker.timeout_duration - datetime.utcnow()).total_seconds()
+
+    def is_open(self) -> bool:
+        """True si el breaker rechazaría ahora mismo la petición (abierto y sin agotar el timeout)."""
+        return (self.breaker.current_state == aiobreaker.CircuitBreakerState.OPEN
+                and self._seconds_until_half_open() > 0)
+
+    def retry_after(self) -> int:
+        """Segundos hasta que el breaker vuelva a dejar pasar una petición de prueba."""
+        return max(1, math.ceil(self._seconds_until_half_open()))
+
+
+class UpstreamGuards:
+    """Un UpstreamGuard por (servicio, instancia), creado bajo demanda."""
+
+    def __init__(self):
+        self.guards: Dict[Tuple[str, str], UpstreamGuard] = {}
+
+    def guard_for(self, service_name: str, url: str) -> UpstreamGuard:
+        key = (service_name, urlsplit(url).netloc)
+        guard = self.guards.get(key)
+        if guard is None:
+            guard = self.guards[key] = UpstreamGuard(*key)
+        return guard
+
+    def peek(self, service_name: str, url: str) -> Optional[UpstreamGuard]:
+        """Como guard_for, pero sin crear el guard si la instancia aún no se ha usado."""
+        return self.guards.get((service_name, urlsplit(url).netloc))
+
+
+_BREAKER_STATE_VALUES = {
+    aiobreaker.CircuitBreakerState.CLOSED: 0,
+    aiobreaker.CircuitBreakerState.HALF_OPEN: 1,
+    aiobreaker.CircuitBreakerState.OPEN: 2,
+}
+
+
+class UpstreamGuardsCollector:
+    """Estado del breaker, peticiones en vuelo y en cola de cada upstream."""
+
+    def __init__(self, guards: UpstreamGuards):
+        self.guards = guards
+
+    def collect(self):
+        labels = ["service", "instance"]
+        state = GaugeMetricFamily(
+            "gateway_breaker_state",
+            "Estado del circuit breaker (0=cerrado, 1=semiabierto, 2=abierto)",
+            labels=labels,
+        )
+        in_flight = GaugeMetricFamily(
+            "gateway_upstream_in_flight",
+            "Peticiones en curso hacia el upstream",
+            labels=labels,
+        )
+        waiting = GaugeMetricFamily(
+            "gateway_upstream_queued",
+            "Peticiones esperando hueco en el bulkhead del upstream",
+            labels=labels,
+        )
+        for (service_name, instance), guard in list(self.guards.guards.items()):
+            key = [service_name, instance]
+            state.add_metric(key, _BREAKER_STATE_VALUES.get(guard.breaker.current_state, 0))
+            in_flight.add_metric(key, guard.bulkhead.in_flight)
+            waiting.add_metric(key, guard.bulkhead.waiting)
+        yield state
+        yield in_flight
+        yield waiting
+
+
+upstream_guards = UpstreamGuards()
+REGISTRY.register(UpstreamGuardsCollector(upstream_guards))
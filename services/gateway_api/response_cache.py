@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+import httpx
+from fastapi import Request, Response
+from prometheus_client import REGISTRY, Counter
+from prometheus_client.core import GaugeMetricFamily
+
+from services.gateway_api.streaming_proxy import raw_headers
+from wakanda_shared.snapshot import etag_matches, make_etag
+
+# Rutas cacheables (opt-in, vacío = sin caché): "servicio/ruta=ttl_segundos" separadas por comas.
+CACHE_ROUTES = os.getenv("GATEWAY_CACHE_ROUTES", "")
+CACHE_MAX_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+# Peticiones con credenciales: van siempre al upstream, ni se sirven ni se guardan en caché.
+PRIVATE_REQUEST_HEADERS = ("authorization", "cookie")
+
+CACHE_REQUESTS = Counter(
+    "gateway_response_cache_requests_total",
+    "Peticiones GET a rutas cacheables por resultado",
+    ["route", "result"],
+)
+CACHE_NOT_MODIFIED = Counter(
+    "gateway_response_cache_not_modified_total",
+    "Respuestas 304 servidas por coincidir If-None-Match",
+    ["route"],
+)
+CACHE_EVICTIONS = Counter(
+    "gateway_response_cache_evictions_total",
+    "Entradas expulsadas por superar GATEWAY_CACHE_MAX_BYTES",
+)
+
+
+def is_shareable(response: httpx.Response) -> bool:
+    """Si la respuesta puede servirse a otros clientes: sin Set-Cookie, Cache-Control private/no-store ni Vary."""
+    if "set-cookie" in response.headers:
+        return False
+    cache_control = response.headers.get("cache-control", "")
+    directives = {item.split("=", 1)[0].strip().lower() for item in cache_control.split(",")}
+    if directives & {"private", "no-store", "no-cache"}:
+        return False
+    # La clave no incluye cabeceras de la petición. Accept-Encoding no importa: el cuerpo se guarda descomprimido.
+    vary = {item.strip().lower() for item in response.headers.get("vary", "").split(",")} - {""}
+    return not vary - {"accept-encoding"}
+
+
+def parse_cache_routes(spec: str) -> Dict[str, float]:
+    routes = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        route, ttl = item.rsplit("=", 1)
+        routes[route.strip().strip("/")] = float(ttl)
+    return routes
+
+
+class CachedResponse:
+    __slots__ = ("route", "body", "status_code", "headers", "etag", "expires_at", "size", "shareable")
+
+    def __init__(self, route: str, response: httpx.Response, ttl: float):
+        self.route = route
+        self.shareable = is_shareable(response)
+        self.body = response.content
+        self.status_code = response.status_code
+        # .content ya está descomprimido; content-length lo recalcula Response.
+        self.headers = raw_headers(
+            response.headers.multi_items(), drop=("content-length", "content-encoding", "etag", "date")
+        )
+        self.etag = response.headers.get("etag") or make_etag(self.body)
+        self.headers.append((b"etag", self.etag.encode("latin-1")))
+        self.expires_at = time.monotonic() + ttl
+        self.size = len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def to_response(self, request: Request, cache_status: str) -> Response:
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            CACHE_NOT_MODIFIED.labels(self.route).inc()
+            response = Response(status_code=304)
+            response.raw_headers = [(b"etag", self.etag.encode("latin-1"))]
+            return response
+
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers = response.raw_headers + self.headers + [(b"x-cache", cache_status.encode())]
+        return response
+
+
+class ResponseCache:
+    """
+    Caché de respuestas GET por ruta, opt-in.
+
+    - TTL configurable por ruta (GATEWAY_CACHE_ROUTES).
+    - LRU acotada por bytes totales (GATEWAY_CACHE_MAX_BYTES).
+    - Peticiones idénticas concurrentes comparten una sola llamada al upstream.
+    - Nada privado: ni peticiones con credenciales ni respuestas que no sean compartibles.
+    """
+
+    def __init__(self, routes: Dict[str, float], max_bytes: int = CACHE_MAX_BYTES):
+        self.routes = routes
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def route_for(self, service_name: str, path: str, headers: Optional[Mapping[str, str]] = None) -> Optional[str]:
+        route = f"{service_name}/{path.strip('/')}"
+        if route not in self.routes:
+            return None
+        if headers is not None and any(name in headers for name in PRIVATE_REQUEST_HEADERS):
+            CACHE_REQUESTS.labels(route, "bypass").inc()
+            return None
+        return route
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() >= entry.expires_at:
+            return None
+        self.entries.move_to_end(key)
+        CACHE_REQUESTS.labels(entry.route, "hit").inc()
+        return entry
+
+    async def fetch(self, route: str, key: str,
+                    fetch: Callable[[], Awaitable[httpx.Response]]) -> Tuple[CachedResponse, str]:
+        """Devuelve (entrada, "MISS"|"COALESCED") tras consultar al upstream una sola vez por clave."""
+        task = self._inflight.get(key)
+        if task is not None:
+            entry = await asyncio.shield(task)
+            if entry.shareable:
+                CACHE_REQUESTS.labels(route, "coalesced").inc()
+                return entry, "COALESCED"
+            # El upstream marcó la respuesta como privada: cada petición agrupada pide la suya.
+            CACHE_REQUESTS.labels(route, "miss").inc()
+            return CachedResponse(route, await fetch(), self.routes[route]), "MISS"
+
+        CACHE_REQUESTS.labels(route, "miss").inc()
+        task = asyncio.create_task(self._load(route, key, fetch))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), "MISS"
+
+    async def _load(self, route: str, key: str, fetch: Callable[[], Awaitable[httpx.Response]]) -> CachedResponse:
+        response = await fetch()
+        entry = CachedResponse(route, response, self.routes[route])
+        if response.status_code == 200 and entry.shareable:
+            self._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: CachedResponse):
+        if entry.size > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous.size
+        self.entries[key] = entry
+        self.total_bytes += entry.size
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+            CACHE_EVICTIONS.inc()
+
+
+class ResponseCacheCollector:
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+
+    def collect(self):
+        size = GaugeMetricFamily("gateway_response_cache_bytes", "Bytes ocupados por la caché de respuestas")
+        size.add_metric([], self.cache.total_bytes)
+        entries = GaugeMetricFamily("gateway_response_cache_entries", "Entradas en la caché de respuestas")
+        entries.add_metric([], len(self.cache.entries))
+        yield size
+        yield entries
+
+
+response_cache = ResponseCache(parse_cache_routes(CACHE_ROUTES))
+REGISTRY.register(ResponseCacheCollector(response_cache))
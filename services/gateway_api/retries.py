@@ -0,0 +1,238 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, TypeVar
+
+import httpx
+from prometheus_client import REGISTRY, Counter
+from prometheus_client.core import GaugeMetricFamily
+
+from services.gateway_api.deadlines import Deadline
+from services.gateway_api.resilience import UpstreamServerError
+
+# Intentos totales de un GET (1 = sin reintentos) y esperas con jitter completo entre ellos.
+RETRY_MAX_ATTEMPTS = int(os.getenv("GATEWAY_RETRY_MAX_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.getenv("GATEWAY_RETRY_BASE_DELAY", 0.05))
+RETRY_MAX_DELAY = float(os.getenv("GATEWAY_RETRY_MAX_DELAY", 1.0))
+RETRY_STATUS = os.getenv("GATEWAY_RETRY_STATUS", "502,503,504")
+# Presupuesto por servicio: cada petición aporta RATIO fichas, cada reintento o hedge gasta una.
+RETRY_BUDGET_RATIO = float(os.getenv("GATEWAY_RETRY_BUDGET_RATIO", 0.1))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("GATEWAY_RETRY_BUDGET_MIN_PER_SECOND", 5))
+RETRY_BUDGET_BURST = float(os.getenv("GATEWAY_RETRY_BUDGET_BURST", 20))
+# Rutas GET con hedging ("servicio/ruta" separadas por comas): segundo intento tras el percentil indicado.
+HEDGE_ROUTES = os.getenv("GATEWAY_HEDGE_ROUTES", "")
+HEDGE_PERCENTILE = float(os.getenv("GATEWAY_HEDGE_PERCENTILE", 95))
+HEDGE_MIN_DELAY = float(os.getenv("GATEWAY_HEDGE_MIN_DELAY", 0.005))
+HEDGE_WINDOW = 256
+HEDGE_MIN_SAMPLES = 20
+
+RETRY_STATUS_CODES = {int(code) for code in RETRY_STATUS.split(",") if code.strip()}
+
+UPSTREAM_ATTEMPTS = Counter(
+    "gateway_upstream_attempts_total",
+    "Intentos enviados al upstream por tipo (first, retry, hedge)",
+    ["service", "kind"],
+)
+RETRY_BUDGET_EXHAUSTED = Counter(
+    "gateway_retry_budget_exhausted_total",
+    "Reintentos o hedges no enviados por agotar el presupuesto del servicio",
+    ["service", "kind"],
+)
+HEDGE_WINS = Counter(
+    "gateway_hedge_wins_total",
+    "Peticiones resueltas por el hedge antes que el intento original",
+    ["service"],
+)
+
+T = TypeVar("T")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Fallos de transporte y 502/503/504; nunca el breaker, el bulkhead ni la espera del pool propio."""
+    if isinstance(exc, (UpstreamServerError, httpx.HTTPStatusError)):
+        return exc.response.status_code in RETRY_STATUS_CODES
+    return isinstance(exc, httpx.TransportError) and not isinstance(exc, httpx.PoolTimeout)
+
+
+class RetryBudget:
+    """Cubo de fichas que acota los intentos extra a una fracción del tráfico real (más un mínimo por segundo)."""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+                 burst: float = RETRY_BUDGET_BURST):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self, amount: float = 0.0):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.min_per_second + amount)
+        self._updated = now
+
+    def deposit(self):
+        self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyWindow:
+    """Últimas latencias correctas de una ruta; el percentil se recalcula cada pocas muestras."""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, size: int = HEDGE_WINDOW):
+        self.percentile = percentile
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.value: Optional[float] = None
+        self._pending = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self._pending += 1
+        if len(self.samples) >= HEDGE_MIN_SAMPLES and (self.value is None or self._pending >= HEDGE_MIN_SAMPLES):
+            ordered = sorted(self.samples)
+            self.value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+            self._pending = 0
+
+
+class RetryPolicy:
+    """
+    Reintentos y hedging de las llamadas idempotentes a un upstream.
+
+    - Cada intento se acota al deadline de la petición; no se reintenta si ya no queda tiempo.
+    - Reintentos con backoff exponencial y jitter completo, solo para fallos transitorios.
+    - Reintentos y hedges gastan del presupuesto del servicio, así que un upstream caído no multiplica el tráfico.
+    - En las rutas de GATEWAY_HEDGE_ROUTES, si el intento no ha respondido tras el p95 de la ruta se lanza
+      un segundo intento y gana el primero que responda; el otro se cancela.
+    """
+
+    def __init__(self, hedge_routes: Set[str], max_attempts: int = RETRY_MAX_ATTEMPTS):
+        self.hedge_routes = hedge_routes
+        self.max_attempts = max_attempts
+        self.budgets: Dict[str, RetryBudget] = {}
+        self.latencies: Dict[str, LatencyWindow] = {route: LatencyWindow() for route in hedge_routes}
+
+    def budget_for(self, service_name: str) -> RetryBudget:
+        budget = self.budgets.get(service_name)
+        if budget is None:
+            budget = self.budgets[service_name] = RetryBudget()
+        return budget
+
+    def hedge_delay(self, route: str) -> Optional[float]:
+        window = self.latencies.get(route)
+        if window is None or window.value is None:
+            return None
+        return max(HEDGE_MIN_DELAY, window.value)
+
+    async def call(self, service_name: str, route: str, attempt: Callable[[], Awaitable[T]], deadline: Deadline,
+                   idempotent: bool = True, discard: Optional[Callable[[T], Awaitable[None]]] = None) -> T:
+        """
+        Ejecuta attempt() (que elige instancia y envía) con reintentos y hedging si la llamada es idempotente.
+        discard libera un resultado que ya no se va a usar (el perdedor de un hedge).
+        """
+        budget = self.budget_for(service_name)
+        budget.deposit()
+        UPSTREAM_ATTEMPTS.labels(service_name, "first").inc()
+        if not idempotent or self.max_attempts <= 1:
+            return await self._timed(route, attempt, deadline)
+
+        for number in range(1, self.max_attempts + 1):
+            try:
+                if route in self.latencies:
+                    return await self._hedged(service_name, route, attempt, deadline, budget, discard)
+                return await self._timed(route, attempt, deadline)
+            except Exception as e:
+                # El presupuesto se consulta el último: solo se gasta una ficha si el reintento va a enviarse.
+                if (number == self.max_attempts or not is_retryable(e)
+                        or deadline.remaining() <= RETRY_BASE_DELAY or not _spend(budget, service_name, "retry")):
+                    raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (number - 1)))
+            await asyncio.sleep(min(delay, deadline.remaining() / 2))
+            UPSTREAM_ATTEMPTS.labels(service_name, "retry").inc()
+
+    async def _timed(self, route: str, attempt: Callable[[], Awaitable[T]], deadline: Deadline) -> T:
+        started = time.perf_counter()
+        result = await deadline.run(attempt())
+        window = self.latencies.get(route)
+        if window is not None:
+            window.observe(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, service_name: str, route: str, attempt: Callable[[], Awaitable[T]], deadline: Deadline,
+                      budget: RetryBudget, discard: Optional[Callable[[T], Awaitable[None]]]) -> T:
+        primary = asyncio.ensure_future(self._timed(route, attempt, deadline))
+        tasks = [primary]
+        winner: Optional[asyncio.Future] = None
+        try:
+            delay = self.hedge_delay(route)
+            if delay is not None and delay < deadline.remaining():
+                await asyncio.wait(tasks, timeout=delay)
+                if not primary.done() and _spend(budget, service_name, "hedge"):
+                    UPSTREAM_ATTEMPTS.labels(service_name, "hedge").inc()
+                    tasks.append(asyncio.ensure_future(self._timed(route, attempt, deadline)))
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in tasks if task in done and task.exception() is None), None)
+            if winner is None:
+                # Fallaron todos: se propaga el error del intento original.
+                return primary.result()
+            if winner is not primary:
+                HEDGE_WINS.labels(service_name).inc()
+            return winner.result()
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    _abandon(task, discard)
+
+
+def _spend(budget: RetryBudget, service_name: str, kind: str) -> bool:
+    if budget.withdraw():
+        return True
+    RETRY_BUDGET_EXHAUSTED.labels(service_name, kind).inc()
+    return False
+
+
+def _abandon(task: asyncio.Future, discard: Optional[Callable]):
+    """Cancela el intento perdedor; si ya había terminado, libera su resultado."""
+    def release(finished: asyncio.Future):
+        if finished.cancelled() or finished.exception() is not None:
+            return
+        if discard is not None:
+            asyncio.ensure_future(discard(finished.result()))
+
+    if not task.done():
+        task.cancel()
+    task.add_done_callback(release)
+
+
+def parse_hedge_routes(spec: str) -> Set[str]:
+    return {route.strip().strip("/") for route in spec.split(",") if route.strip()}
+
+
+class RetryBudgetCollector:
+    """Fichas disponibles en el presupuesto de reintentos de cada servicio."""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+
+    def collect(self):
+        tokens = GaugeMetricFamily(
+            "gateway_retry_budget_tokens",
+            "Reintentos o hedges que el servicio puede gastar ahora mismo",
+            labels=["service"],
+        )
+        for service_name, budget in list(self.policy.budgets.items()):
+            budget._refill()
+            tokens.add_metric([service_name], budget.tokens)
+        yield tokens
+
+
+retry_policy = RetryPolicy(parse_hedge_routes(HEDGE_ROUTES))
+REGISTRY.register(RetryBudgetCollector(retry_policy))
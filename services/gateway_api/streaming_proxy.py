@@ -0,0 +1,104 @@
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+import httpx
+from fastapi import Request, Response
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+
+from services.gateway_api.deadlines import DEADLINE_HEADER, Deadline
+from services.gateway_api.resilience import UpstreamServerError, upstream_guards
+from services.gateway_api.retries import retry_policy
+from services.gateway_api.upstream_pool import upstream_pool
+
+# Cabeceras de conexión (RFC 9110 §7.6.1) que no se reenvían entre saltos.
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+
+def filter_headers(headers: Iterable[Tuple[str, str]], *, drop: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    excluded = HOP_BY_HOP_HEADERS.union(drop)
+    return [(k, v) for k, v in headers if k.lower() not in excluded]
+
+
+def raw_headers(headers: Iterable[Tuple[str, str]], *, drop: Iterable[str] = ()) -> List[Tuple[bytes, bytes]]:
+    # Se asignan como raw_headers para conservar cabeceras repetidas (p. ej. set-cookie).
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in filter_headers(headers, drop=drop)]
+
+
+def _has_body(request: Request) -> bool:
+    return "content-length" in request.headers or "transfer-encoding" in request.headers
+
+
+async def send_stream(method: str, url: str, headers: List[Tuple[str, str]],
+                      content: Optional[AsyncIterator[bytes]], timeout: httpx.Timeout) -> httpx.Response:
+    response = await upstream_pool.stream(method, url, headers=headers, content=content, timeout=timeout)
+    if response.status_code >= 500:
+        # Los 5xx cuentan para el breaker; su cuerpo (pequeño) se lee para liberar la conexión.
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        raise UpstreamServerError(response)
+    return response
+
+
+async def _close_stream(opened: Tuple[httpx.Response, Callable[[], None]]):
+    upstream_response, release = opened
+    try:
+        await upstream_response.aclose()
+    finally:
+        release()
+
+
+async def stream_proxy(service_name: str, route: str, pick: Callable[[], Awaitable[str]], request: Request,
+                       deadline: Deadline) -> StreamingResponse:
+    """
+    Reenvía la petición byte a byte al upstream y devuelve su respuesta tal cual, sin buffer.
+
+    pick() da la URL de cada intento. El deadline acota la espera hasta las cabeceras de la respuesta;
+    los GET sin cuerpo se reintentan (y se duplican con hedging) antes de enviar nada al cliente.
+    """
+    headers = filter_headers(request.headers.items(), drop=("host", DEADLINE_HEADER))
+    if request.client is not None:
+        headers.append(("x-forwarded-for", request.client.host))
+    content = request.stream() if _has_body(request) else None
+
+    async def attempt() -> Tuple[httpx.Response, Callable[[], None]]:
+        target_url = await pick()
+        if request.url.query:
+            target_url = f"{target_url}?{request.url.query}"
+        guard = upstream_guards.guard_for(service_name, target_url)
+        return await guard.call_stream(send_stream, request.method, target_url, headers + deadline.headers(),
+                                       content, deadline.timeout())
+
+    opened = await retry_policy.call(service_name, route, attempt, deadline,
+                                     idempotent=request.method == "GET" and content is None, discard=_close_stream)
+    upstream_response = opened[0]
+
+    response = StreamingResponse(
+        upstream_response.aiter_raw(),
+        status_code=upstream_response.status_code,
+        background=BackgroundTask(_close_stream, opened),
+    )
+    response.raw_headers = raw_headers(upstream_response.headers.multi_items())
+    return response
+
+
+def buffered_error_response(error: UpstreamServerError) -> Response:
+    """Devuelve al cliente el 5xx del upstream con su estado, cabeceras y cuerpo originales."""
+    upstream_response = error.response
+    response = Response(content=upstream_response.content, status_code=upstream_response.status_code)
+    # .content ya está descomprimido: se descarta content-encoding y Response recalcula content-length.
+    response.raw_headers = response.raw_headers + raw_headers(
+        upstream_response.headers.multi_items(), drop=("content-length", "content-encoding")
+    )
+    return response
@@ -0,0 +1,156 @@
+import logging
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from prometheus_client import REGISTRY, Counter
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger("gateway_api.upstream_pool")
+
+POOL_MAX_CONNECTIONS = int(os.getenv("GATEWAY_POOL_MAX_CONNECTIONS", 100))
+POOL_MAX_KEEPALIVE = int(os.getenv("GATEWAY_POOL_MAX_KEEPALIVE", 20))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_POOL_KEEPALIVE_EXPIRY", 30.0))
+HTTP2_ENABLED = os.getenv("GATEWAY_HTTP2", "false").lower() in ("1", "true", "yes")
+
+CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", 2.0))
+READ_TIMEOUT = float(os.getenv("GATEWAY_READ_TIMEOUT", 10.0))
+WRITE_TIMEOUT = float(os.getenv("GATEWAY_WRITE_TIMEOUT", 10.0))
+POOL_TIMEOUT = float(os.getenv("GATEWAY_POOL_TIMEOUT", 1.0))
+
+POOL_TIMEOUTS = Counter(
+    "gateway_upstream_pool_timeouts_total",
+    "Peticiones que agotaron la espera por una conexión libre del pool",
+    ["upstream"],
+)
+
+
+def _origin(url: str) -> str:
+    """Devuelve el host:puerto al que apunta una URL (clave del pool)."""
+    return urlsplit(url).netloc
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("⚠️ GATEWAY_HTTP2 activo pero falta el paquete 'h2'. Se usará HTTP/1.1")
+        return False
+    return True
+
+
+class UpstreamPool:
+    """Un httpx.AsyncClient persistente (keep-alive) por host upstream."""
+
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.limits = httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = httpx.Timeout(
+            connect=CONNECT_TIMEOUT,
+            read=READ_TIMEOUT,
+            write=WRITE_TIMEOUT,
+            pool=POOL_TIMEOUT,
+        )
+        self.http2 = False
+        # Transporte común a todos los clientes; solo lo sustituyen los benchmarks en proceso.
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+
+    async def start(self, *warm_urls: str):
+        self.http2 = _http2_available()
+        for url in warm_urls:
+            self.client_for(url)
+        logger.info(f"🔌 Pool de upstreams listo (http2={self.http2}, max={POOL_MAX_CONNECTIONS})")
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        key = _origin(url)
+        client = self.clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                transport=self.transport,
+            )
+            self.clients[key] = client
+        return client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        client = self.client_for(url)
+        try:
+            return await client.request(method, url, **kwargs)
+        except httpx.PoolTimeout:
+            POOL_TIMEOUTS.labels(upstream=_origin(url)).inc()
+            raise
+
+    async def stream(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Envía la petición sin leer el cuerpo de la respuesta (hay que cerrarla con aclose)."""
+        client = self.client_for(url)
+        request = client.build_request(method, url, **kwargs)
+        try:
+            return await client.send(request, stream=True)
+        except httpx.PoolTimeout:
+            POOL_TIMEOUTS.labels(upstream=_origin(url)).inc()
+            raise
+
+    async def aclose(self):
+        clients, self.clients = self.clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+def _pool_stats(client: httpx.AsyncClient) -> Optional[Tuple[int, int, int]]:
+    # httpx no expone el estado del pool; se lee de httpcore solo al hacer scrape.
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is None:
+        return None
+    connections = list(pool.connections)
+    idle = sum(1 for c in connections if c.is_idle())
+    queued = sum(1 for r in list(getattr(pool, "_requests", [])) if r.is_queued())
+    return len(connections) - idle, idle, queued
+
+
+class UpstreamPoolCollector:
+    """Expone el uso de cada pool en el momento del scrape (coste cero por petición)."""
+
+    def __init__(self, pool: UpstreamPool):
+        self.pool = pool
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "gateway_upstream_pool_connections",
+            "Conexiones abiertas por upstream y estado",
+            labels=["upstream", "state"],
+        )
+        queued = GaugeMetricFamily(
+            "gateway_upstream_pool_queued_requests",
+            "Peticiones esperando una conexión libre del pool",
+            labels=["upstream"],
+        )
+        limit = GaugeMetricFamily(
+            "gateway_upstream_pool_max_connections",
+            "Límite de conexiones configurado por upstream",
+            labels=["upstream"],
+        )
+        for key, client in list(self.pool.clients.items()):
+            stats = _pool_stats(client)
+            if stats is None:
+                continue
+            active, idle, waiting = stats
+            connections.add_metric([key, "active"], active)
+            connections.add_metric([key, "idle"], idle)
+            queued.add_metric([key], waiting)
+            limit.add_metric([key], POOL_MAX_CONNECTIONS)
+        yield connections
+        yield queued
+        yield limit
+
+
+upstream_pool = UpstreamPool()
+REGISTRY.register(UpstreamPoolCollector(upstream_pool))
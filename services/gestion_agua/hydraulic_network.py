@@ -0,0 +1,223 @@
+import math
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.csgraph as csgraph
+import scipy.sparse.linalg as spla
+
+PSI_PER_METER = 1.4219  # 1 m de columna de agua
+MAX_LOW_RANK_UPDATES = 16
+
+
+class HydraulicNetwork:
+    """
+    Red de distribución como grafo de tuberías (aristas) y nudos (uniones).
+
+    Modelo linealizado: el caudal de una tubería es q = c · (h_i − h_j) y en cada
+    nudo libre entra lo que sale (L · h = −demanda, con L el laplaciano ponderado).
+    Los depósitos fijan la altura piezométrica de sus nudos. La matriz reducida a
+    los nudos libres se factoriza una vez (splu); un cambio de demanda solo cambia
+    el término independiente y se resuelve con la factorización en caché. Un cambio
+    de conductancia en una tubería es una actualización de rango 1 que se aplica con
+    Sherman-Morrison-Woodbury hasta MAX_LOW_RANK_UPDATES cambios acumulados; después
+    se refactoriza.
+    """
+
+    def __init__(self, pipe_from: np.ndarray, pipe_to: np.ndarray, conductance: np.ndarray,
+                 elevation: np.ndarray, sectors: np.ndarray, sector_names: List[str],
+                 source_nodes: np.ndarray, source_head: np.ndarray, demand: Optional[np.ndarray] = None):
+        self.n_nodes = len(elevation)
+        self.pipe_from = np.asarray(pipe_from, dtype=np.int64)
+        self.pipe_to = np.asarray(pipe_to, dtype=np.int64)
+        self.conductance = np.asarray(conductance, dtype=np.float64)
+        self.elevation = np.asarray(elevation, dtype=np.float64)
+        self.sectors = np.asarray(sectors, dtype=np.int64)
+        self.sector_names = list(sector_names)
+        self.base_demand = np.zeros(self.n_nodes) if demand is None else np.asarray(demand, dtype=np.float64)
+        self.demand = self.base_demand.copy()
+
+        self.source_nodes = np.asarray(source_nodes, dtype=np.int64)
+        self.source_head = np.asarray(source_head, dtype=np.float64)
+        is_source = np.zeros(self.n_nodes, dtype=bool)
+        is_source[self.source_nodes] = True
+        self.free_nodes = np.flatnonzero(~is_source)
+        # Posición de cada nudo en el sistema reducido (−1 para depósitos).
+        self.free_index = np.full(self.n_nodes, -1, dtype=np.int64)
+        self.free_index[self.free_nodes] = np.arange(len(self.free_nodes))
+        self.fixed_head = np.zeros(self.n_nodes)
+        self.fixed_head[self.source_nodes] = self.source_head
+        # Tuberías nudo libre ↔ depósito: su término c·h_depósito va al lado derecho.
+        from_free = self.free_index[self.pipe_from] >= 0
+        to_free = self.free_index[self.pipe_to] >= 0
+        forward = np.flatnonzero(from_free & ~to_free)
+        backward = np.flatnonzero(~from_free & to_free)
+        self._source_pipes = np.r_[forward, backward]
+        self._source_rows = np.r_[self.free_index[self.pipe_from[forward]], self.free_index[self.pipe_to[backward]]]
+        self._source_heads = np.r_[self.fixed_head[self.pipe_to[forward]], self.fixed_head[self.pipe_from[backward]]]
+
+        self.head = np.zeros(self.n_nodes)
+        self.factorizations = 0
+        self.last_solve_ms = 0.0
+        self.last_factorize_ms = 0.0
+        self._factorize()
+        self.solve()
+
+    @classmethod
+    def grid(cls, n_nodes: int, seed: Optional[int] = None, source_head: float = 70.0,
+             demand_per_node: float = 0.002) -> "HydraulicNetwork":
+        """Red sintética en malla (con lazos), dos depósitos en esquinas opuestas y dos sectores."""
+        rng = np.random.default_rng(seed)
+        side = max(2, math.isqrt(n_nodes - 1) + 1)
+        rows = math.ceil(n_nodes / side)
+        ids = np.arange(rows * side).reshape(rows, side)
+        frm = np.r_[ids[:, :-1].ravel(), ids[:-1, :].ravel()]
+        to = np.r_[ids[:, 1:].ravel(), ids[1:, :].ravel()]
+        inside = (frm < n_nodes) & (to < n_nodes)
+        frm, to = frm[inside], to[inside]
+
+        col = np.arange(n_nodes) % side
+        row = np.arange(n_nodes) // side
+        elevation = 10.0 * (col + row) / (side + rows) + rng.uniform(0, 2, n_nodes)
+        sectors = (col >= side // 2).astype(np.int64)
+        return cls(frm, to, rng.uniform(0.5, 2.0, len(frm)), elevation, sectors, ["sector_1", "sector_2"],
+                   np.array([0, n_nodes - 1]), np.array([source_head, source_head - 5.0]),
+                   np.full(n_nodes, demand_per_node))
+
+    def _factorize(self):
+        started = time.perf_counter()
+        n = self.n_nodes
+        c = self.conductance
+        rows = np.r_[self.pipe_from, self.pipe_to]
+        cols = np.r_[self.pipe_to, self.pipe_from]
+        laplacian = sp.coo_matrix((np.r_[-c, -c], (rows, cols)), shape=(n, n)).tocsr()
+        laplacian = laplacian - sp.diags(np.asarray(laplacian.sum(axis=1)).ravel())
+        self._reduced = laplacian[self.free_nodes][:, self.free_nodes].tocsc()
+        # Matriz simétrica: el orden mínimo grado sobre A + Aᵀ da mucho menos relleno que COLAMD.
+        self._lu = spla.splu(self._reduced, permc_spec="MMD_AT_PLUS_A")
+        self._factored_conductance = c.copy()
+        self._update_pipes: List[int] = []
+        self._update_z = np.zeros((len(self.free_nodes), 0))
+        self._capacitance_inv = np.zeros((0, 0))
+        self.factorizations += 1
+        self.last_factorize_ms = (time.perf_counter() - started) * 1000
+
+    def _pipe_vector(self, pipe: int) -> np.ndarray:
+        """b = e_from − e_to restringido a los nudos libres."""
+        b = np.zeros(len(self.free_nodes))
+        i, j = self.free_index[self.pipe_from[pipe]], self.free_index[self.pipe_to[pipe]]
+        if i >= 0:
+            b[i] += 1.0
+        if j >= 0:
+            b[j] -= 1.0
+        return b
+
+    def _rebuild_capacitance(self):
+        # A' = A + B·D·Bᵀ  ⇒  A'^-1 r = y − Z·(D^-1 + Bᵀ·Z)^-1·Bᵀ·y,  con y = A^-1 r y Z = A^-1 B.
+        if not self._update_pipes:
+            self._capacitance_inv = np.zeros((0, 0))
+            return
+        pipes = np.array(self._update_pipes)
+        delta = self.conductance[pipes] - self._factored_conductance[pipes]
+        bt_z = np.stack([self._pipe_vector(p) @ self._update_z for p in pipes])
+        self._capacitance_inv = np.linalg.inv(np.diag(1.0 / delta) + bt_z)
+
+    def _isolates(self, pipe: int) -> bool:
+        """Si cerrar la tubería deja algún nudo sin camino hasta un depósito (el sistema sería singular)."""
+        open_pipes = self.conductance > 0
+        open_pipes[pipe] = False
+        graph = sp.coo_matrix((np.ones(int(open_pipes.sum())), (self.pipe_from[open_pipes], self.pipe_to[open_pipes])),
+                              shape=(self.n_nodes, self.n_nodes))
+        _, labels = csgraph.connected_components(graph, directed=False)
+        fed = np.zeros(labels.max() + 1, dtype=bool)
+        fed[labels[self.source_nodes]] = True
+        return not fed[labels].all()
+
+    def set_conductance(self, pipe: int, conductance: float):
+        """
+        Cambia una tubería (p. ej. cierre de válvula o rotura) sin refactorizar si es posible.
+        Un valor negativo o un cierre que aísle nudos de todos los depósitos se rechaza con
+        ValueError y la red queda como estaba.
+        """
+        if not (math.isfinite(conductance) and conductance >= 0):
+            raise ValueError(f"Conductancia inválida: {conductance}")
+        previous = self.conductance[pipe]
+        if conductance == 0 and previous != 0 and self._isolates(pipe):
+            raise ValueError(f"Cerrar la tubería {pipe} deja nudos sin conexión con ningún depósito")
+        saved = (self._lu, self._factored_conductance, list(self._update_pipes), self._update_z,
+                 self._capacitance_inv, self.factorizations)
+        self.conductance[pipe] = conductance
+        try:
+            self._apply_conductance(pipe)
+        except (RuntimeError, np.linalg.LinAlgError) as e:
+            # Matriz (casi) singular: se deshace el cambio para no dejar la factorización a medias.
+            self.conductance[pipe] = previous
+            (self._lu, self._factored_conductance, self._update_pipes, self._update_z,
+             self._capacitance_inv, self.factorizations) = saved
+            raise ValueError(f"La red no tiene solución con la tubería {pipe} a {conductance}: {e}") from e
+
+    def _apply_conductance(self, pipe: int):
+        if pipe not in self._update_pipes:
+            if len(self._update_pipes) >= MAX_LOW_RANK_UPDATES:
+                self._factorize()
+                return
+            self._update_pipes.append(pipe)
+            z = self._lu.solve(self._pipe_vector(pipe))
+            self._update_z = np.column_stack([self._update_z, z])
+        # Las tuberías que vuelven a su valor factorizado se quitan de la actualización.
+        keep = [k for k, p in enumerate(self._update_pipes)
+                if self.conductance[p] != self._factored_conductance[p]]
+        self._update_pipes = [self._update_pipes[k] for k in keep]
+        self._update_z = self._update_z[:, keep]
+        self._rebuild_capacitance()
+
+    def set_demand(self, node: int, demand: float):
+        self.demand[node] = demand
+
+    def _rhs(self) -> np.ndarray:
+        # −demanda en nudos libres + aportación de los depósitos conectados por tubería.
+        rhs = -self.demand[self.free_nodes]
+        c = self.conductance[self._source_pipes]
+        np.add.at(rhs, self._source_rows, c * self._source_heads)
+        return rhs
+
+    def solve(self) -> np.ndarray:
+        started = time.perf_counter()
+        rhs = self._rhs()
+        y = self._lu.solve(rhs)
+        if self._update_pipes:
+            bt_y = np.array([self._pipe_vector(p) @ y for p in self._update_pipes])
+            y = y - self._update_z @ (self._capacitance_inv @ bt_y)
+        self.head = self.fixed_head.copy()
+        self.head[self.free_nodes] = y
+        self.last_solve_ms = (time.perf_counter() - started) * 1000
+        return self.head
+
+    @property
+    def pressure_psi(self) -> np.ndarray:
+        return (self.head - self.elevation) * PSI_PER_METER
+
+    def sector_pressure(self) -> Dict[str, float]:
+        pressure = self.pressure_psi
+        totals = np.bincount(self.sectors, weights=pressure, minlength=len(self.sector_names))
+        counts = np.bincount(self.sectors, minlength=len(self.sector_names))
+        return {name: round(float(totals[i] / counts[i]), 2) for i, name in enumerate(self.sector_names) if counts[i]}
+
+    def sector_node(self, name: str) -> Optional[int]:
+        """Nudo central (mediana) de un sector, usado para ubicar fugas reportadas por zona."""
+        if name not in self.sector_names:
+            return None
+        members = np.flatnonzero(self.sectors == self.sector_names.index(name))
+        return int(members[len(members) // 2])
+
+    def info(self) -> dict:
+        return {
+            "nodes": self.n_nodes,
+            "pipes": len(self.conductance),
+            "sources": len(self.source_nodes),
+            "factorizations": self.factorizations,
+            "pending_pipe_updates": len(self._update_pipes),
+            "last_factorize_ms": round(self.last_factorize_ms, 3),
+            "last_solve_ms": round(self.last_solve_ms, 3),
+        }
@@ -0,0 +1,201 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Fuga = caída brusca entre dos muestras, o presión muy por debajo de la media de la ventana
+# (z-score y desviación absoluta, para no disparar con el ruido de sensores muy estables).
+Z_THRESHOLD = 4.0
+MIN_DEVIATION_PSI = 3.0
+DROP_THRESHOLD_PSI = 5.0
+RECOVERY_ZSCORE = -1.0
+MIN_SAMPLES = 10
+
+
+class PressureMonitor:
+    """
+    Ventanas deslizantes de presión por sensor en arrays (sensores × muestras).
+
+    Cada sensor tiene su propio puntero circular; media y varianza se mantienen
+    con sumas acumuladas, así que ingerir un lote cuesta O(tamaño del lote) y
+    la detección de fugas es una única pasada vectorizada sobre todos los sensores.
+    """
+
+    def __init__(self, window: int = 60, initial_sensors: int = 1024):
+        self.window = window
+        self.sensor_index: Dict[str, int] = {}
+        self.sensor_ids: List[str] = []
+        self.sector_index: Dict[str, int] = {}
+        self.sector_names: List[str] = []
+        self._allocate(initial_sensors)
+        self.sector_psi: Dict[str, float] = {}
+        self.last_detection_ms = 0.0
+
+    def _allocate(self, capacity: int):
+        """Reserva (o duplica) los arrays por sensor conservando los datos existentes."""
+        columns = {
+            "samples": (np.float32, 0.0, (self.window,)),
+            "head": (np.int64, 0, ()),
+            "count": (np.int64, 0, ()),
+            "sum": (np.float64, 0.0, ()),
+            "sum_sq": (np.float64, 0.0, ()),
+            "latest": (np.float64, np.nan, ()),
+            "previous": (np.float64, np.nan, ()),
+            "sector": (np.int64, 0, ()),
+            "leaking": (bool, False, ()),
+        }
+        for name, (dtype, fill, tail) in columns.items():
+            array = np.full((capacity,) + tail, fill, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                array[:len(old)] = old
+            setattr(self, name, array)
+
+    @property
+    def size(self) -> int:
+        return len(self.sensor_ids)
+
+    def _sector_of(self, name: str) -> int:
+        index = self.sector_index.get(name)
+        if index is None:
+            index = self.sector_index[name] = len(self.sector_names)
+            self.sector_names.append(name)
+        return index
+
+    def indices_for(self, sensor_ids: List[str], sectors: Optional[List[str]] = None) -> np.ndarray:
+        """Índice de cada sensor, registrando los nuevos. Un lote inválido no registra ninguno (ValueError)."""
+        if sectors is not None and len(sectors) != len(sensor_ids):
+            raise ValueError("sensor_id and sector must have the same length")
+        if not all(isinstance(s, str) for s in sensor_ids):
+            raise ValueError("sensor_id must be strings")
+        if sectors is not None and not all(isinstance(s, str) for s in sectors):
+            raise ValueError("sector must be strings")
+        indices = np.empty(len(sensor_ids), dtype=np.int64)
+        for i, sensor_id in enumerate(sensor_ids):
+            index = self.sensor_index.get(sensor_id)
+            if index is None:
+                index = self.sensor_index[sensor_id] = len(self.sensor_ids)
+                self.sensor_ids.append(sensor_id)
+                if index >= self.samples.shape[0]:
+                    self._allocate(self.samples.shape[0] * 2)
+                self.sector[index] = self._sector_of(sectors[i] if sectors else "unknown")
+            indices[i] = index
+        return indices
+
+    def ingest(self, indices: np.ndarray, pressures: np.ndarray):
+        if not len(indices):
+            return
+        # Se redondea a float32 (precisión del buffer) para que las sumas no deriven al expulsar muestras.
+        values = np.asarray(pressures, dtype=np.float32).astype(np.float64)
+        if np.bincount(indices).max() == 1:
+            # Caso habitual (una muestra por sensor): sin ordenar ni np.add.at.
+            self._write(indices, values, np.zeros(len(indices), dtype=np.int64))
+            self.count[indices] = np.minimum(self.count[indices] + 1, self.window)
+            self.head[indices] = (self.head[indices] + 1) % self.window
+            self.previous[indices] = self.latest[indices]
+            self.latest[indices] = values
+            return
+
+        # Posición de cada muestra dentro de su sensor (un sensor puede repetirse en el lote).
+        order = np.argsort(indices, kind="stable")
+        rows, values = indices[order], values[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        group_sizes = np.diff(np.r_[starts, len(rows)])
+        rank = np.arange(len(rows)) - np.repeat(starts, group_sizes)
+
+        # Si un sensor trae más muestras que la ventana, solo cuentan las últimas.
+        skipped = np.repeat(np.maximum(group_sizes - self.window, 0), group_sizes)
+        keep = rank >= skipped
+        rows, values, rank = rows[keep], values[keep], (rank - skipped)[keep]
+        self._write(rows, values, rank, accumulate=True)
+
+        unique_rows, written = np.unique(rows, return_counts=True)
+        self.head[unique_rows] = (self.head[unique_rows] + written) % self.window
+        self.count[unique_rows] = np.minimum(self.count[unique_rows] + written, self.window)
+        # latest/previous: las dos últimas muestras de cada sensor (del lote o anteriores).
+        last = np.r_[rows[1:] != rows[:-1], True]
+        self.previous[unique_rows] = self.latest[unique_rows]
+        second_last = np.flatnonzero(last)[written > 1] - 1
+        self.previous[rows[second_last]] = values[second_last]
+        self.latest[rows[last]] = values[last]
+
+    def _write(self, rows: np.ndarray, values: np.ndarray, rank: np.ndarray, accumulate: bool = False):
+        """Escribe en el buffer circular y actualiza sumas con lo que entra menos lo que sale."""
+        cols = (self.head[rows] + rank) % self.window
+        full = (self.count[rows] + rank) >= self.window
+        evicted = np.where(full, self.samples[rows, cols].astype(np.float64), 0.0)
+        self.samples[rows, cols] = values
+        if accumulate:
+            np.add.at(self.sum, rows, values - evicted)
+            np.add.at(self.sum_sq, rows, values * values - evicted * evicted)
+        else:
+            self.sum[rows] += values - evicted
+            self.sum_sq[rows] += values * values - evicted * evicted
+
+    def detect(self) -> List[dict]:
+        """Pasada vectorizada: devuelve solo las fugas nuevas (sensores que pasan a estado de fuga)."""
+        started = time.perf_counter()
+        n = self.size
+        count = self.count[:n]
+        safe_count = np.maximum(count, 1)
+        mean = self.sum[:n] / safe_count
+        std = np.sqrt(np.maximum(self.sum_sq[:n] / safe_count - mean * mean, 1e-9))
+        latest = self.latest[:n]
+        zscore = (latest - mean) / std
+        drop = self.previous[:n] - latest
+
+        below_mean = (zscore < -Z_THRESHOLD) & (mean - latest > MIN_DEVIATION_PSI)
+        suspect = (count >= MIN_SAMPLES) & (below_mean | (drop > DROP_THRESHOLD_PSI))
+        new_leaks = np.flatnonzero(suspect & ~self.leaking[:n])
+        # Histéresis: un sensor sigue en fuga hasta que su presión vuelve cerca de la media.
+        self.leaking[:n] = suspect | (self.leaking[:n] & (zscore < RECOVERY_ZSCORE))
+
+        sector = self.sector[:n]
+        valid = ~np.isnan(latest)
+        totals = np.bincount(sector[valid], weights=latest[valid], minlength=len(self.sector_names))
+        counts = np.bincount(sector[valid], minlength=len(self.sector_names))
+        self.sector_psi = {
+            name: round(float(totals[i] / counts[i]), 2)
+            for i, name in enumerate(self.sector_names) if counts[i]
+        }
+        self.last_detection_ms = (time.perf_counter() - started) * 1000
+
+        return [
+            {
+                "sensor_id": self.sensor_ids[i],
+                "sector": self.sector_names[sector[i]],
+                "pressure_psi": round(float(latest[i]), 2),
+                "window_mean_psi": round(float(mean[i]), 2),
+                "zscore": round(float(zscore[i]), 2),
+            }
+            for i in new_leaks
+        ]
+
+    def active_leak_count(self) -> int:
+        return int(self.leaking[:self.size].sum())
+
+    def sector_details(self) -> Dict[str, dict]:
+        """Resumen de todos los sectores en una pasada: sensores, presión media/mín/máx y sensores en fuga."""
+        n, sectors = self.size, len(self.sector_names)
+        sector, latest = self.sector[:n], self.latest[:n]
+        valid = ~np.isnan(latest)
+        sensors = np.bincount(sector, minlength=sectors)
+        counts = np.bincount(sector[valid], minlength=sectors)
+        totals = np.bincount(sector[valid], weights=latest[valid], minlength=sectors)
+        lowest, highest = np.full(sectors, np.inf), np.full(sectors, -np.inf)
+        np.minimum.at(lowest, sector[valid], latest[valid])
+        np.maximum.at(highest, sector[valid], latest[valid])
+        leaking: List[List[str]] = [[] for _ in range(sectors)]
+        for i in np.flatnonzero(self.leaking[:n]).tolist():
+            leaking[sector[i]].append(self.sensor_ids[i])
+        return {
+            name: {
+                "sector": name,
+                "sensors": int(sensors[s]),
+                "mean_psi": round(float(totals[s] / counts[s]), 2) if counts[s] else None,
+                "min_psi": round(float(lowest[s]), 2) if counts[s] else None,
+                "max_psi": round(float(highest[s]), 2) if counts[s] else None,
+                "leaking_sensors": leaking[s],
+            }
+            for s, name in enumerate(self.sector_names)
+        }
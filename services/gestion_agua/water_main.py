@@ -1,11 +1,22 @@
 import asyncio
 import logging
-import httpx
 import os
-import random
-from fastapi import FastAPI
+import time
+import numpy as np
+from collections import deque
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
+from typing import Optional
+
+from services.gestion_agua.hydraulic_network import HydraulicNetwork
+from services.gestion_agua.pressure_monitor import PressureMonitor
+from wakanda_shared.bootstrap import ServiceRegistration
+from wakanda_shared.broadcast import Broadcaster
+from wakanda_shared.diagnostics import setup_diagnostics
+from wakanda_shared.shared_state import (CommandChannel, SharedEventRing, SharedSnapshot, WriterLease,
+                                         run_as_writer)
 
 try:
     from wakanda_shared.telemetry import setup_telemetry
@@ -15,47 +26,198 @@ except ImportError:
 SERVICE_NAME = "gestion_agua"
 SERVICE_PORT = int(os.getenv("PORT", 8003))
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://service_registry:8000/register")
+WINDOW_SAMPLES = int(os.getenv("WATER_WINDOW_SAMPLES", 60))
+DETECTION_INTERVAL = float(os.getenv("WATER_DETECTION_INTERVAL", 1.0))
+# Sensores simulados (0 = solo se usan las muestras recibidas por /water/pressure/samples).
+SIMULATED_SENSORS = int(os.getenv("WATER_SIMULATED_SENSORS", 2000))
+NETWORK_NODES = int(os.getenv("WATER_NETWORK_NODES", 10000))
+MAX_ACTIVE_LEAKS = 1000
+# Caudal de fuga que se añade como demanda en el nudo afectado, según la gravedad.
+LEAK_FLOW = {"LOW": 0.5, "MEDIUM": 2.0, "HIGH": 5.0}
 
 class LeakAlert(BaseModel):
     zone_id: str
     severity: str
+    node_id: Optional[int] = None
+
+active_leaks = deque(maxlen=MAX_ACTIVE_LEAKS)
+monitor = PressureMonitor(WINDOW_SAMPLES)
+network = HydraulicNetwork.grid(NETWORK_NODES, seed=42)
+leak_events = Broadcaster()
+# Con varios workers, el monitor y la red viven en el worker escritor: el resto sirve las
+# lecturas (presión, red, sectores) desde memoria compartida, le envía las escrituras y reenvía sus fugas.
+writer = WriterLease(SERVICE_NAME)
+commands = CommandChannel(SERVICE_NAME, writer)
+pressure_snapshot = SharedSnapshot(f"{SERVICE_NAME}-pressure")
+network_snapshot = SharedSnapshot(f"{SERVICE_NAME}-network")
+sectors_snapshot = SharedSnapshot(f"{SERVICE_NAME}-sectors")
+leak_ring = SharedEventRing(f"{SERVICE_NAME}-leaks")
+
+registration = ServiceRegistration(SERVICE_NAME, SERVICE_PORT, REGISTRY_URL)
+
+class SensorSimulator:
+    """
+    Sensores repartidos por los nudos de la red: cada tick leen la presión calculada
+    por el modelo hidráulico más ruido; de vez en cuando un sensor sufre una caída.
+    """
+
+    def __init__(self, n: int, leak_probability: float = 0.02, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.nodes = np.linspace(0, network.n_nodes - 1, min(n, network.n_nodes)).astype(np.int64)
+        sectors = [network.sector_names[s] for s in network.sectors[self.nodes]]
+        self.indices = monitor.indices_for([f"P-{node}" for node in self.nodes.tolist()], sectors)
+        self.offset = np.zeros(len(self.nodes))
+        self.leak_probability = leak_probability
 
-active_leaks = []
+    def tick(self):
+        if self.rng.random() < self.leak_probability:
+            self.offset[self.rng.integers(len(self.offset))] = -15.0
+        self.offset *= 0.95
+        baseline = network.pressure_psi[self.nodes]
+        pressures = baseline + self.offset + self.rng.normal(0.0, 0.8, len(self.offset))
+        monitor.ingest(self.indices, pressures)
 
-async def register_service():
-    await asyncio.sleep(3)
-    async with httpx.AsyncClient() as client:
-        try:
-            my_url = f"http://{SERVICE_NAME}:{SERVICE_PORT}"
-            await client.post(REGISTRY_URL, json={
-                "service_name": SERVICE_NAME, "url": my_url, "health_url": f"{my_url}/health"
-            })
-            logging.info(f"✅ {SERVICE_NAME} Registrado")
-        except Exception:
-            logging.error(f"⚠️ Fallo registro {SERVICE_NAME}")
+def publish_leaks(leaks):
+    for leak in leaks:
+        active_leaks.append({"zone_id": leak["sector"], "severity": "AUTO", **leak, "detected_at": time.time()})
+        leak_events.publish("leak", leak)
+        logging.warning(f"💧 Posible fuga en {leak['sensor_id']} ({leak['sector']})")
+
+async def monitor_loop():
+    leak_events.on_publish = leak_ring.publish
+    refresh_network_snapshot()
+    refresh_pressure_snapshot()
+    simulator = SensorSimulator(SIMULATED_SENSORS) if SIMULATED_SENSORS else None
+    while True:
+        await asyncio.sleep(DETECTION_INTERVAL)
+        if simulator:
+            simulator.tick()
+        publish_leaks(monitor.detect())
+        refresh_pressure_snapshot()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(register_service())
+    writer.try_acquire()
+    registration.start()
+    tasks = [asyncio.create_task(run_as_writer(writer, monitor_loop, commands.serve)),
+             asyncio.create_task(leak_ring.follow(writer, leak_events.publish_formatted))]
     yield
+    await registration.stop()
+    for task in tasks:
+        task.cancel()
 
 app = FastAPI(lifespan=lifespan, title="Wakanda Water")
 setup_telemetry(app, SERVICE_NAME)
+setup_diagnostics(app)
+
+def refresh_network_snapshot():
+    """Regenera /water/network; solo cambia cuando se recalcula la red."""
+    network_snapshot.update({**network.info(), "sector_psi": network.sector_pressure()})
+
+def refresh_pressure_snapshot():
+    """Regenera /water/pressure y el detalle por sector tras cada pasada de detección o cambio en la red."""
+    sectors_snapshot.update(monitor.sector_details())
+    leaking = monitor.active_leak_count()
+    pressure_snapshot.update({
+        **{f"{sector}_psi": psi for sector, psi in monitor.sector_psi.items()},
+        "status": "LEAK_SUSPECTED" if leaking else "NORMAL",
+        "sensors": monitor.size,
+        "leaking_sensors": leaking,
+        "detection_ms": round(monitor.last_detection_ms, 3),
+        "modeled": network.sector_pressure(),
+    })
 
 @app.get("/water/pressure")
-async def get_pressure():
-    # Simula presión variable
-    return {
-        "sector_1_psi": random.randint(40, 60),
-        "sector_2_psi": random.randint(35, 55),
-        "status": "NORMAL"
-    }
+async def get_pressure(request: Request):
+    """Presión media por sector según la última pasada de detección."""
+    return pressure_snapshot.response(request)
+
+@app.get("/water/network")
+async def get_network(request: Request):
+    """Tamaño de la red hidráulica, tiempos de factorización/resolución y presión modelada por sector."""
+    return network_snapshot.response(request)
+
+@app.get("/water/sectors/{sector}")
+async def get_sector(sector: str):
+    """Detalle del sector según la última pasada de detección."""
+    detail = sectors_snapshot.data() or {}
+    if sector not in detail:
+        raise HTTPException(status_code=404, detail="Sector not found")
+    return detail[sector]
+
+@app.post("/water/pressure/samples")
+async def ingest_samples(request: Request):
+    """
+    Lote columnar de lecturas: {"sensor_id": [...], "pressure_psi": [...], "sector": [...]?}.
+    "sector" solo se usa la primera vez que aparece un sensor.
+    """
+    try:
+        payload = await request.json()
+        sensor_ids = payload["sensor_id"]
+        pressures = np.asarray(payload["pressure_psi"], dtype=np.float64)
+        sectors = payload.get("sector")
+        if len(sensor_ids) != len(pressures) or (sectors is not None and len(sectors) != len(sensor_ids)):
+            raise ValueError("columns must have the same length")
+        if not all(isinstance(s, str) for s in sensor_ids):
+            raise ValueError("sensor_id must be strings")
+        if sectors is not None and not all(isinstance(s, str) for s in sectors):
+            raise ValueError("sector must be strings")
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch: {e}")
+    valid = np.isfinite(pressures) & (pressures >= 0)
+    if not valid.all():
+        keep = np.flatnonzero(valid).tolist()
+        sensor_ids = [sensor_ids[i] for i in keep]
+        sectors = [sectors[i] for i in keep] if sectors is not None else None
+        pressures = pressures[valid]
+    await commands.call("samples", {"sensor_id": sensor_ids, "pressure_psi": pressures, "sector": sectors})
+    return {"accepted": len(pressures), "rejected": int((~valid).sum())}
+
+@commands.handler("samples")
+def ingest_validated(batch: dict):
+    try:
+        indices = monitor.indices_for(batch["sensor_id"], batch["sector"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch: {e}")
+    monitor.ingest(indices, np.asarray(batch["pressure_psi"]))
+
+@app.get("/water/leaks/stream")
+async def stream_leaks():
+    """Server-Sent Events: un evento `leak` por cada fuga nueva detectada o reportada."""
+    return StreamingResponse(leak_events.stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
 @app.post("/water/leak_alert")
 async def report_leak(alert: LeakAlert):
-    active_leaks.append(alert)
+    """
+    Registra la fuga y, si se puede ubicar en la red (node_id o nombre de sector),
+    la añade como demanda en ese nudo y recalcula el campo de presiones.
+    """
+    return await commands.call("leak_alert", alert.dict())
+
+@commands.handler("leak_alert")
+def register_leak(payload: dict):
+    alert = LeakAlert(**payload)
+    node = alert.node_id if alert.node_id is not None else network.sector_node(alert.zone_id)
+    if node is not None and not 0 <= node < network.n_nodes:
+        raise HTTPException(status_code=404, detail="Node not found")
+    event = alert.dict()
+    if node is not None:
+        network.set_demand(node, network.demand[node] + LEAK_FLOW.get(alert.severity.upper(), LEAK_FLOW["MEDIUM"]))
+        network.solve()
+        event.update(node_id=node, solve_ms=round(network.last_solve_ms, 3))
+        refresh_network_snapshot()
+        refresh_pressure_snapshot()
+    active_leaks.append(event)
+    leak_events.publish("leak", event)
     logging.warning(f"💧 FUGA DETECTADA en {alert.zone_id}")
-    return {"status": "alert_registered", "active_leaks_count": len(active_leaks)}
+    return {
+        "status": "alert_registered",
+        "active_leaks_count": len(active_leaks),
+        "modeled": node is not None,
+        "sector_psi": network.sector_pressure(),
+        "solve_ms": round(network.last_solve_ms, 3),
+    }
 
 @app.get("/health")
-async def health(): return {"status": "ok"}
\ No newline at end of file
+async def health(): return {"status": "ok"}
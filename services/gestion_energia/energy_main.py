@@ -1,10 +1,20 @@
 import asyncio
 import logging
-import httpx
 import os
-from fastapi import FastAPI
+import threading
+import time
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
+from typing import Optional
+
+from services.gestion_energia.ingestion import ReadingBatch, SharedZoneLoadWindow, ingest, parse_binary, parse_ndjson
+from wakanda_shared.bootstrap import ServiceRegistration
+from wakanda_shared.diagnostics import setup_diagnostics
+from wakanda_shared.shared_state import ShardedCounters, TableFull
+from wakanda_shared.snapshot import Snapshot
 
 try:
     from wakanda_shared.telemetry import setup_telemetry
@@ -14,6 +24,11 @@ except ImportError:
 SERVICE_NAME = "gestion_energia"
 SERVICE_PORT = int(os.getenv("PORT", 8002))
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://service_registry:8000/register")
+WINDOW_MINUTES = int(os.getenv("ENERGY_WINDOW_MINUTES", 15))
+MAX_BULK_BYTES = int(os.getenv("ENERGY_MAX_BULK_BYTES", 64 * 1024 * 1024))
+# Cada cuánto se regenera /energy/grid aunque no lleguen lecturas (la ventana avanza con el tiempo).
+SNAPSHOT_INTERVAL = float(os.getenv("ENERGY_SNAPSHOT_INTERVAL", 1.0))
+MAX_ZONES = int(os.getenv("ENERGY_MAX_ZONES", 1024))
 
 class EnergyReport(BaseModel):
     zone_id: str
@@ -25,34 +40,121 @@ grid_status = {
     "renewable_contribution_percent": 32.0
 }
 
-async def register_service():
-    await asyncio.sleep(3)
-    async with httpx.AsyncClient() as client:
-        try:
-            my_url = f"http://{SERVICE_NAME}:{SERVICE_PORT}"
-            await client.post(REGISTRY_URL, json={
-                "service_name": SERVICE_NAME, "url": my_url, "health_url": f"{my_url}/health"
-            })
-            logging.info(f"✅ {SERVICE_NAME} Registrado")
-        except Exception:
-            logging.error(f"⚠️ Fallo registro {SERVICE_NAME}")
+BASE_LOAD_MW = grid_status["total_load_mw"]
+# Ventana en memoria compartida: cada worker suma en su porción y todos leen el total.
+zone_load = SharedZoneLoadWindow(f"{SERVICE_NAME}-load", WINDOW_MINUTES, max_zones=MAX_ZONES)
+# Lotes ingeridos por cualquier worker: si cambia, la respuesta precalculada está obsoleta.
+ingested = ShardedCounters(SERVICE_NAME, ["batches"])
+# La porción de la ventana de este worker admite un solo escritor; la ingesta corre en el threadpool.
+ingest_lock = threading.Lock()
+grid_snapshot = Snapshot()
+snapshot_batches = -1
+
+registration = ServiceRegistration(SERVICE_NAME, SERVICE_PORT, REGISTRY_URL)
+
+async def snapshot_loop():
+    while True:
+        refresh_grid_snapshot()
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(register_service())
+    registration.start()
+    snapshot_task = asyncio.create_task(snapshot_loop())
     yield
+    await registration.stop()
+    snapshot_task.cancel()
 
 app = FastAPI(lifespan=lifespan, title="Wakanda Energy")
 setup_telemetry(app, SERVICE_NAME)
+setup_diagnostics(app)
+
+def refresh_load(window_minutes: Optional[float] = None):
+    """Recalcula total_load_mw = carga base + carga medida por los contadores en la ventana."""
+    zones = zone_load.totals(time.time(), window_minutes)
+    metered_mw = sum(zone["load_mw"] for zone in zones.values())
+    grid_status["total_load_mw"] = round(BASE_LOAD_MW + metered_mw, 3)
+    return zones, metered_mw
+
+def grid_report(window_minutes: Optional[float] = None) -> dict:
+    zones, metered_mw = refresh_load(window_minutes)
+    return {
+        **grid_status,
+        "metered_load_mw": round(metered_mw, 3),
+        "window_minutes": min(window_minutes or WINDOW_MINUTES, WINDOW_MINUTES),
+        "zones": zones,
+    }
+
+def refresh_grid_snapshot():
+    global snapshot_batches
+    snapshot_batches = ingested.value("batches")
+    grid_snapshot.update(grid_report())
+
+def ingest_batch(batch: ReadingBatch) -> dict:
+    """Ingiere un lote (bloqueante: llamar desde el threadpool). /energy/grid se regenera al leerlo."""
+    try:
+        with ingest_lock:
+            result = ingest(zone_load, batch)
+    except TableFull as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    ingested.add("batches")
+    return result
+
+def parse_and_ingest(body: bytes, content_type: str) -> dict:
+    try:
+        if content_type.startswith("application/octet-stream"):
+            batch = parse_binary(body)
+        else:
+            batch = parse_ndjson(body)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch: {e}")
+    return ingest_batch(batch)
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """Lee el cuerpo cortando en cuanto supera `limit` (o antes, si Content-Length ya lo anuncia)."""
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail="Batch too large")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail="Batch too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 @app.get("/energy/grid")
-async def get_grid_status():
-    return grid_status
+async def get_grid_status(request: Request, window_minutes: Optional[float] = Query(None, gt=0)):
+    """
+    Estado de la red; la carga medida es la media por zona en los últimos window_minutes.
+    Sin window_minutes se sirve la respuesta precalculada (con ETag).
+    """
+    if window_minutes is None:
+        if ingested.value("batches") != snapshot_batches:
+            refresh_grid_snapshot()
+        return grid_snapshot.response(request)
+    return grid_report(window_minutes)
 
 @app.post("/energy/report")
-async def report_consumption(report: EnergyReport):
-    grid_status["total_load_mw"] += (report.consumption_kwh / 1000)
+def report_consumption(report: EnergyReport):
+    batch = ReadingBatch(np.array([report.zone_id]), np.zeros(1), np.array([report.consumption_kwh]))
+    result = ingest_batch(batch)
+    if result["rejected"]:
+        raise HTTPException(status_code=422, detail=result["errors"])
+    refresh_load()
     return {"status": "received", "new_load": grid_status["total_load_mw"]}
 
+@app.post("/energy/readings/bulk")
+async def bulk_readings(request: Request):
+    """
+    Ingesta masiva de lecturas de contadores.
+
+    - application/x-ndjson: una lectura JSON por línea {"zone_id", "consumption_kwh", "timestamp"?}.
+    - application/octet-stream: registros binarios de 28 bytes (ver ingestion.BINARY_READING).
+    """
+    body = await read_body(request, MAX_BULK_BYTES)
+    # Parseo, validación e ingesta son CPU: fuera del event loop.
+    return await run_in_threadpool(parse_and_ingest, body, request.headers.get("content-type", ""))
+
 @app.get("/health")
 async def health(): return {"status": "ok"}
\ No newline at end of file
@@ -0,0 +1,246 @@
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from wakanda_shared.shared_state import MAX_WORKERS, SharedNameTable, SharedRegion, TableFull, worker_slot
+
+try:
+    import orjson
+
+    def _loads(data: bytes):
+        return orjson.loads(data)
+except ImportError:
+    def _loads(data: bytes):
+        return json.loads(data)
+
+# Formato binario: registros de tamaño fijo, little-endian (28 bytes por lectura).
+# timestamp = 0 significa "ahora".
+BINARY_READING = np.dtype([("zone_id", "S16"), ("timestamp", "<f8"), ("consumption_kwh", "<f4")])
+
+MAX_ZONE_ID_LENGTH = 16
+MAX_CONSUMPTION_KWH = 1e6
+FUTURE_TOLERANCE_SECONDS = 60.0
+MAX_REPORTED_ERRORS = 10
+
+
+class ReadingBatch:
+    """Lote de lecturas en forma columnar (sin un objeto por fila)."""
+
+    __slots__ = ("zone_ids", "timestamps", "consumption_kwh")
+
+    def __init__(self, zone_ids: np.ndarray, timestamps: np.ndarray, consumption_kwh: np.ndarray):
+        self.zone_ids = zone_ids
+        self.timestamps = timestamps
+        self.consumption_kwh = consumption_kwh
+
+    def __len__(self):
+        return len(self.consumption_kwh)
+
+
+def parse_binary(body: bytes) -> ReadingBatch:
+    if len(body) % BINARY_READING.itemsize:
+        raise ValueError(f"El cuerpo binario debe ser múltiplo de {BINARY_READING.itemsize} bytes")
+    records = np.frombuffer(body, dtype=BINARY_READING)
+    return ReadingBatch(
+        np.char.rstrip(records["zone_id"], b"\x00").astype(str),
+        records["timestamp"].astype(np.float64),
+        records["consumption_kwh"].astype(np.float64),
+    )
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _numbers(values: list) -> np.ndarray:
+    """Columna numérica; un valor no numérico queda como NaN (validate rechaza esa fila, no el lote)."""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_to_float(value) for value in values], dtype=np.float64)
+
+
+def parse_ndjson(body: bytes) -> ReadingBatch:
+    """Una lectura JSON por línea; se decodifica todo el lote con una sola llamada."""
+    lines = [line for line in body.split(b"\n") if line.strip()]
+    rows = _loads(b"[" + b",".join(lines) + b"]")
+    rows = [row if isinstance(row, dict) else {} for row in rows]
+    # Ancho fijo con un carácter de más: numpy recorta los ids más largos (que validate rechaza igualmente)
+    # y el ancho de la columna no lo fija el id más largo del lote.
+    zone_ids = np.array([row.get("zone_id") if isinstance(row.get("zone_id"), str) else "" for row in rows],
+                        dtype=f"U{MAX_ZONE_ID_LENGTH + 1}")
+    timestamps = _numbers([row.get("timestamp") or 0.0 for row in rows])
+    consumption = _numbers([row.get("consumption_kwh", np.nan) for row in rows])
+    return ReadingBatch(zone_ids, timestamps, consumption)
+
+
+def validate(batch: ReadingBatch, now: float, window_seconds: float) -> Tuple[ReadingBatch, int, List[str]]:
+    """Validación vectorizada: devuelve (lecturas válidas, nº rechazadas, primeros errores)."""
+    timestamps = np.where(batch.timestamps == 0.0, now, batch.timestamps)
+    zone_len = np.char.str_len(batch.zone_ids) if len(batch) else np.zeros(0, dtype=int)
+
+    checks = {
+        "zone_id inválido": (zone_len == 0) | (zone_len > MAX_ZONE_ID_LENGTH),
+        "consumption_kwh fuera de rango": ~np.isfinite(batch.consumption_kwh)
+        | (batch.consumption_kwh < 0) | (batch.consumption_kwh > MAX_CONSUMPTION_KWH),
+        "timestamp fuera de la ventana": ~np.isfinite(timestamps)
+        | (timestamps <= now - window_seconds) | (timestamps > now + FUTURE_TOLERANCE_SECONDS),
+    }
+    invalid = np.zeros(len(batch), dtype=bool)
+    errors = []
+    for reason, mask in checks.items():
+        invalid |= mask
+        for row in np.flatnonzero(mask)[:MAX_REPORTED_ERRORS - len(errors)]:
+            errors.append(f"fila {row}: {reason}")
+
+    valid = ~invalid
+    accepted = ReadingBatch(batch.zone_ids[valid], timestamps[valid], batch.consumption_kwh[valid])
+    return accepted, int(invalid.sum()), errors
+
+
+class ZoneLoadWindow:
+    """
+    Consumo por zona en una ventana deslizante de N minutos.
+
+    Guarda una matriz zonas × buckets (p. ej. 10 s) usada como buffer circular;
+    cada lote se suma de forma vectorizada con np.bincount. Admite como mucho
+    `max_zones` zonas distintas: un lote con zonas nuevas de más lanza TableFull.
+    """
+
+    def __init__(self, window_minutes: int, bucket_seconds: float = 10.0, initial_zones: int = 64,
+                 max_zones: int = 1024):
+        self.window_minutes = window_minutes
+        self.bucket_seconds = bucket_seconds
+        self.max_zones = max_zones
+        self.n_buckets = int(window_minutes * 60 // bucket_seconds)
+        self.zone_index: Dict[str, int] = {}
+        self.zone_names: List[str] = []
+        self.energy_kwh = np.zeros((initial_zones, self.n_buckets), dtype=np.float64)
+        self.readings = np.zeros((initial_zones, self.n_buckets), dtype=np.int64)
+        self.bucket_epoch = np.full(self.n_buckets, -1, dtype=np.int64)
+
+    @property
+    def window_seconds(self) -> float:
+        return self.n_buckets * self.bucket_seconds
+
+    def _zone_indices(self, zone_ids: np.ndarray) -> np.ndarray:
+        names, inverse = np.unique(zone_ids, return_inverse=True)
+        new_zones = sum(name not in self.zone_index for name in names.tolist())
+        if len(self.zone_names) + new_zones > self.max_zones:
+            raise TableFull(f"Zone limit reached ({self.max_zones} zones)")
+        mapping = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names.tolist()):
+            index = self.zone_index.get(name)
+            if index is None:
+                index = self.zone_index[name] = len(self.zone_names)
+                self.zone_names.append(name)
+            mapping[i] = index
+        if len(self.zone_names) > self.energy_kwh.shape[0]:
+            rows = max(len(self.zone_names), self.energy_kwh.shape[0] * 2)
+            self.energy_kwh = np.vstack([self.energy_kwh, np.zeros((rows - self.energy_kwh.shape[0], self.n_buckets))])
+            self.readings = np.vstack([self.readings, np.zeros((rows - self.readings.shape[0], self.n_buckets),
+                                                                 dtype=np.int64)])
+        return mapping[inverse]
+
+    def add(self, batch: ReadingBatch):
+        if not len(batch):
+            return
+        epochs = (batch.timestamps // self.bucket_seconds).astype(np.int64)
+        slots = epochs % self.n_buckets
+        for epoch in np.unique(epochs):
+            slot = epoch % self.n_buckets
+            if self.bucket_epoch[slot] < epoch:
+                self.energy_kwh[:, slot] = 0.0
+                self.readings[:, slot] = 0
+                self.bucket_epoch[slot] = epoch
+        # Lecturas cuyo bucket ya fue reutilizado por uno más reciente se descartan.
+        current = self.bucket_epoch[slots] == epochs
+        zones = self._zone_indices(batch.zone_ids[current])
+        flat = zones * self.n_buckets + slots[current]
+        weights = batch.consumption_kwh[current]
+        size = self.energy_kwh.size
+        if len(flat) * 4 >= size:
+            # Lote grande frente a la matriz: un bincount denso es más barato que ordenar.
+            self.energy_kwh += np.bincount(flat, weights=weights, minlength=size).reshape(self.energy_kwh.shape)
+            self.readings += np.bincount(flat, minlength=size).reshape(self.readings.shape)
+        else:
+            # Lote pequeño: se agrupa por celda (zona, bucket) y se suma solo en las celdas tocadas.
+            cells, inverse = np.unique(flat, return_inverse=True)
+            self.energy_kwh.ravel()[cells] += np.bincount(inverse, weights=weights)
+            self.readings.ravel()[cells] += np.bincount(inverse)
+
+    def _window(self, now: float, window_minutes: Optional[float]) -> Tuple[int, int]:
+        window_minutes = min(window_minutes or self.window_minutes, self.window_minutes)
+        return max(1, int(window_minutes * 60 // self.bucket_seconds)), int(now // self.bucket_seconds)
+
+    def totals(self, now: float, window_minutes: Optional[float] = None) -> Dict[str, dict]:
+        """Energía, nº de lecturas y carga media (MW) por zona en los últimos window_minutes."""
+        n, current_epoch = self._window(now, window_minutes)
+        in_window = (self.bucket_epoch > current_epoch - n) & (self.bucket_epoch <= current_epoch)
+        n_zones = len(self.zone_names)
+        energy = self.energy_kwh[:n_zones, in_window].sum(axis=1)
+        readings = self.readings[:n_zones, in_window].sum(axis=1)
+        return self._report(self.zone_names, energy, readings, n)
+
+    def _report(self, names: List[str], energy: np.ndarray, readings: np.ndarray, n: int) -> Dict[str, dict]:
+        hours = n * self.bucket_seconds / 3600
+        return {
+            name: {
+                "energy_kwh": round(float(energy[i]), 3),
+                "load_mw": round(float(energy[i]) / hours / 1000, 3),
+                "readings": int(readings[i]),
+            }
+            for i, name in enumerate(names)
+        }
+
+
+class SharedZoneLoadWindow(ZoneLoadWindow):
+    """
+    ZoneLoadWindow en memoria compartida para varios workers.
+
+    Cada worker suma sus lotes en su propia porción de la matriz (un solo escritor por
+    porción, sin bloqueos) y totals() agrega todas. Los nombres de zona se registran en
+    una tabla compartida con capacidad fija (`max_zones`).
+    """
+
+    def __init__(self, name: str, window_minutes: int, bucket_seconds: float = 10.0, max_zones: int = 1024):
+        super().__init__(window_minutes, bucket_seconds, initial_zones=0, max_zones=max_zones)
+        self.zones = SharedNameTable(f"{name}-zones", max_zones, width=4 * MAX_ZONE_ID_LENGTH)
+        shape = (MAX_WORKERS, max_zones, self.n_buckets)
+        self.region = SharedRegion(f"{name}-window", {
+            "energy_kwh": (np.float64, shape), "readings": (np.int64, shape),
+            "bucket_epoch": (np.int64, (MAX_WORKERS, self.n_buckets)),
+        }, initialize=lambda arrays: arrays["bucket_epoch"].fill(-1))
+        slot = worker_slot()
+        self.energy_kwh = self.region["energy_kwh"][slot]
+        self.readings = self.region["readings"][slot]
+        self.bucket_epoch = self.region["bucket_epoch"][slot]
+
+    def _zone_indices(self, zone_ids: np.ndarray) -> np.ndarray:
+        names, inverse = np.unique(zone_ids, return_inverse=True)
+        mapping = np.array([self.zones.index_of(name) for name in names.tolist()], dtype=np.int64)
+        return mapping[inverse]
+
+    def totals(self, now: float, window_minutes: Optional[float] = None) -> Dict[str, dict]:
+        n, current_epoch = self._window(now, window_minutes)
+        epochs = self.region["bucket_epoch"]
+        in_window = (epochs > current_epoch - n) & (epochs <= current_epoch)
+        names = self.zones.names()
+        energy = np.zeros(len(names))
+        readings = np.zeros(len(names), dtype=np.int64)
+        for worker in np.flatnonzero(in_window.any(axis=1)):
+            energy += self.region["energy_kwh"][worker, :len(names)][:, in_window[worker]].sum(axis=1)
+            readings += self.region["readings"][worker, :len(names)][:, in_window[worker]].sum(axis=1)
+        return self._report(names, energy, readings, n)
+
+
+def ingest(window: ZoneLoadWindow, batch: ReadingBatch, now: Optional[float] = None) -> dict:
+    now = time.time() if now is None else now
+    accepted, rejected, errors = validate(batch, now, window.window_seconds)
+    window.add(accepted)
+    return {"accepted": len(accepted), "rejected": rejected, "errors": errors}
@@ -0,0 +1,286 @@
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.gestion_residuos.pickup_scheduler import DEFAULT_CENTER, EARTH_RADIUS_M
+
+# Contenedores añadidos tras la última reconstrucción se recorren linealmente
+# hasta que su número supera esta fracción de la flota.
+MAX_UNINDEXED_FRACTION = 0.05
+MIN_REBUILD_TAIL = 1024
+# Celdas máximas de la rejilla: si la extensión de la flota lo supera, las celdas se agrandan.
+MAX_GRID_CELLS = 4_000_000
+
+
+class ContainerStore:
+    """
+    Flota de contenedores en arrays columnares (una fila por contenedor).
+
+    Las coordenadas se proyectan a metros alrededor de un origen fijo. El índice
+    espacial es una rejilla de celdas de `cell_size_m` en formato CSR: los índices de
+    contenedor ordenados por celda y un array de desplazamientos por celda, así una
+    consulta solo lee las celdas que toca. Hay un índice equivalente por distrito.
+    """
+
+    def __init__(self, cell_size_m: float = 250.0, initial_capacity: int = 1024,
+                 origin: Tuple[float, float] = DEFAULT_CENTER):
+        self.cell_size_m = cell_size_m
+        self.origin = origin
+        self._cos_lat0 = math.cos(math.radians(origin[0]))
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.district_names: List[str] = []
+        self.district_index: Dict[str, int] = {}
+        self.lat = np.zeros(initial_capacity, dtype=np.float64)
+        self.lon = np.zeros(initial_capacity, dtype=np.float64)
+        self.x = np.zeros(initial_capacity, dtype=np.float32)
+        self.y = np.zeros(initial_capacity, dtype=np.float32)
+        self.fill = np.zeros(initial_capacity, dtype=np.float32)
+        self.district = np.zeros(initial_capacity, dtype=np.int32)
+        self.updated_at = np.zeros(initial_capacity, dtype=np.float64)
+        self._indexed = 0
+        self._grid_order = np.zeros(0, dtype=np.int64)
+        self._grid_offsets = np.zeros(1, dtype=np.int64)
+        self._grid_shape = (0, 0)
+        self._grid_min = (0.0, 0.0)
+        self._grid_cell_m = cell_size_m
+        self._district_order = np.zeros(0, dtype=np.int64)
+        self._district_offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    _COLUMNS = ("lat", "lon", "x", "y", "fill", "district", "updated_at")
+
+    def _grow(self, needed: int):
+        capacity = len(self.lat)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def project(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        """Lat/lon → metros (equirectangular local respecto al origen)."""
+        y = np.radians(np.asarray(lat, dtype=np.float64) - self.origin[0]) * EARTH_RADIUS_M
+        x = np.radians(np.asarray(lon, dtype=np.float64) - self.origin[1]) * EARTH_RADIUS_M * self._cos_lat0
+        return x, y
+
+    def _district_of(self, name: str) -> int:
+        index = self.district_index.get(name)
+        if index is None:
+            index = self.district_index[name] = len(self.district_names)
+            self.district_names.append(name)
+        return index
+
+    def upsert(self, ids: Sequence[str], lat: Sequence[float], lon: Sequence[float],
+               districts: Sequence[str], fill: Optional[Sequence[float]] = None, now: Optional[float] = None):
+        """
+        Alta/actualización masiva de contenedores (posición, distrito y opcionalmente llenado).
+
+        Todo el lote se valida antes de tocar el almacén: un ValueError/TypeError no deja filas a medias.
+        """
+        now = time.time() if now is None else now
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        fill = None if fill is None else np.asarray(fill, dtype=np.float32)
+        lengths = {len(ids), len(lat), len(lon), len(districts)} | ({len(fill)} if fill is not None else set())
+        if len(lengths) > 1 or lat.ndim != 1 or lon.ndim != 1 or (fill is not None and fill.ndim != 1):
+            raise ValueError("columns must be flat lists of the same length")
+        if not all(isinstance(container_id, str) for container_id in ids):
+            raise TypeError("container_id must be strings")
+        if not all(isinstance(name, str) for name in districts):
+            raise TypeError("district must be strings")
+        if not (np.isfinite(lat).all() and np.isfinite(lon).all()):
+            raise ValueError("lat/lon must be finite numbers")
+        if len(lat) and (np.abs(lat).max() > 90 or np.abs(lon).max() > 180):
+            raise ValueError("lat must be within [-90, 90] and lon within [-180, 180]")
+
+        rows = np.empty(len(ids), dtype=np.int64)
+        moved = False
+        for i, container_id in enumerate(ids):
+            row = self.index.get(container_id)
+            if row is None:
+                row = self.index[container_id] = len(self.ids)
+                self.ids.append(container_id)
+            else:
+                moved = True
+            rows[i] = row
+        self._grow(len(self.ids))
+        x, y = self.project(lat, lon)
+        self.lat[rows], self.lon[rows] = lat, lon
+        self.x[rows], self.y[rows] = x, y
+        self.district[rows] = [self._district_of(name) for name in districts]
+        if fill is not None:
+            self.fill[rows] = fill
+            self.updated_at[rows] = now
+        if moved:
+            # Un contenedor ya indexado cambió de celda o distrito: se reindexa todo en la próxima consulta.
+            self._indexed = 0
+
+    def update_fill(self, ids: Sequence[str], fill: Sequence[float], now: Optional[float] = None) -> Tuple[int, List[str]]:
+        """Actualización masiva de llenado. Devuelve (actualizados, ids desconocidos)."""
+        now = time.time() if now is None else now
+        rows, values, unknown = [], [], []
+        for container_id, value in zip(ids, fill):
+            row = self.index.get(container_id)
+            if row is None:
+                unknown.append(container_id)
+            else:
+                rows.append(row)
+                values.append(value)
+        rows = np.asarray(rows, dtype=np.int64)
+        self.fill[rows] = np.clip(np.asarray(values, dtype=np.float32), 0, 100)
+        self.updated_at[rows] = now
+        return len(rows), unknown
+
+    def _ensure_index(self):
+        n = len(self.ids)
+        tail = n - self._indexed
+        if self._indexed and tail <= max(MIN_REBUILD_TAIL, MAX_UNINDEXED_FRACTION * n):
+            return
+        x, y = self.x[:n], self.y[:n]
+        min_x, min_y = (float(x.min()), float(y.min())) if n else (0.0, 0.0)
+        width, height = (float(x.max()) - min_x, float(y.max()) - min_y) if n else (0.0, 0.0)
+        # Unos pocos contenedores muy alejados no pueden disparar el tamaño de la rejilla.
+        cell = self.cell_size_m
+        if (width / cell + 1) * (height / cell + 1) > MAX_GRID_CELLS:
+            cell = max(cell, math.sqrt(width * height / MAX_GRID_CELLS))
+            while (width // cell + 1) * (height // cell + 1) > MAX_GRID_CELLS:
+                cell *= 1.25
+        nx, ny = int(width // cell) + 1, int(height // cell) + 1
+        self._grid_min, self._grid_shape, self._grid_cell_m = (min_x, min_y), (nx, ny), cell
+        cells = self._cells(x, y)
+        self._grid_order = np.argsort(cells, kind="stable")
+        self._grid_offsets = np.r_[0, np.cumsum(np.bincount(cells, minlength=nx * ny))]
+        districts = self.district[:n]
+        self._district_order = np.argsort(districts, kind="stable")
+        self._district_offsets = np.r_[0, np.cumsum(np.bincount(districts, minlength=len(self.district_names)))]
+        self._indexed = n
+
+    def _cells(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        nx, ny = self._grid_shape
+        cx = np.clip(((x - self._grid_min[0]) // self._grid_cell_m).astype(np.int64), 0, nx - 1)
+        cy = np.clip(((y - self._grid_min[1]) // self._grid_cell_m).astype(np.int64), 0, ny - 1)
+        return cy * nx + cx
+
+    def _candidates_in_box(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """Índices de los contenedores en las celdas que cortan la caja (más los aún sin indexar)."""
+        self._ensure_index()
+        nx, ny = self._grid_shape
+        cx0 = max(int((x0 - self._grid_min[0]) // self._grid_cell_m), 0)
+        cx1 = min(int((x1 - self._grid_min[0]) // self._grid_cell_m), nx - 1)
+        cy0 = max(int((y0 - self._grid_min[1]) // self._grid_cell_m), 0)
+        cy1 = min(int((y1 - self._grid_min[1]) // self._grid_cell_m), ny - 1)
+        parts = []
+        if cx0 <= cx1 and cy0 <= cy1:
+            # Cada fila de celdas de la caja es un tramo contiguo del orden CSR.
+            for cy in range(cy0, cy1 + 1):
+                start = self._grid_offsets[cy * nx + cx0]
+                stop = self._grid_offsets[cy * nx + cx1 + 1]
+                parts.append(self._grid_order[start:stop])
+        parts.append(np.arange(self._indexed, len(self.ids)))
+        return np.concatenate(parts)
+
+    def _district_members(self, name: str) -> np.ndarray:
+        self._ensure_index()
+        district = self.district_index.get(name)
+        if district is None:
+            return np.zeros(0, dtype=np.int64)
+        indexed = np.zeros(0, dtype=np.int64)
+        if district + 1 < len(self._district_offsets):
+            indexed = self._district_order[self._district_offsets[district]:self._district_offsets[district + 1]]
+        tail = np.arange(self._indexed, len(self.ids))
+        return np.r_[indexed, tail[self.district[tail] == district]]
+
+    def _filter(self, rows: np.ndarray, min_fill: Optional[float], district: Optional[str]) -> np.ndarray:
+        if min_fill is not None:
+            rows = rows[self.fill[rows] >= min_fill]
+        if district is not None:
+            rows = rows[self.district[rows] == self.district_index.get(district, -1)]
+        return rows
+
+    def within_radius(self, lat: float, lon: float, radius_m: float, min_fill: Optional[float] = None,
+                      district: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Contenedores a menos de radius_m, ordenados por distancia: (índices, distancias)."""
+        x, y = self.project(lat, lon)
+        x, y = float(x), float(y)
+        rows = self._candidates_in_box(x - radius_m, y - radius_m, x + radius_m, y + radius_m)
+        rows = self._filter(rows, min_fill, district)
+        distance = np.hypot(self.x[rows] - x, self.y[rows] - y)
+        inside = distance <= radius_m
+        rows, distance = rows[inside], distance[inside]
+        order = np.argsort(distance, kind="stable")
+        return rows[order], distance[order]
+
+    def within_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                    min_fill: Optional[float] = None, district: Optional[str] = None) -> np.ndarray:
+        x0, y0 = self.project(min_lat, min_lon)
+        x1, y1 = self.project(max_lat, max_lon)
+        rows = self._candidates_in_box(float(x0), float(y0), float(x1), float(y1))
+        rows = self._filter(rows, min_fill, district)
+        lat, lon = self.lat[rows], self.lon[rows]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return np.sort(rows[inside])
+
+    def in_district(self, name: str, min_fill: Optional[float] = None) -> np.ndarray:
+        return np.sort(self._filter(self._district_members(name), min_fill, None))
+
+    def all(self, min_fill: Optional[float] = None) -> np.ndarray:
+        return self._filter(np.arange(len(self.ids)), min_fill, None)
+
+    def location(self, container_id: str) -> Optional[Tuple[float, float]]:
+        row = self.index.get(container_id)
+        return None if row is None else (float(self.lat[row]), float(self.lon[row]))
+
+    def records(self, rows: np.ndarray, distance: Optional[np.ndarray] = None) -> List[dict]:
+        items = [
+            {
+                "id": self.ids[row],
+                "location": self.district_names[district],
+                "lat": lat,
+                "lon": lon,
+                "fill_percent": round(fill, 1),
+            }
+            for row, district, lat, lon, fill in zip(rows.tolist(), self.district[rows].tolist(),
+                                                    self.lat[rows].tolist(), self.lon[rows].tolist(),
+                                                    self.fill[rows].tolist())
+        ]
+        if distance is not None:
+            for item, d in zip(items, distance.tolist()):
+                item["distance_m"] = round(d, 1)
+        return items
+
+    def page(self, rows: np.ndarray, offset: int, limit: int, distance: Optional[np.ndarray] = None) -> dict:
+        window = slice(offset, offset + limit)
+        return {
+            "total": len(rows),
+            "offset": offset,
+            "limit": limit,
+            "items": self.records(rows[window], None if distance is None else distance[window]),
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria de los arrays columnares e índices (sin contar ids ni el dict id → fila)."""
+        columns = sum(getattr(self, name)[:len(self.ids)].nbytes for name in self._COLUMNS)
+        indexes = sum(a.nbytes for a in (self._grid_order, self._grid_offsets,
+                                         self._district_order, self._district_offsets))
+        return columns + indexes
+
+
+def simulated_fleet(store: ContainerStore, n: int, districts: int = 16, spread_deg: float = 0.1,
+                    seed: Optional[int] = None):
+    """Flota sintética alrededor del origen; los distritos son franjas de una rejilla de la ciudad."""
+    rng = np.random.default_rng(seed)
+    lat = store.origin[0] + rng.uniform(-spread_deg / 2, spread_deg / 2, n)
+    lon = store.origin[1] + rng.uniform(-spread_deg / 2, spread_deg / 2, n)
+    side = max(1, math.isqrt(districts))
+    row = ((lat - lat.min()) / (np.ptp(lat) + 1e-12) * side).astype(int).clip(0, side - 1)
+    col = ((lon - lon.min()) / (np.ptp(lon) + 1e-12) * side).astype(int).clip(0, side - 1)
+    names = [f"D-{r * side + c + 1}" for r, c in zip(row.tolist(), col.tolist())]
+    store.upsert([f"C-{i}" for i in range(n)], lat, lon, names, rng.uniform(0, 90, n))
@@ -0,0 +1,149 @@
+import hashlib
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Puntos de prioridad que gana un contenedor por cada minuto de espera
+# (uno al 75% que lleva 10 min esperando va por delante de uno recién pedido al 80%).
+AGE_WEIGHT_PER_MINUTE = 1.0
+EARTH_RADIUS_M = 6_371_000.0
+# Zona simulada para contenedores sin coordenadas conocidas.
+DEFAULT_CENTER = (-1.2921, 36.8219)
+DEFAULT_SPREAD_DEG = 0.05
+
+_REMOVED = "<removed>"
+
+
+def simulated_location(container_id: str) -> Tuple[float, float]:
+    """Coordenadas deterministas a partir del id (para contenedores aún sin ubicar)."""
+    digest = hashlib.blake2b(container_id.encode(), digest_size=8).digest()
+    a, b = int.from_bytes(digest[:4], "big"), int.from_bytes(digest[4:], "big")
+    return (DEFAULT_CENTER[0] + (a / 2**32 - 0.5) * DEFAULT_SPREAD_DEG,
+            DEFAULT_CENTER[1] + (b / 2**32 - 0.5) * DEFAULT_SPREAD_DEG)
+
+
+def priority_key(fill_percent: float, requested_at: float) -> float:
+    """
+    Prioridad = llenado + AGE_WEIGHT · minutos de espera. La diferencia entre dos
+    contenedores no depende del instante actual, así que la clave es estable en el heap.
+    """
+    return -(fill_percent - AGE_WEIGHT_PER_MINUTE * requested_at / 60.0)
+
+
+class PickupScheduler:
+    """
+    Cola de recogidas como heap con índice id → entrada.
+
+    Una nueva petición del mismo contenedor no se duplica: la entrada anterior se
+    marca como eliminada (borrado perezoso) y se inserta la nueva, todo en O(log n).
+    """
+
+    def __init__(self):
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def request(self, container_id: str, fill_percent: float, location: Optional[Tuple[float, float]] = None,
+                now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        previous = self._entries.pop(container_id, None)
+        requested_at = now
+        if previous is not None:
+            previous[-1] = _REMOVED
+            requested_at = previous[3]["requested_at"]  # la antigüedad se conserva al actualizar
+            location = location or previous[3]["location"]
+        info = {
+            "container_id": container_id,
+            "fill_percent": fill_percent,
+            "requested_at": requested_at,
+            "location": location or simulated_location(container_id),
+        }
+        entry = [priority_key(fill_percent, requested_at), next(self._counter), container_id, info, container_id]
+        self._entries[container_id] = entry
+        heapq.heappush(self._heap, entry)
+        self._compact()
+        return info
+
+    def cancel(self, container_id: str) -> bool:
+        entry = self._entries.pop(container_id, None)
+        if entry is None:
+            return False
+        entry[-1] = _REMOVED
+        return True
+
+    def pop_batch(self, size: int) -> List[dict]:
+        batch = []
+        while self._heap and len(batch) < size:
+            entry = heapq.heappop(self._heap)
+            if entry[-1] is _REMOVED:
+                continue
+            del self._entries[entry[2]]
+            batch.append(entry[3])
+        return batch
+
+    def peek(self, limit: int) -> List[dict]:
+        live = (entry for entry in self._heap if entry[-1] is not _REMOVED)
+        return [entry[3] for entry in heapq.nsmallest(limit, live)]
+
+    def _compact(self):
+        # Si las entradas eliminadas dominan el heap, se reconstruye (amortizado O(1) por operación).
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [entry for entry in self._heap if entry[-1] is not _REMOVED]
+            heapq.heapify(self._heap)
+
+
+def _to_metres(points: np.ndarray, origin: Tuple[float, float]) -> np.ndarray:
+    """Proyección equirectangular local (suficiente a escala de ciudad)."""
+    lat0 = math.radians(origin[0])
+    lat = np.radians(points[:, 0] - origin[0]) * EARTH_RADIUS_M
+    lon = np.radians(points[:, 1] - origin[1]) * EARTH_RADIUS_M * math.cos(lat0)
+    return np.column_stack([lat, lon])
+
+
+def plan_route(depot: Tuple[float, float], stops: List[Tuple[float, float]],
+               max_2opt_passes: int = 50) -> Tuple[List[int], float]:
+    """
+    Orden de visita (índices de `stops`) saliendo y volviendo al depósito:
+    vecino más próximo y mejora 2-opt. Devuelve (orden, distancia en metros).
+    """
+    if not stops:
+        return [], 0.0
+    coords = _to_metres(np.array([depot] + list(stops), dtype=np.float64), depot)
+    dist = np.sqrt(((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis=2))
+
+    n = len(coords)
+    tour = [0]
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[0] = False
+    for _ in range(n - 1):
+        candidates = np.where(unvisited, dist[tour[-1]], np.inf)
+        nxt = int(np.argmin(candidates))
+        tour.append(nxt)
+        unvisited[nxt] = False
+    tour.append(0)
+    tour = np.array(tour)
+
+    for _ in range(max_2opt_passes):
+        improved = False
+        for i in range(1, len(tour) - 2):
+            # Ganancia de invertir tour[i..j] para todos los j a la vez.
+            a, b = tour[i - 1], tour[i]
+            c, d = tour[i + 1:-1], tour[i + 2:]
+            gain = dist[a, b] + dist[c, d] - dist[a, c] - dist[b, d]
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                j += i + 1
+                tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+
+    length = float(dist[tour[:-1], tour[1:]].sum())
+    return [int(k) - 1 for k in tour[1:-1]], length
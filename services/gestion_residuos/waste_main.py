@@ -1,10 +1,19 @@
 import asyncio
+import itertools
 import logging
-import httpx
 import os
-from fastapi import FastAPI
+import time
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from services.gestion_residuos.container_store import ContainerStore, simulated_fleet
+from services.gestion_residuos.pickup_scheduler import DEFAULT_CENTER, PickupScheduler, plan_route
+from wakanda_shared.bootstrap import ServiceRegistration
+from wakanda_shared.diagnostics import setup_diagnostics
+from wakanda_shared.shared_state import CommandChannel, SharedSnapshot, WriterLease, run_as_writer
 
 try:
     from wakanda_shared.telemetry import setup_telemetry
@@ -14,47 +23,293 @@ except ImportError:
 SERVICE_NAME = "gestion_residuos"
 SERVICE_PORT = int(os.getenv("PORT", 8004))
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://service_registry:8000/register")
+TRUCKS = int(os.getenv("WASTE_TRUCKS", 5))
+TRUCK_CAPACITY = int(os.getenv("WASTE_TRUCK_CAPACITY", 25))
+PLAN_INTERVAL = float(os.getenv("WASTE_PLAN_INTERVAL", 10.0))
+DEPOT = (float(os.getenv("WASTE_DEPOT_LAT", DEFAULT_CENTER[0])), float(os.getenv("WASTE_DEPOT_LON", DEFAULT_CENTER[1])))
+MAX_QUEUE_PAGE = 500
+MAX_PAGE_SIZE = 1000
+MAX_RADIUS_M = 20_000
+PICKUP_THRESHOLD = 70
+SIMULATED_CONTAINERS = int(os.getenv("WASTE_CONTAINERS", 100_000))
+FILL_TICK_SECONDS = float(os.getenv("WASTE_FILL_TICK_SECONDS", 30.0))
+# Como mucho cada cuánto se republican flota, cola y rutas para los demás workers.
+SNAPSHOT_INTERVAL = float(os.getenv("WASTE_SNAPSHOT_INTERVAL", 0.2))
 
 class PickupRequest(BaseModel):
     container_id: str
     fill_level_percent: int
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+store = ContainerStore()
+scheduler = PickupScheduler()
+routes: Dict[str, dict] = {}
+assigned: Dict[str, str] = {}  # container_id -> route_id
+route_ids = itertools.count(1)
+plan_event: Optional[asyncio.Event] = None
+# Con varios workers, la flota, la cola y las rutas viven en el worker escritor
+# (el planificador necesita una única cola): el resto le envía las escrituras y las
+# consultas espaciales, y sirve el resumen de flota, la cola y las rutas desde memoria compartida.
+writer = WriterLease(SERVICE_NAME)
+commands = CommandChannel(SERVICE_NAME, writer)
+fleet_snapshot = SharedSnapshot(f"{SERVICE_NAME}-fleet")
+queue_snapshot = SharedSnapshot(f"{SERVICE_NAME}-queue")
+routes_snapshot = SharedSnapshot(f"{SERVICE_NAME}-routes")
+snapshots_stale = True
+
+registration = ServiceRegistration(SERVICE_NAME, SERVICE_PORT, REGISTRY_URL)
+
+def free_trucks():
+    busy = {route["truck_id"] for route in routes.values()}
+    return [f"T-{i}" for i in range(1, TRUCKS + 1) if f"T-{i}" not in busy]
+
+async def plan_routes():
+    """Asigna a cada camión libre un lote con los contenedores más prioritarios y calcula su ruta."""
+    for truck_id in free_trucks():
+        batch = scheduler.pop_batch(TRUCK_CAPACITY)
+        if not batch:
+            return
+        route_id = f"R-{next(route_ids)}"
+        for container in batch:
+            assigned[container["container_id"]] = route_id
+        routes[route_id] = {"route_id": route_id, "truck_id": truck_id, "status": "planning", "stops": batch}
+        state_changed()
+        try:
+            # El cálculo (vecino más próximo + 2-opt) va a un hilo: el event loop sigue atendiendo peticiones.
+            order, distance_m = await asyncio.to_thread(plan_route, DEPOT, [c["location"] for c in batch])
+        except Exception:
+            # Sin ruta: el camión queda libre y los contenedores vuelven a la cola con su antigüedad.
+            del routes[route_id]
+            for container in batch:
+                assigned.pop(container["container_id"], None)
+                scheduler.request(container["container_id"], container["fill_percent"], container["location"],
+                                  now=container["requested_at"])
+            state_changed()
+            raise
+        routes[route_id].update(
+            status="assigned",
+            stops=[batch[i] for i in order],
+            distance_m=round(distance_m, 1),
+            planned_at=time.time(),
+        )
+        state_changed()
+        logging.info(f"🚛 Ruta {route_id} para {truck_id}: {len(batch)} contenedores, {distance_m / 1000:.1f} km")
 
-pickup_queue = []
+async def fill_simulation_loop():
+    """Los contenedores se llenan poco a poco; los que cruzan el umbral piden recogida solos."""
+    rng = np.random.default_rng()
+    while True:
+        await asyncio.sleep(FILL_TICK_SECONDS)
+        n = len(store)
+        before = store.fill[:n].copy()
+        store.fill[:n] = np.minimum(before + rng.exponential(0.5, n).astype(np.float32), 100)
+        store.updated_at[:n] = time.time()
+        for row in np.flatnonzero((before <= PICKUP_THRESHOLD) & (store.fill[:n] > PICKUP_THRESHOLD)).tolist():
+            container_id = store.ids[row]
+            if container_id not in assigned:
+                scheduler.request(container_id, float(store.fill[row]), store.location(container_id))
+        state_changed()
+        if len(scheduler) >= TRUCK_CAPACITY:
+            plan_event.set()
 
-async def register_service():
-    await asyncio.sleep(3)
-    async with httpx.AsyncClient() as client:
+async def planner_loop():
+    while True:
         try:
-            my_url = f"http://{SERVICE_NAME}:{SERVICE_PORT}"
-            await client.post(REGISTRY_URL, json={
-                "service_name": SERVICE_NAME, "url": my_url, "health_url": f"{my_url}/health"
-            })
-            logging.info(f"✅ {SERVICE_NAME} Registrado")
+            await asyncio.wait_for(plan_event.wait(), PLAN_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        plan_event.clear()
+        try:
+            await plan_routes()
         except Exception:
-            logging.error(f"⚠️ Fallo registro {SERVICE_NAME}")
+            logging.exception("⚠️ Fallo planificando rutas")
+
+def state_changed():
+    global snapshots_stale
+    snapshots_stale = True
+
+def refresh_snapshots():
+    n = len(store)
+    fleet_snapshot.update({
+        "containers": n,
+        "districts": len(store.district_names),
+        "grid_cell_m": store.cell_size_m,
+        "array_bytes": store.nbytes,
+        "array_bytes_per_container": round(store.nbytes / n, 1) if n else 0,
+    })
+    queue_snapshot.update({"queue_length": len(scheduler), "items": scheduler.peek(MAX_QUEUE_PAGE)})
+    routes_snapshot.update({"free_trucks": free_trucks(), "routes": list(routes.values())})
+
+async def snapshot_loop():
+    """Republica flota, cola y rutas cuando cambian; la cola (nsmallest sobre el heap) no se recalcula por petición."""
+    global snapshots_stale
+    while True:
+        if snapshots_stale:
+            snapshots_stale = False
+            refresh_snapshots()
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+
+async def writer_loop():
+    # Solo el escritor guarda la flota: se genera al tomar ese papel, no al importar el módulo en cada worker.
+    if SIMULATED_CONTAINERS and not len(store):
+        simulated_fleet(store, SIMULATED_CONTAINERS, seed=7)
+        state_changed()
+    loops = [planner_loop, snapshot_loop, commands.serve] + ([fill_simulation_loop] if SIMULATED_CONTAINERS else [])
+    await asyncio.gather(*(loop() for loop in loops))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(register_service())
+    global plan_event
+    plan_event = asyncio.Event()
+    writer.try_acquire()
+    registration.start()
+    tasks = [asyncio.create_task(run_as_writer(writer, writer_loop))]
     yield
+    await registration.stop()
+    for task in tasks:
+        task.cancel()
 
 app = FastAPI(lifespan=lifespan, title="Wakanda Waste")
 setup_telemetry(app, SERVICE_NAME)
+setup_diagnostics(app)
+
+def parse_columns(payload, required):
+    """Lote columnar {"col": [...], ...}: todas las columnas presentes deben tener la misma longitud."""
+    try:
+        columns = {name: payload[name] for name in required}
+        lengths = {len(v) for v in payload.values() if isinstance(v, list)}
+        if len(lengths) > 1 or not all(isinstance(v, list) for v in columns.values()):
+            raise ValueError("columns must be lists of the same length")
+        return columns
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch: {e}")
 
 @app.get("/waste/containers")
-async def get_containers():
-    # Datos simulados
-    return [
-        {"id": "C-101", "location": "Plaza Central", "fill_percent": 85},
-        {"id": "C-102", "location": "Av. Wakanda", "fill_percent": 20}
-    ]
+async def get_containers(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                         min_fill: Optional[float] = Query(None, ge=0, le=100), district: Optional[str] = None):
+    """Contenedores paginados; con `district` solo recorre los de ese distrito."""
+    return await commands.call("containers", {"offset": offset, "limit": limit, "min_fill": min_fill,
+                                              "district": district})
+
+@commands.handler("containers")
+def list_containers(q: dict):
+    rows = store.in_district(q["district"], q["min_fill"]) if q["district"] else store.all(q["min_fill"])
+    return store.page(rows, q["offset"], q["limit"])
+
+@app.get("/waste/containers/near")
+async def containers_near(lat: float, lon: float, radius_m: float = Query(500, gt=0, le=MAX_RADIUS_M),
+                          min_fill: Optional[float] = Query(None, ge=0, le=100), district: Optional[str] = None,
+                          offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)):
+    """Contenedores a menos de radius_m metros del punto, del más cercano al más lejano."""
+    return await commands.call("near", {"lat": lat, "lon": lon, "radius_m": radius_m, "min_fill": min_fill,
+                                        "district": district, "offset": offset, "limit": limit})
+
+@commands.handler("near")
+def near_query(q: dict):
+    rows, distance = store.within_radius(q["lat"], q["lon"], q["radius_m"], q["min_fill"], q["district"])
+    return store.page(rows, q["offset"], q["limit"], distance)
+
+@app.get("/waste/containers/bbox")
+async def containers_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                             min_fill: Optional[float] = Query(None, ge=0, le=100), district: Optional[str] = None,
+                             offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+    return await commands.call("bbox", {"box": [min_lat, min_lon, max_lat, max_lon], "min_fill": min_fill,
+                                        "district": district, "offset": offset, "limit": limit})
+
+@commands.handler("bbox")
+def bbox_query(q: dict):
+    return store.page(store.within_bbox(*q["box"], q["min_fill"], q["district"]), q["offset"], q["limit"])
+
+@app.post("/waste/containers")
+async def register_containers(request: Request):
+    """Alta masiva: {"container_id": [...], "lat": [...], "lon": [...], "district": [...], "fill_percent": [...]?}."""
+    payload = await request.json()
+    columns = parse_columns(payload, ("container_id", "lat", "lon", "district"))
+    columns["fill_percent"] = payload.get("fill_percent")
+    return await commands.call("register", columns)
+
+@commands.handler("register")
+def upsert_containers(columns: dict):
+    try:
+        store.upsert(columns["container_id"], np.asarray(columns["lat"], dtype=np.float64),
+                     np.asarray(columns["lon"], dtype=np.float64), [str(d) for d in columns["district"]],
+                     columns["fill_percent"])
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch: {e}")
+    state_changed()
+    return {"registered": len(columns["container_id"]), "containers": len(store)}
+
+@app.post("/waste/containers/fill")
+async def update_fill_levels(request: Request):
+    """Actualización masiva de llenado: {"container_id": [...], "fill_percent": [...]}."""
+    return await commands.call("fill", parse_columns(await request.json(), ("container_id", "fill_percent")))
+
+@commands.handler("fill")
+def apply_fill_levels(columns: dict):
+    try:
+        updated, unknown = store.update_fill(columns["container_id"], columns["fill_percent"])
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch: {e}")
+    return {"updated": updated, "unknown": unknown[:10], "unknown_count": len(unknown)}
+
+@app.get("/waste/fleet")
+async def fleet_info(request: Request):
+    return fleet_snapshot.response(request)
 
 @app.post("/waste/request_pickup")
 async def request_pickup(request: PickupRequest):
-    if request.fill_level_percent > 70:
-        pickup_queue.append(request.container_id)
-        return {"status": "scheduled", "queue_position": len(pickup_queue)}
-    return {"status": "ignored", "reason": "fill level too low"}
+    """Encola (o actualiza) la recogida en O(log n); la ruta se planifica en segundo plano."""
+    if request.fill_level_percent <= 70:
+        return {"status": "ignored", "reason": "fill level too low"}
+    return await commands.call("pickup", request.dict())
+
+@commands.handler("pickup")
+def schedule_pickup(payload: dict):
+    request = PickupRequest(**payload)
+    route_id = assigned.get(request.container_id)
+    if route_id is not None:
+        return {"status": "already_assigned", "route_id": route_id}
+    location = (request.lat, request.lon) if request.lat is not None and request.lon is not None else None
+    if request.container_id in store.index:
+        store.update_fill([request.container_id], [request.fill_level_percent])
+        location = location or store.location(request.container_id)
+    scheduler.request(request.container_id, request.fill_level_percent, location)
+    state_changed()
+    # Lote completo y camión disponible: no se espera al siguiente ciclo del planificador.
+    if plan_event is not None and len(scheduler) >= TRUCK_CAPACITY and len(routes) < TRUCKS:
+        plan_event.set()
+    return {"status": "scheduled", "queue_length": len(scheduler)}
+
+@app.get("/waste/pickup_queue")
+async def get_pickup_queue(limit: int = Query(50, ge=1, le=MAX_QUEUE_PAGE)):
+    """Cola de recogidas por prioridad, tal como la publicó el escritor hace como mucho WASTE_SNAPSHOT_INTERVAL."""
+    queue = queue_snapshot.data() or {"queue_length": 0, "items": []}
+    return {"queue_length": queue["queue_length"], "items": queue["items"][:limit]}
+
+@app.get("/waste/routes")
+async def get_routes(request: Request):
+    return routes_snapshot.response(request)
+
+@app.post("/waste/routes/{route_id}/complete")
+async def complete_route(route_id: str):
+    return await commands.call("complete", route_id)
+
+@commands.handler("complete")
+def finish_route(route_id: str):
+    route = routes.get(route_id)
+    if route is None or route["status"] != "assigned":
+        raise HTTPException(status_code=404, detail="Route not found")
+    del routes[route_id]
+    collected = [stop["container_id"] for stop in route["stops"]]
+    for container_id in collected:
+        assigned.pop(container_id, None)
+    store.update_fill(collected, [0.0] * len(collected))
+    state_changed()
+    plan_event.set()
+    return {"status": "completed", "route_id": route_id, "collected": len(route["stops"])}
 
 @app.get("/health")
-async def health(): return {"status": "ok"}
\ No newline at end of file
+async def health(): return {"status": "ok"}
@@ -0,0 +1,175 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from wakanda_shared.shared_state import SeqLock, SharedRegion
+
+
+class RingBuffer:
+    """
+    Buffer circular preasignado: una fila por instante y una columna por intersección.
+
+    Todas las intersecciones se muestrean en el mismo tick, así que la marca de
+    tiempo es única por fila. Cada append escribe una fila contigua.
+    `storage` permite colocar los arrays (ver layout()) en memoria compartida.
+    """
+
+    def __init__(self, capacity: int, n_series: int, fields: Sequence[str], dtype=np.float32,
+                 storage: Optional[Dict[str, np.ndarray]] = None):
+        self.capacity = capacity
+        if storage is None:
+            storage = {name: np.zeros(shape, dt)
+                       for name, (dt, shape) in self.layout(capacity, n_series, fields, dtype).items()}
+        self.timestamps = storage["timestamps"]
+        self.fields = {name: storage[name] for name in fields}
+        # cursor = [head, count]
+        self.cursor = storage["cursor"]
+
+    @staticmethod
+    def layout(capacity: int, n_series: int, fields: Sequence[str], dtype=np.float32) -> dict:
+        return {"timestamps": (np.float64, (capacity,)), "cursor": (np.int64, (2,)),
+                **{name: (dtype, (capacity, n_series)) for name in fields}}
+
+    @property
+    def head(self) -> int:
+        return int(self.cursor[0])
+
+    @property
+    def count(self) -> int:
+        return int(self.cursor[1])
+
+    def append(self, timestamp: float, values: Dict[str, np.ndarray]):
+        row = self.head
+        self.timestamps[row] = timestamp
+        for name, column in values.items():
+            self.fields[name][row] = column
+        self.cursor[0] = (row + 1) % self.capacity
+        self.cursor[1] = min(self.count + 1, self.capacity)
+
+    def _segments(self) -> List[Tuple[int, int]]:
+        # Filas en orden cronológico, como a lo sumo dos tramos contiguos.
+        if self.count < self.capacity:
+            return [(0, self.count)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    def query(self, index: int, since: float = -math.inf, until: float = math.inf) -> Dict[str, list]:
+        """Valores de la intersección `index` con since <= ts <= until; solo copia las filas pedidas."""
+        result = {"timestamps": []}
+        result.update({name: [] for name in self.fields})
+        for start, stop in self._segments():
+            ts = self.timestamps[start:stop]
+            lo = start + int(np.searchsorted(ts, since, side="left"))
+            hi = start + int(np.searchsorted(ts, until, side="right"))
+            if lo >= hi:
+                continue
+            result["timestamps"].extend(self.timestamps[lo:hi].tolist())
+            for name, data in self.fields.items():
+                result[name].extend(data[lo:hi, index].tolist())
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + sum(data.nbytes for data in self.fields.values())
+
+
+class Rollup:
+    """Agregados min/max/media por ventana fija (p. ej. 60 s) sobre las muestras crudas."""
+
+    def __init__(self, period: float, capacity: int, n_series: int, metrics: Sequence[str],
+                 storage: Optional[Dict[str, np.ndarray]] = None):
+        self.period = period
+        self.metrics = list(metrics)
+        self.buffer = RingBuffer(capacity, n_series, self.fields(metrics), storage=storage)
+        self._bucket: Optional[float] = None
+        self._count = 0
+        self._sum = {m: np.zeros(n_series, dtype=np.float64) for m in self.metrics}
+        self._min = {m: np.full(n_series, np.inf, dtype=np.float32) for m in self.metrics}
+        self._max = {m: np.full(n_series, -np.inf, dtype=np.float32) for m in self.metrics}
+
+    @staticmethod
+    def fields(metrics: Sequence[str]) -> List[str]:
+        return [f"{m}_{stat}" for m in metrics for stat in ("min", "max", "mean")]
+
+    def add(self, timestamp: float, values: Dict[str, np.ndarray]):
+        bucket = timestamp - timestamp % self.period
+        if self._bucket is not None and bucket != self._bucket:
+            self.flush()
+        self._bucket = bucket
+        self._count += 1
+        for m in self.metrics:
+            self._sum[m] += values[m]
+            np.minimum(self._min[m], values[m], out=self._min[m])
+            np.maximum(self._max[m], values[m], out=self._max[m])
+
+    def flush(self):
+        if self._count == 0:
+            return
+        row = {}
+        for m in self.metrics:
+            row[f"{m}_min"] = self._min[m]
+            row[f"{m}_max"] = self._max[m]
+            row[f"{m}_mean"] = self._sum[m] / self._count
+        self.buffer.append(self._bucket, row)
+        self._count = 0
+        for m in self.metrics:
+            self._sum[m].fill(0.0)
+            self._min[m].fill(np.inf)
+            self._max[m].fill(-np.inf)
+
+    @property
+    def nbytes(self) -> int:
+        accumulators = sum(a.nbytes for acc in (self._sum, self._min, self._max) for a in acc.values())
+        return self.buffer.nbytes + accumulators
+
+
+class TrafficHistory:
+    """
+    Histórico acotado por intersección: muestras crudas + rollups de 1 y 5 minutos.
+
+    Con `shared_name` los buffers viven en memoria compartida: registra un único worker
+    (los acumuladores de los rollups son locales a él) y cualquiera consulta.
+    """
+
+    METRICS = ("vehicle_count", "average_speed_kmh")
+    PERIODS = {"1m": 60.0, "5m": 300.0}
+
+    def __init__(self, n_intersections: int, raw_capacity: int, rollup_1m_capacity: int, rollup_5m_capacity: int,
+                 shared_name: Optional[str] = None):
+        capacities = {"raw": raw_capacity, "1m": rollup_1m_capacity, "5m": rollup_5m_capacity}
+        storage = {name: None for name in capacities}
+        version = np.zeros(1, dtype=np.uint64)
+        if shared_name is not None:
+            layout = {"version": (np.uint64, (1,))}
+            for name, capacity in capacities.items():
+                fields = self.METRICS if name == "raw" else Rollup.fields(self.METRICS)
+                layout.update({f"{name}.{k}": v for k, v in RingBuffer.layout(capacity, n_intersections, fields).items()})
+            arrays = SharedRegion(shared_name, layout).arrays
+            version = arrays["version"]
+            storage = {name: {k.split(".", 1)[1]: v for k, v in arrays.items() if k.startswith(name + ".")}
+                       for name in capacities}
+        self.lock = SeqLock(version)
+        self.raw = RingBuffer(raw_capacity, n_intersections, self.METRICS, storage=storage["raw"])
+        self.rollups = {
+            name: Rollup(period, capacities[name], n_intersections, self.METRICS, storage=storage[name])
+            for name, period in self.PERIODS.items()
+        }
+
+    def record(self, timestamp: float, vehicle_count: np.ndarray, average_speed_kmh: np.ndarray):
+        values = {"vehicle_count": vehicle_count, "average_speed_kmh": average_speed_kmh}
+        with self.lock.write():
+            self.raw.append(timestamp, values)
+            for rollup in self.rollups.values():
+                rollup.add(timestamp, values)
+
+    def query(self, index: int, resolution: str, since: float, until: float) -> Dict[str, list]:
+        buffer = self.raw if resolution == "raw" else self.rollups[resolution].buffer
+        return self.lock.read(buffer.query, index, since, until)
+
+    def info(self) -> dict:
+        return {
+            "raw": {"capacity": self.raw.capacity, "samples": self.raw.count},
+            **{name: {"period_seconds": r.period, "capacity": r.buffer.capacity, "samples": r.buffer.count}
+               for name, r in self.rollups.items()},
+            "memory_bytes": self.raw.nbytes + sum(r.nbytes for r in self.rollups.values()),
+        }
@@ -0,0 +1,158 @@
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from wakanda_shared.shared_state import SeqLock, SharedRegion
+
+PHASES = ("RED", "GREEN", "YELLOW")
+RED, GREEN, YELLOW = 0, 1, 2
+
+RED_SECONDS = 30.0
+YELLOW_SECONDS = 4.0
+SATURATION_FLOW = 0.5  # vehículos/s que cruzan con el semáforo en verde
+MAX_QUEUE = 200
+MAX_GREEN_SECONDS = 600  # green_seconds es int16; también evita verdes absurdos
+
+
+class TrafficEngine:
+    """
+    Simulación vectorizada de N intersecciones.
+
+    El estado de cada intersección vive en arrays columnares (una posición por
+    intersección) y tick() avanza todas a la vez con operaciones NumPy.
+    La intersección i tiene el id "I-{i}".
+
+    Con `shared_name` los arrays viven en memoria compartida (SharedRegion): un único
+    worker escribe (tick, set_green_seconds) y el resto lee bajo un SeqLock.
+    """
+
+    def __init__(self, n_intersections: int, default_green_seconds: int = 30, seed: Optional[int] = None,
+                 shared_name: Optional[str] = None):
+        self.size = n_intersections
+        self.default_green_seconds = default_green_seconds
+        self.rng = np.random.default_rng(seed)
+        layout = self.layout(n_intersections)
+        if shared_name is None:
+            columns = {name: np.zeros(shape, dtype) for name, (dtype, shape) in layout.items()}
+            self._initialize(columns)
+        else:
+            columns = SharedRegion(shared_name, layout, initialize=self._initialize).arrays
+        self.vehicle_count = columns["vehicle_count"]
+        self.average_speed_kmh = columns["average_speed_kmh"]
+        self.phase = columns["phase"]
+        self.green_seconds = columns["green_seconds"]
+        self.phase_elapsed = columns["phase_elapsed"]
+        self.arrival_rate = columns["arrival_rate"]
+        # clock = [epoch del último tick, nº de ticks]
+        self.clock = columns["clock"]
+        self.lock = SeqLock(columns["version"])
+
+    @staticmethod
+    def layout(n_intersections: int) -> dict:
+        n = (n_intersections,)
+        return {
+            "vehicle_count": (np.int32, n), "average_speed_kmh": (np.float32, n), "phase": (np.int8, n),
+            "green_seconds": (np.int16, n), "phase_elapsed": (np.float32, n), "arrival_rate": (np.float32, n),
+            "clock": (np.float64, (2,)), "version": (np.uint64, (1,)),
+        }
+
+    def _initialize(self, columns: Dict[str, np.ndarray]):
+        n = self.size
+        columns["phase"][:] = self.rng.integers(0, 3, n, dtype=np.int8)
+        columns["green_seconds"][:] = self.default_green_seconds
+        # Desfase aleatorio para que no cambien todos los semáforos a la vez.
+        columns["phase_elapsed"][:] = self.rng.uniform(0, RED_SECONDS, n)
+        columns["arrival_rate"][:] = self.rng.uniform(0.05, 0.6, n)
+        columns["clock"][0] = time.time()
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.utcfromtimestamp(self.clock[0]).isoformat()
+
+    @property
+    def ticks(self) -> int:
+        return int(self.clock[1])
+
+    def index_of(self, intersection_id: str) -> Optional[int]:
+        prefix, _, number = intersection_id.partition("-")
+        # Solo dígitos ASCII: isdigit() acepta "²", que int() no sabe convertir.
+        if prefix != "I" or not (number.isascii() and number.isdigit()):
+            return None
+        index = int(number)
+        return index if index < self.size else None
+
+    def tick(self, dt: float):
+        with self.lock.write():
+            self._tick(dt)
+
+    def _tick(self, dt: float):
+        arrivals = self.rng.poisson(self.arrival_rate * dt).astype(np.int32)
+        capacity = np.where(self.phase == GREEN, SATURATION_FLOW * dt,
+                            np.where(self.phase == YELLOW, SATURATION_FLOW * dt / 2, 0.0))
+        # Salidas aleatorias con media `capacity`: truncarla a entero dejaría salir 0 vehículos con ticks cortos.
+        departures = np.minimum(self.vehicle_count, self.rng.poisson(capacity).astype(np.int32))
+        np.clip(self.vehicle_count + arrivals - departures, 0, MAX_QUEUE, out=self.vehicle_count)
+
+        speed = np.maximum(5.0, 60.0 - self.vehicle_count * 0.8)
+        self.average_speed_kmh[:] = np.where(self.vehicle_count > 0, speed, 0.0)
+
+        self.phase_elapsed += dt
+        durations = np.where(self.phase == GREEN, self.green_seconds,
+                             np.where(self.phase == YELLOW, YELLOW_SECONDS, RED_SECONDS))
+        advance = self.phase_elapsed >= durations
+        self.phase[advance] = (self.phase[advance] + 1) % 3
+        self.phase_elapsed[advance] = 0.0
+
+        self.clock[0] = time.time()
+        self.clock[1] += 1
+
+    def set_green_seconds(self, index: int, seconds: int):
+        with self.lock.write():
+            self.green_seconds[index] = seconds
+
+    def status(self, index: int) -> dict:
+        return self.lock.read(self._status, index)
+
+    def _status(self, index: int) -> dict:
+        return {
+            "intersection_id": f"I-{index}",
+            "timestamp": self.timestamp,
+            "vehicle_count": int(self.vehicle_count[index]),
+            "average_speed_kmh": round(float(self.average_speed_kmh[index]), 2),
+            "signal_phase": PHASES[self.phase[index]],
+            "recommended_adjustment": {"new_green_seconds": int(self.green_seconds[index])},
+        }
+
+    def page(self, offset: int, limit: int, min_vehicles: int = 0) -> dict:
+        """Página de estados; con min_vehicles solo cuentan las intersecciones que lo alcanzan."""
+        return self.lock.read(self._page, offset, limit, min_vehicles)
+
+    def _page(self, offset: int, limit: int, min_vehicles: int) -> dict:
+        if min_vehicles > 0:
+            matches = np.flatnonzero(self.vehicle_count >= min_vehicles)
+            total = len(matches)
+            indices = matches[offset:offset + limit]
+        else:
+            total = self.size
+            indices = range(offset, min(offset + limit, self.size))
+        return {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "items": [self._status(int(i)) for i in indices],
+        }
+
+    def summary(self) -> dict:
+        return self.lock.read(self._summary)
+
+    def _summary(self) -> dict:
+        return {
+            "intersections": self.size,
+            "timestamp": self.timestamp,
+            "ticks": self.ticks,
+            "total_vehicles": int(self.vehicle_count.sum()),
+            "average_speed_kmh": round(float(self.average_speed_kmh.mean()), 2) if self.size else 0.0,
+            "phases": {name: int(n) for name, n in zip(PHASES, np.bincount(self.phase, minlength=3))},
+        }
@@ -1,12 +1,17 @@
 import asyncio
 import logging
-import random
-import httpx
 import os
-from datetime import datetime
-from fastapi import FastAPI
-from pydantic import BaseModel
+import time
+from fastapi import FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
+from typing import Literal, Optional
+
+from services.gestion_trafico.history import TrafficHistory
+from services.gestion_trafico.simulation_engine import MAX_GREEN_SECONDS, TrafficEngine
+from wakanda_shared.bootstrap import ServiceRegistration
+from wakanda_shared.diagnostics import setup_diagnostics
+from wakanda_shared.shared_state import CommandChannel, SharedSnapshot, WriterLease, run_as_writer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("gestion_trafico")
@@ -40,64 +45,62 @@ class TrafficStatus(BaseModel):
 
 class TrafficUpdate(BaseModel):
     intersection_id: str
-    duration: int
+    duration: int = Field(gt=0, le=MAX_GREEN_SECONDS)
 
 
 SIMULATION_RUNNING = False
-CURRENT_GREEN_DURATION = 30
-
-current_status = TrafficStatus(
-    intersection_id="I-12",
-    timestamp=datetime.utcnow().isoformat(),
-    vehicle_count=0,
-    average_speed_kmh=0.0,
-    signal_phase="RED",
-    recommended_adjustment=TrafficAdjustment(new_green_seconds=30)
-)
+DEFAULT_INTERSECTION = os.getenv("TRAFFIC_DEFAULT_INTERSECTION", "I-12")
+N_INTERSECTIONS = int(os.getenv("TRAFFIC_INTERSECTIONS", 10000))
+TICK_SECONDS = float(os.getenv("TRAFFIC_TICK_SECONDS", 3.0))
+MAX_PAGE_SIZE = 1000
+# Capacidad (nº de muestras) de cada nivel del histórico; fija la memoria máxima.
+HISTORY_RAW_CAPACITY = int(os.getenv("TRAFFIC_HISTORY_RAW", 100))
+HISTORY_1M_CAPACITY = int(os.getenv("TRAFFIC_HISTORY_1M", 30))
+HISTORY_5M_CAPACITY = int(os.getenv("TRAFFIC_HISTORY_5M", 36))
+
+# Estado en memoria compartida: con `uvicorn --workers N` todos los workers leen los mismos arrays.
+# Solo el worker escritor avanza la simulación y aplica los cambios (los demás se los envían).
+engine = TrafficEngine(N_INTERSECTIONS, shared_name=f"{SERVICE_NAME}-engine")
+history = TrafficHistory(N_INTERSECTIONS, HISTORY_RAW_CAPACITY, HISTORY_1M_CAPACITY, HISTORY_5M_CAPACITY,
+                         shared_name=f"{SERVICE_NAME}-history")
+writer = WriterLease(SERVICE_NAME)
+commands = CommandChannel(SERVICE_NAME, writer)
+# /status se sirve desde estos bytes, que solo se regeneran cuando cambia el estado.
+status_snapshot = SharedSnapshot(f"{SERVICE_NAME}-status")
+
+
+def refresh_status_snapshot():
+    index = engine.index_of(DEFAULT_INTERSECTION)
+    if index is not None:
+        status_snapshot.update(engine.status(index))
 
 
 async def simulate_traffic_cycle():
-    global current_status
-    phases = ["RED", "GREEN", "YELLOW"]
+    refresh_status_snapshot()
+    last = time.monotonic()
     while SIMULATION_RUNNING:
-        vehicle_count = random.randint(0, 50)
-        speed = max(5.0, 60.0 - vehicle_count * 0.8) if vehicle_count > 0 else 0.0
-        current_phase = random.choice(phases)
-
-        current_status = TrafficStatus(
-            intersection_id="I-12",
-            timestamp=datetime.utcnow().isoformat(),
-            vehicle_count=vehicle_count,
-            average_speed_kmh=round(speed, 2),
-            signal_phase=current_phase,
-            recommended_adjustment=TrafficAdjustment(new_green_seconds=CURRENT_GREEN_DURATION)
-        )
-        logger.debug(f"Simulación: {vehicle_count} vehículos, Fase {current_phase}")
-        await asyncio.sleep(3)
-
-
-async def register_service():
-    async with httpx.AsyncClient() as client:
-        try:
-            payload = {
-                "service_name": SERVICE_NAME,
-                "url": f"http://gestion_trafico:{SERVICE_PORT}",
-                "health_url": f"http://gestion_trafico:{SERVICE_PORT}/health"
-            }
-            await client.post(REGISTRY_URL, json=payload, timeout=5.0)
-            logger.info(f"✅ Registrado en {REGISTRY_URL}")
-        except Exception as e:
-            logger.error(f"❌ Fallo al registrar: {e}")
+        await asyncio.sleep(TICK_SECONDS)
+        now = time.monotonic()
+        engine.tick(now - last)
+        history.record(time.time(), engine.vehicle_count, engine.average_speed_kmh)
+        refresh_status_snapshot()
+        last = now
+        logger.debug(f"Simulación: {engine.size} intersecciones, tick {engine.ticks}")
+
+
+registration = ServiceRegistration(SERVICE_NAME, SERVICE_PORT, REGISTRY_URL)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global SIMULATION_RUNNING
     SIMULATION_RUNNING = True
-    task = asyncio.create_task(simulate_traffic_cycle())
-    asyncio.create_task(register_service())
+    writer.try_acquire()
+    task = asyncio.create_task(run_as_writer(writer, simulate_traffic_cycle, commands.serve))
+    registration.start()
 
     yield
+    await registration.stop()
 
     SIMULATION_RUNNING = False
     task.cancel()
@@ -106,21 +109,70 @@ async def lifespan(app: FastAPI):
 app = FastAPI(title="Gestión Tráfico", lifespan=lifespan)
 
 setup_telemetry(app, SERVICE_NAME)
+setup_diagnostics(app)
 
 
 @app.get("/health")
 def health(): return {"status": "ok"}
 
 
+def _index_or_404(intersection_id: str) -> int:
+    index = engine.index_of(intersection_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"Intersection '{intersection_id}' not found")
+    return index
+
+
 @app.get("/status", response_model=TrafficStatus)
-def get_status(): return current_status
+async def get_status(request: Request):
+    _index_or_404(DEFAULT_INTERSECTION)
+    return status_snapshot.response(request)
+
+
+@app.get("/status/{intersection_id}", response_model=TrafficStatus)
+async def get_intersection_status(intersection_id: str):
+    return engine.status(_index_or_404(intersection_id))
+
+
+@app.get("/intersections")
+async def list_intersections(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                             min_vehicles: int = Query(0, ge=0)):
+    return engine.page(offset, limit, min_vehicles)
+
+
+@app.get("/summary")
+async def get_summary(): return engine.summary()
+
+
+@app.get("/history")
+async def get_history_info(): return history.info()
+
+
+@app.get("/history/{intersection_id}")
+async def get_history(intersection_id: str, resolution: Literal["raw", "1m", "5m"] = "raw",
+                      since: Optional[float] = None, until: Optional[float] = None):
+    """Serie temporal de una intersección entre since y until (epoch en segundos)."""
+    index = _index_or_404(intersection_id)
+    since = float("-inf") if since is None else since
+    until = float("inf") if until is None else until
+    return {
+        "intersection_id": intersection_id,
+        "resolution": resolution,
+        **history.query(index, resolution, since, until),
+    }
 
 
 @app.post("/adjust_signal")
-def adjust(update: TrafficUpdate):
-    global CURRENT_GREEN_DURATION
-    CURRENT_GREEN_DURATION = update.duration
-    return {"status": "updated", "new_duration": update.duration}
+async def adjust(update: TrafficUpdate):
+    index = _index_or_404(update.intersection_id)
+    return await commands.call("adjust_signal", {"index": index, "duration": update.duration})
+
+
+@commands.handler("adjust_signal")
+def apply_adjustment(payload: dict):
+    engine.set_green_seconds(payload["index"], payload["duration"])
+    refresh_status_snapshot()
+    return {"status": "updated", "new_duration": payload["duration"]}
 
 
 if __name__ == "__main__":
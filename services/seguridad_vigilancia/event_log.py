@@ -0,0 +1,386 @@
+import asyncio
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# Cabecera de registro: longitud del payload, crc32, secuencia, timestamp.
+RECORD_HEADER = struct.Struct("<IIQd")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+# Subdirectorio donde se apartan los segmentos que no continúan la secuencia.
+QUARANTINE_DIR = "quarantine"
+
+logger = logging.getLogger("event_log")
+
+
+class RecordTooLarge(ValueError):
+    pass
+
+
+class _Segment:
+    """Fichero de tamaño fijo (preasignado, disperso) mapeado en memoria para lectura."""
+
+    __slots__ = ("path", "base_seq", "fd", "mm", "size", "write_offset")
+
+    def __init__(self, path: str, base_seq: int, size: int, readonly: bool = False):
+        self.path = path
+        self.base_seq = base_seq
+        if readonly:
+            self.fd = os.open(path, os.O_RDONLY)
+            if os.fstat(self.fd).st_size < size:
+                # El escritor aún no lo ha preasignado.
+                os.close(self.fd)
+                raise FileNotFoundError(path)
+        else:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+        self.size = size
+        self.mm = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ)
+        self.write_offset = 0
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+
+class EventLog:
+    """
+    Log de eventos append-only en segmentos de tamaño fijo.
+
+    Las escrituras se agrupan (group commit): cada `append` encola el evento y espera
+    a que el committer escriba el lote entero con un único pwrite + fsync. Las lecturas
+    van por mmap. Los índices secundarios (por location, anomaly_type y tiempo) viven en
+    memoria como arrays compactos y se reconstruyen al arrancar recorriendo los segmentos;
+    una consulta solo lee del disco los registros que devuelve.
+
+    Con `open(readonly=True)` otro proceso sigue el log del escritor: `refresh()` indexa
+    los registros añadidos desde la última llamada (no escribe ni borra nada).
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, max_segments: int = 32,
+                 commit_interval: float = 0.002, fsync: bool = True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self.readonly = False
+        self.segments: List[_Segment] = []
+        self._reset_index()
+        self._pending: List[Tuple[dict, bytes, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._committer: Optional[asyncio.Task] = None
+        self._closing = False
+        self.commits = 0
+
+    def _reset_index(self):
+        # Por evento (posición = seq − first_seq): offset, timestamp y atributos indexados.
+        # El segmento se deduce de la secuencia (cada segmento empieza en base_seq).
+        self.first_seq = 1
+        self.next_seq = 1
+        self._offset_of = array("Q")
+        self._timestamps = array("d")
+        self._location_of = array("I")
+        self._type_of = array("I")
+        self._values: Dict[str, Dict[str, int]] = {"location": {}, "anomaly_type": {}}
+        self._postings: Dict[str, List[array]] = {"location": [], "anomaly_type": []}
+
+    # --- ciclo de vida ---------------------------------------------------------
+
+    def open(self, readonly: bool = False):
+        self.readonly = readonly
+        self._reset_index()
+        os.makedirs(self.directory, exist_ok=True)
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith(SEGMENT_PREFIX))
+        for name in names:
+            base_seq = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            try:
+                segment = _Segment(os.path.join(self.directory, name), base_seq, self.segment_bytes, readonly)
+            except FileNotFoundError:
+                break
+            if not self.segments:
+                self.first_seq = self.next_seq = base_seq
+            elif base_seq != self.next_seq and readonly:
+                segment.close()
+                break
+            elif base_seq != self.next_seq:
+                # El segmento anterior quedó truncado: este ya no continúa la secuencia. No se borra,
+                # se aparta a quarantine/ para poder inspeccionarlo o recuperarlo a mano.
+                segment.close()
+                self._quarantine(segment.path)
+                continue
+            self._recover(segment)
+            self.segments.append(segment)
+        if not self.segments and not readonly:
+            self._roll()
+        logger.info(f"EventLog: {self.next_seq - self.first_seq} eventos en {len(self.segments)} segmentos")
+
+    def _quarantine(self, path: str):
+        directory = os.path.join(self.directory, QUARANTINE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, f"{int(time.time())}-{os.path.basename(path)}")
+        os.replace(path, target)
+        logger.warning(f"EventLog: {path} no continúa la secuencia (esperaba el evento {self.next_seq}), "
+                       f"apartado en {target}")
+
+    def _recover(self, segment: _Segment):
+        """Reindexa un segmento; se detiene en el primer hueco o registro corrupto (escritura a medias)."""
+        offset, mm = segment.write_offset, segment.mm
+        while offset + RECORD_HEADER.size <= segment.size:
+            length, crc, seq, timestamp = RECORD_HEADER.unpack_from(mm, offset)
+            end = offset + RECORD_HEADER.size + length
+            if length == 0 or end > segment.size or seq != self.next_seq:
+                break
+            payload = mm[offset + RECORD_HEADER.size:end]
+            if zlib.crc32(payload) != crc:
+                if self.readonly:
+                    break  # el escritor aún está escribiendo este registro
+                logger.warning(f"EventLog: registro corrupto en {segment.path}@{offset}, se descarta el resto")
+                break
+            self._index(offset, timestamp, json.loads(payload))
+            offset = end
+        segment.write_offset = offset
+
+    def refresh(self):
+        """Solo lectura: indexa lo que el escritor ha añadido (y los segmentos nuevos) desde la última vez."""
+        while True:
+            if self.segments:
+                self._recover(self.segments[-1])
+            path = self._segment_path(self.next_seq)
+            if self.segments and self.segments[-1].base_seq == self.next_seq or not os.path.exists(path):
+                break
+            try:
+                segment = _Segment(path, self.next_seq, self.segment_bytes, readonly=True)
+            except FileNotFoundError:
+                break
+            if not self.segments:
+                self.first_seq = self.next_seq
+            self.segments.append(segment)
+        self._enforce_retention()
+
+    def start(self):
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._committer = asyncio.create_task(self._commit_loop())
+
+    async def close(self):
+        if self._committer:
+            # Sin cancelar: el committer termina la escritura en curso y vacía lo pendiente antes de salir.
+            self._closing = True
+            self._wakeup.set()
+            await self._committer
+            self._committer = None
+        if self._pending:
+            self._commit(self._pending)
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    # --- escritura -------------------------------------------------------------
+
+    async def append(self, event: dict) -> dict:
+        """Encola el evento; vuelve cuando el lote que lo contiene está escrito (y sincronizado)."""
+        payload = json.dumps(event, separators=(",", ":")).encode()
+        if RECORD_HEADER.size + len(payload) > self.segment_bytes:
+            raise RecordTooLarge(f"Evento de {len(payload)} bytes mayor que el segmento")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((event, payload, future))
+        self._wakeup.set()
+        return await future
+
+    async def _commit_loop(self):
+        while not self._closing or self._pending:
+            if not self._closing:
+                await self._wakeup.wait()
+                # Breve espera para que se acumulen más escrituras en el mismo lote.
+                if self.commit_interval:
+                    await asyncio.sleep(self.commit_interval)
+            self._wakeup.clear()
+            batch, self._pending = self._pending, []
+            if not batch:
+                continue
+            try:
+                records = await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._publish(records, batch)
+
+    def _commit(self, batch):
+        self._publish(self._write(batch), batch)
+
+    def _write(self, batch) -> List[Tuple[int, float, dict]]:
+        """Serializa y escribe el lote (en un hilo). Devuelve (offset, timestamp, evento) por registro."""
+        records, chunks = [], []
+        segment = self.segments[-1]
+        chunk_start = offset = segment.write_offset
+        seq = self.next_seq
+        last_timestamp = self._timestamps[-1] if self._timestamps else 0.0
+        for event, payload, _ in batch:
+            size = RECORD_HEADER.size + len(payload)
+            if offset + size > segment.size:
+                self._flush(segment, chunk_start, chunks)
+                segment.write_offset = offset
+                segment = self._roll(seq)
+                chunks, chunk_start, offset = [], 0, 0
+            # Timestamps no decrecientes: el índice temporal se consulta con bisect.
+            timestamp = last_timestamp = max(time.time(), last_timestamp)
+            chunks.append(RECORD_HEADER.pack(len(payload), zlib.crc32(payload), seq, timestamp) + payload)
+            records.append((offset, timestamp, event))
+            offset += size
+            seq += 1
+        self._flush(segment, chunk_start, chunks)
+        segment.write_offset = offset
+        return records
+
+    def _flush(self, segment: _Segment, offset: int, chunks: List[bytes]):
+        if chunks:
+            os.pwrite(segment.fd, b"".join(chunks), offset)
+            if self.fsync:
+                os.fdatasync(segment.fd)
+            self.commits += 1
+
+    def _publish(self, records, batch):
+        # Los índices se actualizan en el event loop, después de escribir: nadie lee un evento no persistido.
+        for (offset, timestamp, event), (_, _, future) in zip(records, batch):
+            seq = self._index(offset, timestamp, event)
+            if not future.done():
+                future.set_result({"id": seq, "timestamp": timestamp, **event})
+        self._enforce_retention()
+
+    def _segment_path(self, base_seq: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{base_seq:016d}{SEGMENT_SUFFIX}")
+
+    def _roll(self, base_seq: Optional[int] = None) -> _Segment:
+        base_seq = self.next_seq if base_seq is None else base_seq
+        segment = _Segment(self._segment_path(base_seq), base_seq, self.segment_bytes)
+        self.segments.append(segment)
+        return segment
+
+    def _enforce_retention(self):
+        while len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            oldest.close()
+            if not self.readonly:
+                os.remove(oldest.path)
+            dropped = self.segments[0].base_seq - self.first_seq
+            self.first_seq = self.segments[0].base_seq
+            for column in (self._offset_of, self._timestamps, self._location_of, self._type_of):
+                del column[:dropped]
+            for postings in self._postings.values():
+                for posting in postings:
+                    del posting[:bisect.bisect_left(posting, self.first_seq)]
+
+    # --- índices ---------------------------------------------------------------
+
+    def _value_id(self, field: str, value: str) -> int:
+        ids = self._values[field]
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(ids)
+            self._postings[field].append(array("Q"))
+        return value_id
+
+    def _index(self, offset: int, timestamp: float, event: dict) -> int:
+        seq = self.next_seq
+        self.next_seq += 1
+        location = self._value_id("location", event.get("location", ""))
+        anomaly_type = self._value_id("anomaly_type", event.get("anomaly_type", ""))
+        self._offset_of.append(offset)
+        self._timestamps.append(timestamp)
+        self._location_of.append(location)
+        self._type_of.append(anomaly_type)
+        self._postings["location"][location].append(seq)
+        self._postings["anomaly_type"][anomaly_type].append(seq)
+        return seq
+
+    # --- lectura ---------------------------------------------------------------
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    @property
+    def _segment_bases(self) -> List[int]:
+        return [segment.base_seq for segment in self.segments]
+
+    def read(self, seq: int) -> dict:
+        segment = self.segments[bisect.bisect_right(self._segment_bases, seq) - 1]
+        offset = self._offset_of[seq - self.first_seq]
+        mm = segment.mm
+        length, _, _, timestamp = RECORD_HEADER.unpack_from(mm, offset)
+        start = offset + RECORD_HEADER.size
+        return {"id": seq, "timestamp": timestamp, **json.loads(mm[start:start + length])}
+
+    def query(self, location: Optional[str] = None, anomaly_type: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, cursor: Optional[int] = None,
+              limit: int = 100, descending: bool = True) -> Tuple[List[dict], Optional[int]]:
+        """
+        Eventos que cumplen los filtros, paginados por cursor (id del último evento devuelto).
+        Devuelve (eventos, siguiente cursor o None si no hay más).
+        """
+        # Rango de secuencias por tiempo (los timestamps son monótonos) y por cursor.
+        lo, hi = self.first_seq, self.next_seq  # [lo, hi)
+        if since is not None:
+            lo = self.first_seq + bisect.bisect_left(self._timestamps, since)
+        if until is not None:
+            hi = self.first_seq + bisect.bisect_right(self._timestamps, until)
+        if cursor is not None:
+            if descending:
+                hi = min(hi, cursor)
+            else:
+                lo = max(lo, cursor + 1)
+
+        checks = []
+        postings = []
+        for field, value, column in (("location", location, self._location_of),
+                                     ("anomaly_type", anomaly_type, self._type_of)):
+            if value is None:
+                continue
+            value_id = self._values[field].get(value)
+            if value_id is None:
+                return [], None
+            postings.append(self._postings[field][value_id])
+            checks.append((column, value_id))
+
+        # Se recorre la lista más corta; el resto de filtros se comprueba en los arrays, sin leer disco.
+        if postings:
+            source = min(postings, key=len)
+            start, stop = bisect.bisect_left(source, lo), bisect.bisect_left(source, hi)
+            candidates = reversed(range(start, stop)) if descending else range(start, stop)
+            seqs = (source[i] for i in candidates)
+        else:
+            seqs = reversed(range(lo, hi)) if descending else range(lo, hi)
+
+        selected = []
+        for seq in seqs:
+            i = seq - self.first_seq
+            if all(column[i] == value_id for column, value_id in checks):
+                selected.append(seq)
+                if len(selected) > limit:
+                    break
+        has_more = len(selected) > limit
+        selected = selected[:limit]
+        next_cursor = selected[-1] if has_more else None
+        return [self.read(seq) for seq in selected], next_cursor
+
+    def info(self) -> dict:
+        return {
+            "events": len(self),
+            "first_id": self.first_seq,
+            "last_id": self.next_seq - 1,
+            "segments": len(self.segments),
+            "segment_bytes": self.segment_bytes,
+            "commits": self.commits,
+            "locations": len(self._values["location"]),
+            "anomaly_types": len(self._values["anomaly_type"]),
+        }
@@ -1,11 +1,17 @@
 import asyncio
 import logging
-import httpx
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
-from typing import List
+from typing import Literal, Optional
+
+from services.seguridad_vigilancia.event_log import EventLog, RecordTooLarge
+from wakanda_shared.bootstrap import ServiceRegistration
+from wakanda_shared.broadcast import Broadcaster, format_event
+from wakanda_shared.diagnostics import setup_diagnostics
+from wakanda_shared.shared_state import CommandChannel, SharedEventRing, WriterLease, run_as_writer
 
 try:
     from wakanda_shared.telemetry import setup_telemetry
@@ -15,43 +21,122 @@ except ImportError:
 SERVICE_NAME = "seguridad_vigilancia"
 SERVICE_PORT = int(os.getenv("PORT", 8005))
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://service_registry:8000/register")
+# Fuera del repositorio por defecto; en Docker es el volumen `security-log`.
+LOG_DIR = os.getenv("SECURITY_LOG_DIR") or os.path.join(
+    os.getenv("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"), "wakanda", "security_log")
+SEGMENT_BYTES = int(os.getenv("SECURITY_SEGMENT_BYTES", 16 * 1024 * 1024))
+MAX_SEGMENTS = int(os.getenv("SECURITY_MAX_SEGMENTS", 32))
+COMMIT_INTERVAL = float(os.getenv("SECURITY_COMMIT_INTERVAL_MS", 2)) / 1000
+FSYNC = os.getenv("SECURITY_FSYNC", "1") == "1"
+SUBSCRIBER_QUEUE = int(os.getenv("SECURITY_SUBSCRIBER_QUEUE", 256))
+SLOW_CONSUMER_POLICY = os.getenv("SECURITY_SLOW_CONSUMER_POLICY", "drop_oldest")
+MAX_PAGE_SIZE = 1000
 
 class SecurityAlert(BaseModel):
     location: str
     anomaly_type: str
     description: str
 
-event_log: List[SecurityAlert] = []
+event_log = EventLog(LOG_DIR, SEGMENT_BYTES, MAX_SEGMENTS, COMMIT_INTERVAL, FSYNC)
+alerts = Broadcaster(queue_size=SUBSCRIBER_QUEUE, policy=SLOW_CONSUMER_POLICY)
+# Con varios workers solo el escritor añade al log (group commit); el resto lo sigue en
+# solo lectura para consultar, le envía las alertas nuevas y reenvía las suyas por SSE.
+writer = WriterLease(SERVICE_NAME)
+commands = CommandChannel(SERVICE_NAME, writer)
+alert_ring = SharedEventRing(f"{SERVICE_NAME}-alerts")
+
+def readable_log() -> EventLog:
+    if not writer.is_writer:
+        event_log.refresh()
+    return event_log
+
+def backfill_from_log(last_event_id: int):
+    """Eventos posteriores a `last_event_id` que ya no están en el histórico en memoria."""
+    cursor = last_event_id
+    readable_log()
+    while cursor is not None:
+        items, cursor = event_log.query(cursor=cursor, limit=MAX_PAGE_SIZE, descending=False)
+        for item in items:
+            yield item["id"], format_event(item["id"], "alert", item)
+
+registration = ServiceRegistration(SERVICE_NAME, SERVICE_PORT, REGISTRY_URL)
+
+def open_for_writing():
+    event_log.open()
+    event_log.start()
+    alerts.on_publish = alert_ring.publish
 
-async def register_service():
-    await asyncio.sleep(3)
-    async with httpx.AsyncClient() as client:
-        try:
-            my_url = f"http://{SERVICE_NAME}:{SERVICE_PORT}"
-            await client.post(REGISTRY_URL, json={
-                "service_name": SERVICE_NAME, "url": my_url, "health_url": f"{my_url}/health"
-            })
-            logging.info(f"✅ {SERVICE_NAME} Registrado")
-        except Exception:
-            logging.error(f"⚠️ Fallo registro {SERVICE_NAME}")
+async def writer_loop():
+    if event_log.readonly:
+        # Este worker acaba de heredar el papel de escritor.
+        await event_log.close()
+        open_for_writing()
+    await commands.serve()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(register_service())
+    if writer.try_acquire():
+        open_for_writing()
+    else:
+        event_log.open(readonly=True)
+    registration.start()
+    tasks = [asyncio.create_task(run_as_writer(writer, writer_loop)),
+             asyncio.create_task(alert_ring.follow(writer, alerts.publish_formatted))]
     yield
+    await registration.stop()
+    for task in tasks:
+        task.cancel()
+    await event_log.close()
 
 app = FastAPI(lifespan=lifespan, title="Wakanda Security")
 setup_telemetry(app, SERVICE_NAME)
+setup_diagnostics(app)
 
 @app.post("/security/alert")
 async def create_alert(alert: SecurityAlert):
     logging.critical(f"🚨 ALERTA DE SEGURIDAD: {alert.anomaly_type} en {alert.location}")
-    event_log.append(alert)
-    return {"status": "alert_broadcasted"}
+    return await commands.call("alert", alert.dict())
+
+@commands.handler("alert")
+async def append_alert(payload: dict):
+    try:
+        event = await event_log.append(payload)
+    except RecordTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    alerts.publish("alert", event, event_id=event["id"])
+    return {"status": "alert_broadcasted", "id": event["id"]}
+
+@app.get("/security/alerts/stream")
+async def stream_alerts(last_event_id: Optional[int] = Query(None, ge=0),
+                        last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID")):
+    """
+    Alertas en tiempo real (Server-Sent Events). Al reconectar, el navegador envía
+    Last-Event-ID y se reenvían las alertas perdidas (desde memoria o desde el log).
+    """
+    resume_from = last_event_id if last_event_id is not None else last_event_id_header
+    return StreamingResponse(alerts.stream(resume_from, backfill_from_log), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/security/alerts/stats")
+async def alert_stats():
+    return alerts.info()
 
 @app.get("/security/events")
-async def get_events():
-    return event_log
+async def get_events(location: Optional[str] = None, anomaly_type: Optional[str] = None,
+                     since: Optional[float] = None, until: Optional[float] = None,
+                     cursor: Optional[int] = Query(None, ge=0),
+                     limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                     order: Literal["desc", "asc"] = "desc"):
+    """
+    Eventos filtrados y paginados por cursor (más recientes primero por defecto).
+    Para la siguiente página se pasa `cursor=next_cursor`; `null` indica que no hay más.
+    """
+    items, next_cursor = readable_log().query(location, anomaly_type, since, until, cursor, limit, order == "desc")
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/security/log")
+async def log_info():
+    return readable_log().info()
 
 @app.get("/health")
-async def health(): return {"status": "ok"}
\ No newline at end of file
+async def health(): return {"status": "ok"}
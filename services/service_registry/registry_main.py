@@ -1,39 +1,178 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import httpx
+import os
+import time
 import uvicorn
 import logging
 
 try:
+    from wakanda_shared.diagnostics import setup_diagnostics
     from wakanda_shared.telemetry import setup_telemetry
 except ImportError:
     def setup_telemetry(app, name): pass
+    def setup_diagnostics(app): pass
+
+# Una instancia sin heartbeat ni health check correcto durante LEASE_TTL se elimina.
+LEASE_TTL = float(os.getenv("REGISTRY_LEASE_TTL", 30.0))
+HEALTH_CHECK_INTERVAL = float(os.getenv("REGISTRY_HEALTH_CHECK_INTERVAL", 5.0))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("REGISTRY_HEALTH_CHECK_TIMEOUT", 2.0))
+HEALTH_CHECK_CONCURRENCY = int(os.getenv("REGISTRY_HEALTH_CHECK_CONCURRENCY", 100))
+UNHEALTHY_THRESHOLD = int(os.getenv("REGISTRY_UNHEALTHY_THRESHOLD", 2))
+
 
 class ServiceRegistration(BaseModel):
     service_name: str
     url: str
     health_url: str
 
-services_db: Dict[str, str] = {}
 
-app = FastAPI(title="Wakanda Service Registry")
+class Heartbeat(BaseModel):
+    service_name: str
+    url: str
+
+
+class ServiceInstance(BaseModel):
+    service_name: str
+    url: str
+    health_url: str
+    registered_at: float
+    lease_expires_at: float
+    healthy: bool = True
+    consecutive_failures: int = 0
+
+    def renew(self):
+        self.lease_expires_at = time.time() + LEASE_TTL
+
+
+# servicio -> url de la instancia -> instancia
+services_db: Dict[str, Dict[str, ServiceInstance]] = {}
+
+
+def healthy_instances(service_name: str) -> List[ServiceInstance]:
+    return [i for i in services_db.get(service_name, {}).values() if i.healthy]
+
+
+def remove_instance(service_name: str, url: str, registered_at: Optional[float] = None) -> Optional[ServiceInstance]:
+    """Da de baja la instancia; con `registered_at`, solo si sigue siendo ese mismo registro (no uno posterior)."""
+    instances = services_db.get(service_name, {})
+    instance = instances.get(url)
+    if instance is None or (registered_at is not None and instance.registered_at != registered_at):
+        return None
+    del instances[url]
+    if not instances:
+        services_db.pop(service_name, None)
+    return instance
+
+
+async def probe_instance(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, instance: ServiceInstance):
+    async with semaphore:
+        try:
+            resp = await client.get(instance.health_url)
+            ok = resp.status_code == 200
+        except Exception as e:
+            # Cualquier fallo (también una health_url mal formada) cuenta como sonda fallida de esta instancia.
+            logging.debug(f"Health check fallido en {instance.health_url}: {e!r}")
+            ok = False
+
+    if ok:
+        instance.consecutive_failures = 0
+        instance.healthy = True
+        instance.renew()
+        return
+
+    instance.consecutive_failures += 1
+    if instance.healthy and instance.consecutive_failures >= UNHEALTHY_THRESHOLD:
+        instance.healthy = False
+        logging.warning(f"⚠️ Instancia no saludable: {instance.service_name} en {instance.url}")
+
+
+async def health_check_loop():
+    """Comprueba en paralelo todas las instancias y elimina las que han agotado su lease."""
+    semaphore = asyncio.Semaphore(HEALTH_CHECK_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=HEALTH_CHECK_TIMEOUT) as client:
+        while True:
+            try:
+                await check_instances(client, semaphore)
+            except Exception:
+                logging.exception("⚠️ Fallo en la pasada de health checks")
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+
+async def check_instances(client: httpx.AsyncClient, semaphore: asyncio.Semaphore):
+    instances = [i for by_url in services_db.values() for i in by_url.values()]
+    results = await asyncio.gather(*(probe_instance(client, semaphore, i) for i in instances),
+                                   return_exceptions=True)
+    for instance, result in zip(instances, results):
+        if isinstance(result, Exception):
+            logging.error(f"⚠️ Health check de {instance.service_name} en {instance.url} falló: {result!r}")
+
+    now = time.time()
+    for instance in instances:
+        # Durante las sondas la instancia pudo darse de baja y volver a registrarse con la misma URL.
+        if instance.lease_expires_at < now and remove_instance(instance.service_name, instance.url,
+                                                              instance.registered_at):
+            logging.warning(f"🗑️ Instancia eliminada por lease expirado: {instance.service_name} en {instance.url}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(health_check_loop())
+    yield
+    task.cancel()
+
+
+app = FastAPI(title="Wakanda Service Registry", lifespan=lifespan)
 
 setup_telemetry(app, "service_registry")
+setup_diagnostics(app)
 
 @app.post("/register")
 async def register_service(service: ServiceRegistration):
 
-    services_db[service.service_name] = service.url
+    now = time.time()
+    instances = services_db.setdefault(service.service_name, {})
+    instance = instances.get(service.url)
+    if instance is None:
+        instances[service.url] = ServiceInstance(
+            **service.dict(), registered_at=now, lease_expires_at=now + LEASE_TTL
+        )
+    else:
+        instance.health_url = service.health_url
+        instance.healthy = True
+        instance.consecutive_failures = 0
+        instance.renew()
     logging.info(f"✅ Servicio Registrado: {service.service_name} en {service.url}")
-    return {"status": "registered", "service": service.service_name}
+    return {"status": "registered", "service": service.service_name, "lease_ttl": LEASE_TTL}
+
+@app.post("/heartbeat")
+async def heartbeat(beat: Heartbeat):
+
+    instance = services_db.get(beat.service_name, {}).get(beat.url)
+    if instance is None:
+        # El cliente debe volver a registrarse.
+        raise HTTPException(status_code=404, detail="Instance not registered")
+    instance.renew()
+    return {"status": "renewed", "lease_ttl": LEASE_TTL}
+
+@app.delete("/register/{service_name}")
+async def deregister_service(service_name: str, url: str):
+
+    if remove_instance(service_name, url) is None:
+        raise HTTPException(status_code=404, detail="Instance not registered")
+    logging.info(f"👋 Servicio dado de baja: {service_name} en {url}")
+    return {"status": "deregistered", "service": service_name}
 
 @app.get("/discover/{service_name}")
 async def discover_service(service_name: str):
 
-    url = services_db.get(service_name)
-    if not url:
+    instances = healthy_instances(service_name)
+    if not instances:
         raise HTTPException(status_code=404, detail="Service not found")
-    return {"url": url}
+    return {"url": instances[0].url, "instances": [i.url for i in instances]}
 
 @app.get("/health")
 async def health_check():
@@ -44,4 +183,4 @@ async def list_services():
     return services_db
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
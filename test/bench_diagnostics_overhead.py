@@ -0,0 +1,69 @@
+"""
+Benchmark del coste de wakanda_shared.diagnostics: peticiones/s dentro del proceso con el
+diagnóstico desactivado, activado (monitor del bucle + vigilante) y activado con un perfil
+/debug/profile en curso durante toda la medición.
+
+Uso: python -m test.bench_diagnostics_overhead [--requests 5000] [--repeat 3]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from wakanda_shared.diagnostics import setup_diagnostics
+
+
+def build_app(enabled: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/status")
+    async def status(): return {"status": "ok", "value": 42}
+
+    @app.get("/sync")
+    def sync_status(): return {"status": "ok"}
+
+    setup_diagnostics(app, enabled=enabled)
+    return app
+
+
+async def measure(enabled: bool, profiling: bool, n: int) -> float:
+    app = build_app(enabled)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for _ in range(100):
+                await client.get("/status")
+            profile = None
+            if profiling:
+                profile = asyncio.create_task(client.get("/debug/profile", params={"seconds": 60}))
+                await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            for i in range(n):
+                await client.get("/sync" if i % 4 == 0 else "/status")
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.cancel()
+    return n / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=3, help="se toma la mejor de N mediciones")
+    args = parser.parse_args()
+
+    await measure(False, False, args.requests)  # calentamiento
+
+    print(f"{'diagnóstico':>22} {'req/s':>8} {'coste':>7}")
+    baseline = None
+    for name, enabled, profiling in [("desactivado", False, False), ("activado", True, False),
+                                     ("activado + perfil", True, True)]:
+        rate = max([await measure(enabled, profiling, args.requests) for _ in range(args.repeat)])
+        baseline = baseline or rate
+        print(f"{name:>22} {rate:>8,.0f} {1 - rate / baseline:>7.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""
+Benchmark de la ingesta masiva de lecturas de energía (lecturas/s por formato).
+
+Uso: python -m test.bench_energy_ingestion [--readings 1000000] [--zones 500] [--batch 50000]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from services.gestion_energia.ingestion import BINARY_READING, ZoneLoadWindow, ingest, parse_binary, parse_ndjson
+
+
+def make_batches(n_readings: int, n_zones: int, batch_size: int, now: float):
+    rng = np.random.default_rng(7)
+    zones = rng.integers(0, n_zones, n_readings)
+    kwh = rng.uniform(0, 5, n_readings)
+    timestamps = now - rng.uniform(0, 600, n_readings)
+
+    ndjson, binary = [], []
+    for start in range(0, n_readings, batch_size):
+        sl = slice(start, start + batch_size)
+        lines = [json.dumps({"zone_id": f"Z{z}", "consumption_kwh": round(k, 3), "timestamp": t})
+                 for z, k, t in zip(zones[sl].tolist(), kwh[sl].tolist(), timestamps[sl].tolist())]
+        ndjson.append("\n".join(lines).encode())
+
+        records = np.zeros(len(zones[sl]), dtype=BINARY_READING)
+        records["zone_id"] = np.char.add("Z", zones[sl].astype(str)).astype("S16")
+        records["consumption_kwh"] = kwh[sl]
+        records["timestamp"] = timestamps[sl]
+        binary.append(records.tobytes())
+    return ndjson, binary
+
+
+def bench(name: str, parse, batches, now: float, n_readings: int):
+    window = ZoneLoadWindow(15)
+    start = time.perf_counter()
+    accepted = 0
+    for body in batches:
+        accepted += ingest(window, parse(body), now)["accepted"]
+    elapsed = time.perf_counter() - start
+    size_mb = sum(len(b) for b in batches) / 1e6
+    print(f"{name:>8} {n_readings / elapsed:>16,.0f} {elapsed:>10.3f} {size_mb:>10.1f} {accepted:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--zones", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=50_000)
+    args = parser.parse_args()
+
+    now = time.time()
+    ndjson, binary = make_batches(args.readings, args.zones, args.batch, now)
+    print(f"{'formato':>8} {'lecturas/s':>16} {'segundos':>10} {'MB':>10} {'aceptadas':>10}")
+    bench("ndjson", parse_ndjson, ndjson, now, args.readings)
+    bench("binario", parse_binary, binary, now, args.readings)
+
+
+if __name__ == "__main__":
+    main()
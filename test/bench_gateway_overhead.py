@@ -0,0 +1,290 @@
+"""
+Benchmark del coste que añade el Gateway por petición, dentro del proceso.
+
+El Gateway, el Service Registry y los sustitutos de los servicios (test.stub_upstream, sin latencia
+inyectada) se montan en el mismo proceso: el cliente llega al Gateway con httpx.ASGITransport y el
+pool de upstreams del Gateway llega al registro y a los sustitutos con otro transporte ASGI. Sin
+red ni otros procesos, lo medido es el código del Gateway: discovery, balanceo, breaker y bulkhead,
+proxy y, según la configuración, caché, telemetría, diagnóstico o hedging.
+
+Cada configuración se mide en un proceso nuevo, porque el Gateway lee su configuración del entorno
+al importarse y la instrumentación no se puede retirar. Por configuración:
+- µs de CPU por petición y los que añade el Gateway frente a llamar directamente al sustituto,
+- p99 de latencia y req/s con N peticiones concurrentes (informativos: dependen de la máquina),
+- memoria (tracemalloc): pico por petición y memoria retenida cada 1000 peticiones.
+
+Se compara tiempo de CPU del proceso y no tiempo de reloj: todo ocurre en un hilo, así que es el
+coste del código y no varía con la carga de la máquina.
+
+Los resultados se comparan con test/gateway_overhead_baseline.json: límites absolutos ("limits",
+escritos a mano) y la ejecución de referencia con --tolerance. Si algo empeora, sale con código 1.
+
+Uso: python -m test.bench_gateway_overhead [--requests 2000] [--concurrency 20] [--repeat 3]
+                                           [--configs stream json ...] [--tolerance 0.3] [--update-baseline]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gateway_overhead_baseline.json")
+STUB_SERVICES = ["gestion_trafico", "gestion_energia", "gestion_agua", "gestion_residuos", "seguridad_vigilancia"]
+REGISTRY_HOST = "service_registry:8000"
+
+# Entorno común: todas las funciones opcionales apagadas y sustitutos sin latencia.
+BASE_ENV = {
+    "TELEMETRY_MODE": "off",
+    "DIAGNOSTICS_ENABLED": "false",
+    "GATEWAY_CACHE_ROUTES": "",
+    "GATEWAY_PROXY_MODE": "stream",
+    "REGISTRY_URL": f"http://{REGISTRY_HOST}",
+    "STUB_LATENCY_MS": "0",
+    "STUB_JITTER_MS": "0",
+}
+
+# nombre -> (entorno del Gateway, opciones del worker)
+CONFIGS = {
+    "directo": ({}, {"direct": True}),
+    "stream": ({}, {}),
+    "json": ({"GATEWAY_PROXY_MODE": "json"}, {}),
+    "caché": ({"GATEWAY_CACHE_ROUTES": "gestion_trafico/summary=60"}, {}),
+    "telemetría": ({}, {"sampler": "always_on"}),
+    "telemetría ratio": ({"TELEMETRY_SAMPLE_RATIO": "0.1"}, {"sampler": "ratio"}),
+    "diagnóstico": ({"DIAGNOSTICS_ENABLED": "true"}, {}),
+    "hedging": ({"GATEWAY_HEDGE_ROUTES": "gestion_trafico/summary"}, {}),
+    "snapshot": ({}, {"snapshot": True}),
+}
+
+# Métricas comparadas con la línea base (mayor es peor) y su holgura absoluta frente al ruido.
+METRICS = {"overhead_us": 100, "peak_kib": 8, "retained_kib_per_1000": 64}
+
+
+def workload(n: int, direct: bool, snapshot: bool):
+    """Tres lecturas por cada escritura; en modo directo, las mismas rutas contra el sustituto."""
+    if snapshot:
+        return [("GET", None, "/city/snapshot", None)] * n
+    energy = {"zone_id": "Z-1", "consumption_kwh": 12.5}
+    requests = []
+    for i in range(n):
+        service, method, path, body = (("gestion_energia", "POST", "energy/report", energy) if i % 4 == 3
+                                       else ("gestion_trafico", "GET", "summary", None))
+        requests.append((method, service, f"/{path}" if direct else f"/{service}/{path}", body))
+    return requests
+
+
+async def run_worker(options: dict, n: int, concurrency: int, memory_requests: int) -> dict:
+    import httpx
+
+    from services.gateway_api import gateway_main as gateway
+    from services.gateway_api.upstream_pool import upstream_pool
+    from services.service_registry import registry_main as registry
+    from test.stub_upstream import create_app
+
+    stubs = {name: create_app(name, 8000, register=False) for name in STUB_SERVICES}
+    apps = {REGISTRY_HOST: registry.app, **{f"{name}:8000": app for name, app in stubs.items()}}
+
+    class InProcessTransport(httpx.AsyncBaseTransport):
+        """Envía cada petición a la app ASGI de su host:puerto."""
+
+        def __init__(self):
+            self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+
+        async def handle_async_request(self, request):
+            return await self.transports[request.url.netloc.decode()].handle_async_request(request)
+
+    spans = []
+    if options.get("sampler"):
+        from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+        from wakanda_shared.telemetry import setup_telemetry
+
+        class CountingExporter(SpanExporter):
+            def export(self, batch):
+                spans.append(len(batch))
+                return SpanExportResult.SUCCESS
+
+        setup_telemetry(gateway.app, gateway.SERVICE_NAME, label_params={"service_name": gateway.is_registered_service},
+                        mode="eager", span_exporter=CountingExporter(), sampler=options["sampler"])
+
+    # Sin lifespan del registro: su bucle de health checks sondearía por red a los sustitutos.
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=registry.app), base_url="http://registry") as r:
+        for name in STUB_SERVICES:
+            await r.post("/register", json={"service_name": name, "url": f"http://{name}:8000",
+                                            "health_url": f"http://{name}:8000/health"})
+
+    upstream_pool.transport = InProcessTransport()
+    direct = options.get("direct", False)
+    requests = workload(n, direct, options.get("snapshot", False))
+    stub_clients = {name: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=f"http://{name}")
+                    for name, app in stubs.items()}
+    gateway_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=gateway.app), base_url="http://gateway")
+
+    async def send(method, service, path, body):
+        client = stub_clients[service] if direct else gateway_client
+        response = await client.request(method, path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {path} → {response.status_code}: {response.text[:200]}")
+        # Dentro del proceso nada espera E/S y el bucle podría no iterar nunca entre peticiones; un servidor
+        # real sí lo hace, y es entonces cuando el bucle purga los temporizadores cancelados (deadlines).
+        await asyncio.sleep(0)
+
+    async with gateway.app.router.lifespan_context(gateway.app):
+        for request in requests[:200]:
+            await send(*request)
+
+        latencies = []
+        cpu_started = time.process_time()
+        for request in requests:
+            started = time.perf_counter()
+            await send(*request)
+            latencies.append((time.perf_counter() - started) * 1e6)
+        cpu_us = (time.process_time() - cpu_started) / len(requests) * 1e6
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(request):
+            async with semaphore:
+                await send(*request)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(request) for request in requests))
+        rps = len(requests) / (time.perf_counter() - started)
+
+        # Pico por petición: memoria máxima por encima de la de partida mientras se atiende.
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        peaks = []
+        for request in requests[:memory_requests]:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await send(*request)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        if options.get("sampler"):
+            # Los spans en la cola del BatchSpanProcessor no son memoria retenida: se exportan antes.
+            from opentelemetry import trace
+            trace.get_tracer_provider().force_flush()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+    for client in [gateway_client, *stub_clients.values()]:
+        await client.aclose()
+    latencies.sort()
+    return {
+        "cpu_us": cpu_us,
+        "p99_us": latencies[int(len(latencies) * 0.99)],
+        "rps": rps,
+        "peak_kib": statistics.fmean(peaks) / 1024,
+        "retained_kib_per_1000": retained / memory_requests * 1000 / 1024,
+        "spans": sum(spans),
+    }
+
+
+def measure(name: str, args) -> dict:
+    """Mejor valor de cada métrica en --repeat procesos nuevos."""
+    env_overrides, _ = CONFIGS[name]
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), **BASE_ENV)
+    env.update(env_overrides)
+    command = [sys.executable, "-m", "test.bench_gateway_overhead", "--worker", name, "--requests", str(args.requests),
+               "--concurrency", str(args.concurrency), "--memory-requests", str(args.memory_requests)]
+    runs = []
+    for _ in range(args.repeat):
+        output = subprocess.run(command, env=env, capture_output=True, text=True)
+        if output.returncode != 0:
+            raise RuntimeError(f"La configuración {name} falló:\n{output.stderr[-2000:]}")
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    best = {metric: min(run[metric] for run in runs) for metric in runs[0]}
+    best["rps"] = max(run["rps"] for run in runs)
+    return best
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Límites absolutos de "limits" y empeoramientos respecto a "results" de la línea base."""
+    regressions = []
+    for name, limits in baseline.get("limits", {}).items():
+        for metric, limit in limits.items():
+            value = results.get(name, {}).get(metric)
+            if value is not None and (value < limit if metric == "rps" else value > limit):
+                regressions.append((name, f"límite {metric}", limit, value))
+    for name, base in baseline.get("results", {}).items():
+        current = results.get(name)
+        if current is None:
+            continue
+        for metric, slack in METRICS.items():
+            if metric not in base:
+                continue
+            if current[metric] > max(base[metric] * (1 + tolerance), base[metric] + slack):
+                regressions.append((name, metric, base[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--memory-requests", type=int, default=500, help="peticiones medidas con tracemalloc")
+    parser.add_argument("--repeat", type=int, default=3, help="se toma la mejor de N mediciones")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="empeoramiento relativo admitido")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--worker", choices=list(CONFIGS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(run_worker(CONFIGS[args.worker][1], args.requests, args.concurrency,
+                                        args.memory_requests))
+        print(json.dumps(result))
+        os._exit(0)  # sin esperar a hilos de fondo (exportador, vigilante del diagnóstico)
+
+    configs = args.configs if "directo" in args.configs else ["directo"] + args.configs
+    results = {}
+    print(f"{'configuración':>18} {'µs CPU':>8} {'µs extra':>9} {'p99 ms':>7} {'req/s':>8} "
+          f"{'KiB pico':>9} {'KiB ret/1000':>13} {'spans':>7}")
+    for name in configs:
+        raw = measure(name, args)
+        direct = results.get("directo", raw)
+        result = {
+            "cpu_us": round(raw["cpu_us"], 1),
+            "overhead_us": round(raw["cpu_us"] - direct["cpu_us"], 1),
+            "p99_us": round(raw["p99_us"], 1),
+            "rps": round(raw["rps"], 1),
+            "peak_kib": round(raw["peak_kib"], 2),
+            "retained_kib_per_1000": round(raw["retained_kib_per_1000"], 2),
+        }
+        results[name] = result
+        print(f"{name:>18} {result['cpu_us']:>8,.0f} {result['overhead_us']:>9,.0f} {result['p99_us'] / 1000:>7.1f} "
+              f"{result['rps']:>8,.0f} {result['peak_kib']:>9.1f} {result['retained_kib_per_1000']:>13.1f} "
+              f"{raw['spans']:>7,}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": {"cpus": os.cpu_count(), "python": platform.python_version()},
+                       "requests": args.requests, "concurrency": args.concurrency,
+                       "limits": baseline.get("limits", {}), "results": {**baseline.get("results", {}), **results}},
+                      f, indent=2, ensure_ascii=False)
+        print(f"📌 Línea base actualizada en {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, metric, expected, value in regressions:
+        print(f"❌ Regresión en {name}: {metric} {value} (referencia {expected})")
+    if baseline and not regressions:
+        print("✅ Sin regresiones frente a la línea base")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
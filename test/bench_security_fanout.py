@@ -0,0 +1,79 @@
+"""
+Benchmark de la difusión de alertas: N suscriptores locales consumiendo el flujo SSE,
+coste de publish y latencia publicación → recepción (p50/p99) del último suscriptor.
+
+Uso: python -m test.bench_security_fanout [--subscribers 100 1000 10000] [--events 200] [--rate 50]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from wakanda_shared.broadcast import Broadcaster
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def bench(subscribers: int, events: int, rate: float, policy: str) -> dict:
+    broadcaster = Broadcaster(queue_size=256, policy=policy)
+    published_at = {}
+    latencies = []
+    received = [0]
+
+    async def subscriber():
+        # Se consume el mismo generador que sirve StreamingResponse.
+        async for chunk in broadcaster.stream():
+            now = time.perf_counter()
+            # Un trozo puede agrupar varios eventos si el suscriptor va por detrás.
+            for line in chunk.split(b"\n"):
+                if line.startswith(b"id: "):
+                    event_id = int(line[4:])
+                    latencies.append((now - published_at[event_id]) * 1000)
+                    received[0] += 1
+                    if event_id == events:
+                        return
+
+    tasks = [asyncio.create_task(subscriber()) for _ in range(subscribers)]
+    while len(broadcaster.subscribers) < subscribers:
+        await asyncio.sleep(0.01)
+
+    publish_ms = []
+    for i in range(1, events + 1):
+        start = time.perf_counter()
+        published_at[i] = start
+        broadcaster.publish("alert", {"location": "Sector-1", "anomaly_type": "intrusion",
+                                      "description": "benchmark", "seq": i})
+        publish_ms.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(1 / rate)
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=60)
+
+    return {
+        "subscribers": subscribers,
+        "publish_ms": statistics.median(publish_ms),
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "delivered": received[0] / (subscribers * events),
+        "dropped": broadcaster.dropped,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0, help="alertas por segundo")
+    parser.add_argument("--policy", choices=["drop_oldest", "disconnect"], default="drop_oldest")
+    args = parser.parse_args()
+
+    print(f"{'suscriptores':>12} {'publish ms':>11} {'p50 ms':>9} {'p99 ms':>9} {'entregado':>10} {'descartes':>10}")
+    for subscribers in args.subscribers:
+        r = await bench(subscribers, args.events, args.rate, args.policy)
+        print(f"{r['subscribers']:>12} {r['publish_ms']:>11.3f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['delivered']:>10.1%} {r['dropped']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
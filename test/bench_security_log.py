@@ -0,0 +1,93 @@
+"""
+Benchmark del log de eventos de seguridad: escrituras/s con group commit (según concurrencia)
+y latencia de consultas filtradas sobre un log grande.
+
+Uso: python -m test.bench_security_log [--events 200000] [--concurrency 1 10 100] [--no-fsync]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+
+from services.seguridad_vigilancia.event_log import EventLog
+
+LOCATIONS = [f"Sector-{i}" for i in range(50)]
+ANOMALIES = ["intrusion", "fire", "vandalism", "crowd", "weapon", "unknown"]
+
+
+def make_event(rng: random.Random) -> dict:
+    return {"location": rng.choice(LOCATIONS), "anomaly_type": rng.choice(ANOMALIES),
+            "description": "evento simulado " + "x" * rng.randint(0, 80)}
+
+
+async def bench_writes(directory: str, concurrency: int, events: int, fsync: bool) -> dict:
+    log = EventLog(directory, fsync=fsync)
+    log.open()
+    log.start()
+    rng = random.Random(concurrency)
+    per_writer = events // concurrency
+
+    async def writer():
+        for _ in range(per_writer):
+            await log.append(make_event(rng))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = {"concurrency": concurrency, "events_s": per_writer * concurrency / elapsed,
+              "events_per_commit": per_writer * concurrency / max(log.commits, 1)}
+    await log.close()
+    return result
+
+
+async def bench_queries(directory: str, fsync: bool) -> dict:
+    log = EventLog(directory, fsync=fsync)
+    start = time.perf_counter()
+    log.open()
+    reopen_ms = (time.perf_counter() - start) * 1000
+    rng = random.Random(1)
+    cases = {
+        "últimos 100": lambda: log.query(limit=100),
+        "location": lambda: log.query(location=rng.choice(LOCATIONS), limit=100),
+        "location+tipo": lambda: log.query(location=rng.choice(LOCATIONS), anomaly_type=rng.choice(ANOMALIES),
+                                           limit=100),
+        "rango temporal": lambda: log.query(since=log._timestamps[len(log) // 2], limit=100, descending=False),
+    }
+    timings = {}
+    for name, fn in cases.items():
+        samples = []
+        for _ in range(200):
+            t = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t) * 1000)
+        timings[name] = statistics.median(samples)
+    info = log.info()
+    await log.close()
+    return {"events": info["events"], "segments": info["segments"], "reopen_ms": reopen_ms, "queries": timings}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--no-fsync", action="store_true")
+    args = parser.parse_args()
+    fsync = not args.no_fsync
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'concurrencia':>12} {'eventos/s':>12} {'eventos/commit':>15}")
+        for concurrency in args.concurrency:
+            n = args.events if concurrency > 1 else min(args.events, 2_000)
+            r = await bench_writes(directory, concurrency, n, fsync)
+            print(f"{r['concurrency']:>12} {r['events_s']:>12,.0f} {r['events_per_commit']:>15.1f}")
+
+        r = await bench_queries(directory, fsync)
+        print(f"\n{r['events']} eventos en {r['segments']} segmentos; reapertura (reindexado) {r['reopen_ms']:.0f} ms")
+        for name, ms in r["queries"].items():
+            print(f"{name:>16} {ms:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
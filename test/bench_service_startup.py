@@ -0,0 +1,153 @@
+"""
+Benchmark de arranque en frío de cada servicio.
+
+Para cada servicio y modo de telemetría (TELEMETRY_MODE) mide, en procesos nuevos:
+- import: segundos en importar el módulo de la app (dependencias, estado inicial, setup_telemetry).
+- /health: desde que se lanza uvicorn hasta el primer /health correcto.
+- registro: desde que se lanza uvicorn hasta que llega el POST /register a un registro simulado.
+
+Uso: python -m test.bench_service_startup [--services trafico energia ...] [--modes eager deferred] [--runs 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+SERVICES = {
+    "trafico": "services.gestion_trafico.traffic_main",
+    "energia": "services.gestion_energia.energy_main",
+    "agua": "services.gestion_agua.water_main",
+    "residuos": "services.gestion_residuos.waste_main",
+    "seguridad": "services.seguridad_vigilancia.security_main",
+    "registro": "services.service_registry.registry_main",
+    "gateway": "services.gateway_api.gateway_main",
+}
+REGISTRY_PORT = 9400
+SERVICE_PORT = 9401
+
+
+class StubRegistry(BaseHTTPRequestHandler):
+    """Registro mínimo: apunta cuándo llega cada alta y responde como el real."""
+    registrations = {}
+
+    def _reply(self, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/register":
+            StubRegistry.registrations.setdefault(payload.get("service_name"), time.monotonic())
+        self._reply({"status": "ok", "lease_ttl": 30.0})
+
+    def do_DELETE(self):
+        self._reply({"status": "deregistered"})
+
+    def log_message(self, *args):
+        pass
+
+
+def environment(mode: str, shm_dir: str) -> dict:
+    return dict(
+        os.environ,
+        PYTHONPATH=os.getcwd(),
+        TELEMETRY_MODE=mode,
+        PORT=str(SERVICE_PORT),
+        SERVICE_HOST="127.0.0.1",
+        REGISTRY_URL=f"http://127.0.0.1:{REGISTRY_PORT}/register",
+        JAEGER_HOST="127.0.0.1",
+        WAKANDA_SHM_DIR=shm_dir,
+    )
+
+
+def cold_shm_dir() -> str:
+    # Directorio propio por arranque: cada ejecución parte de memoria compartida vacía.
+    return tempfile.mkdtemp(prefix="wakanda-bench-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+
+def import_seconds(module: str, mode: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    shm_dir = cold_shm_dir()
+    try:
+        output = subprocess.run([sys.executable, "-c", code], env=environment(mode, shm_dir), capture_output=True,
+                                text=True, check=True).stdout
+    finally:
+        shutil.rmtree(shm_dir, ignore_errors=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def startup_seconds(name: str, module: str, mode: str, timeout: float = 120.0):
+    """(segundos hasta /health, segundos hasta el registro); None si no llega."""
+    StubRegistry.registrations.clear()
+    shm_dir = cold_shm_dir()
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(SERVICE_PORT), "--log-level", "warning"],
+        env=environment(mode, shm_dir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    healthy = registered = None
+    try:
+        while time.monotonic() - started < timeout:
+            if healthy is None:
+                try:
+                    if httpx.get(f"http://127.0.0.1:{SERVICE_PORT}/health", timeout=1).status_code == 200:
+                        healthy = time.monotonic() - started
+                except httpx.HTTPError:
+                    pass
+            if StubRegistry.registrations:
+                registered = min(StubRegistry.registrations.values()) - started
+            # El registro y el gateway no se registran a sí mismos.
+            if healthy is not None and (registered is not None or name in ("registro", "gateway")):
+                break
+            time.sleep(0.02)
+    finally:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+        shutil.rmtree(shm_dir, ignore_errors=True)
+    return healthy, registered
+
+
+def fmt(values) -> str:
+    values = [v for v in values if v is not None]
+    return f"{statistics.median(values):.2f}" if values else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--services", nargs="+", choices=sorted(SERVICES), default=list(SERVICES))
+    parser.add_argument("--modes", nargs="+", choices=["eager", "deferred", "off"], default=["eager", "deferred"])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", REGISTRY_PORT), StubRegistry)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{'servicio':>10} {'telemetría':>10} {'import s':>9} {'/health s':>10} {'registro s':>11}")
+    try:
+        for name in args.services:
+            module = SERVICES[name]
+            for mode in args.modes:
+                imports = [import_seconds(module, mode) for _ in range(args.runs)]
+                runs = [startup_seconds(name, module, mode) for _ in range(args.runs)]
+                print(f"{name:>10} {mode:>10} {fmt(imports):>9} {fmt(r[0] for r in runs):>10} "
+                      f"{fmt(r[1] for r in runs):>11}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
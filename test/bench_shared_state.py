@@ -0,0 +1,143 @@
+"""
+Benchmark de escalado con varios workers de uvicorn (estado compartido en wakanda_shared.shared_state).
+
+Arranca el servicio con --workers N para cada N indicado, genera carga desde varios procesos
+cliente y mide peticiones/s y la eficiencia frente a N=1 (ideal: 100 %). Con estado
+por proceso los workers divergirían; aquí todos sirven el mismo estado, así que también se
+comprueba que las lecturas sean coherentes entre workers.
+
+Nota: el escalado solo es visible si la máquina tiene al menos N núcleos libres además de
+los clientes.
+
+Uso: python -m test.bench_shared_state [--service traffic|energy] [--workers 1 2 4] [--clients 4] [--seconds 10]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+SERVICES = {
+    "traffic": ("services.gestion_trafico.traffic_main:app", 9201),
+    "energy": ("services.gestion_energia.energy_main:app", 9202),
+}
+
+
+def start_service(app: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.getcwd(),
+        WEB_CONCURRENCY=str(workers),
+        # Sin registry ni Jaeger: el benchmark no depende del resto de la ciudad.
+        REGISTRY_URL="http://127.0.0.1:1/register",
+        JAEGER_HOST="127.0.0.1",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=2)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    stop_service(process)
+    raise RuntimeError(f"{app} no arrancó con {workers} workers")
+
+
+def stop_service(process: subprocess.Popen) -> None:
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(5)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def request_factory(service: str, rng: random.Random):
+    if service == "traffic":
+        def make():
+            if rng.random() < 0.5:
+                return "GET", f"/status?intersection_id=I-{rng.randrange(1000)}", None
+            return "GET", "/summary", None
+    else:
+        def make():
+            if rng.random() < 0.3:
+                body = {"zone_id": f"Z-{rng.randrange(20)}", "consumption_kwh": round(rng.uniform(0.2, 8.0), 3)}
+                return "POST", "/energy/report", body
+            return "GET", "/energy/grid", None
+    return make
+
+
+async def client_loop(service: str, port: int, seconds: float, concurrency: int, seed: int) -> int:
+    make = request_factory(service, random.Random(seed))
+    done = 0
+    deadline = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=10) as client:
+        async def worker():
+            nonlocal done
+            while time.monotonic() < deadline:
+                method, path, body = make()
+                response = await client.request(method, path, json=body)
+                if response.status_code < 500:
+                    done += 1
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done
+
+
+def client_process(args) -> int:
+    return asyncio.run(client_loop(*args))
+
+
+def coherent(service: str, port: int, samples: int = 20) -> bool:
+    # Cada petición abre conexión nueva y puede caer en otro worker. Con estado por proceso los
+    # ticks retrocederían o la carga medida cambiaría según el worker que responda.
+    path = "/summary" if service == "traffic" else "/energy/grid"
+    values = [httpx.get(f"http://127.0.0.1:{port}{path}", timeout=5).json() for _ in range(samples)]
+    if service == "traffic":
+        ticks = [data["ticks"] for data in values]
+        return ticks == sorted(ticks)
+    return len({data["metered_load_mw"] for data in values}) == 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--service", choices=sorted(SERVICES), default="traffic")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="procesos cliente")
+    parser.add_argument("--concurrency", type=int, default=16, help="peticiones en vuelo por cliente")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    app, port = SERVICES[args.service]
+    print(f"servicio={args.service} cpus={os.cpu_count()} clientes={args.clients}x{args.concurrency}")
+    print(f"{'workers':>8} {'req/s':>10} {'eficiencia':>11} {'coherente':>10}")
+    base = None
+    for workers in args.workers:
+        process = start_service(app, port, workers)
+        try:
+            time.sleep(1.0)
+            jobs = [(args.service, port, args.seconds, args.concurrency, seed) for seed in range(args.clients)]
+            with multiprocessing.Pool(args.clients) as pool:
+                total = sum(pool.map(client_process, jobs))
+            rate = total / args.seconds
+            base = base or rate / workers
+            consistent = "sí" if coherent(args.service, port) else "no"
+            print(f"{workers:>8} {rate:>10,.0f} {rate / (base * workers):>11.0%} {consistent:>10}")
+        finally:
+            stop_service(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark de las respuestas precalculadas (wakanda_shared.snapshot) frente al camino clásico
+de FastAPI (response_model / dict → jsonable_encoder → json), para las formas de /status,
+/energy/grid y /water/pressure. Mide peticiones/s dentro del proceso (sin red) y el coste
+de serialización por petición.
+
+Uso: python -m test.bench_snapshot_responses [--requests 5000] [--zones 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from services.gestion_trafico.simulation_engine import TrafficEngine
+from wakanda_shared.snapshot import Snapshot
+
+
+class TrafficAdjustment(BaseModel):
+    new_green_seconds: int
+
+
+class TrafficStatus(BaseModel):
+    # Misma forma que el modelo de traffic_main.
+    intersection_id: str
+    timestamp: str
+    vehicle_count: int
+    average_speed_kmh: float
+    signal_phase: str
+    recommended_adjustment: TrafficAdjustment
+
+
+def payloads(zones: int) -> dict:
+    engine = TrafficEngine(1_000, seed=42)
+    engine.tick(3.0)
+    return {
+        "status": engine.status(12),
+        "grid": {
+            "status": "STABLE", "total_load_mw": 512.3, "renewable_contribution_percent": 32.0,
+            "metered_load_mw": 61.8, "window_minutes": 15,
+            "zones": {f"Z-{i}": {"load_mw": 1.2 + i / 100, "readings": 40 + i} for i in range(zones)},
+        },
+        "pressure": {
+            "sector_1_psi": 84.21, "sector_2_psi": 79.93, "status": "NORMAL", "sensors": 2000,
+            "leaking_sensors": 0, "detection_ms": 0.412, "modeled": {"sector_1": 85.36, "sector_2": 80.76},
+        },
+    }
+
+
+def build_app(data: dict) -> FastAPI:
+    app = FastAPI()
+    snapshots = {name: Snapshot(value) for name, value in data.items()}
+
+    @app.get("/classic/status", response_model=TrafficStatus)
+    async def classic_status(): return data["status"]
+
+    @app.get("/classic/grid")
+    async def classic_grid(): return data["grid"]
+
+    @app.get("/classic/pressure")
+    async def classic_pressure(): return data["pressure"]
+
+    @app.get("/snapshot/{name}")
+    async def snapshot(name: str, request: Request): return snapshots[name].response(request)
+
+    return app
+
+
+async def requests_per_second(client: httpx.AsyncClient, path: str, n: int, headers=None) -> float:
+    for _ in range(50):
+        await client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(n):
+        await client.get(path, headers=headers)
+    return n / (time.perf_counter() - start)
+
+
+def serialize_us(fn, n: int = 20_000) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--zones", type=int, default=50)
+    args = parser.parse_args()
+
+    data = payloads(args.zones)
+    app = build_app(data)
+    transport = httpx.ASGITransport(app=app)
+    print(f"{'endpoint':>10} {'clásico req/s':>14} {'snapshot req/s':>15} {'304 req/s':>10} "
+          f"{'serializar µs':>14} {'bytes µs':>9}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, value in data.items():
+            etag = Snapshot(value).etag
+            classic = await requests_per_second(client, f"/classic/{name}", args.requests)
+            cached = await requests_per_second(client, f"/snapshot/{name}", args.requests)
+            not_modified = await requests_per_second(client, f"/snapshot/{name}", args.requests,
+                                                     headers={"If-None-Match": etag})
+            if name == "status":
+                encode = lambda: json.dumps(jsonable_encoder(TrafficStatus(**value))).encode()
+            else:
+                encode = lambda: json.dumps(jsonable_encoder(value)).encode()
+            snapshot = Snapshot(value)
+            print(f"{name:>10} {classic:>14,.0f} {cached:>15,.0f} {not_modified:>10,.0f} "
+                  f"{serialize_us(encode):>14.1f} {serialize_us(snapshot.response):>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
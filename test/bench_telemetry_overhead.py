@@ -0,0 +1,125 @@
+"""
+Benchmark del coste de la telemetría por petición (wakanda_shared.telemetry) con distintos muestreos.
+
+Monta una app con las formas típicas (ruta fija, ruta con parámetro y el catch-all del Gateway,
+con un 1 % de errores 500 y un 0,5 % de peticiones lentas) y la instrumenta con un exportador que
+solo cuenta spans. Para cada configuración mide peticiones/s dentro del proceso, µs añadidos
+por petición frente a "off", spans exportados y series de http_requests_total.
+
+Uso: python -m test.bench_telemetry_overhead [--requests 5000] [--ratio 0.1] [--rate 10] [--bsp-queue 2048]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+
+def build_app(setup_telemetry, **telemetry):
+    from fastapi import FastAPI, HTTPException
+
+    app = FastAPI()
+
+    @app.get("/status")
+    async def status(): return {"status": "ok", "value": 42}
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str): return {"id": item_id}
+
+    @app.get("/{service_name}/{path:path}")
+    async def proxy(service_name: str, path: str):
+        if path.startswith("fail"):
+            raise HTTPException(status_code=500, detail="upstream error")
+        if path.startswith("slow"):
+            await asyncio.sleep(0.025)
+        return {"service": service_name, "path": path}
+
+    setup_telemetry(app, "bench", **telemetry)
+    return app
+
+
+def request_paths(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    known = ["gestion_trafico", "gestion_energia", "gestion_agua", "gestion_residuos", "seguridad_vigilancia"]
+    paths = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < 0.3:
+            paths.append("/status")
+        elif roll < 0.5:
+            paths.append(f"/items/{rng.randrange(100_000)}")
+        else:
+            # Mitad servicios reales, mitad nombres inventados (escaneos, errores de cliente...).
+            service = rng.choice(known) if rng.random() < 0.5 else f"svc-{rng.randrange(100_000)}"
+            path = "fail" if rng.random() < 0.01 else "slow" if rng.random() < 0.005 else "x"
+            paths.append(f"/{service}/{path}/{rng.randrange(1000)}")
+    return paths
+
+
+async def run(app, paths) -> float:
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for path in paths[:100]:
+            await client.get(path)
+        start = time.perf_counter()
+        for path in paths:
+            await client.get(path)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--ratio", type=float, default=0.1)
+    parser.add_argument("--rate", type=float, default=10.0, help="trazas/s en rate_limited")
+    parser.add_argument("--bsp-queue", type=int, default=2048)
+    args = parser.parse_args()
+
+    # La configuración se lee al importar wakanda_shared.telemetry.
+    os.environ.update({
+        "TELEMETRY_SAMPLE_RATIO": str(args.ratio),
+        "TELEMETRY_SAMPLE_RATE": str(args.rate),
+        "TELEMETRY_SLOW_REQUEST_MS": "20",
+        "TELEMETRY_BSP_MAX_QUEUE_SIZE": str(args.bsp_queue),
+        "TELEMETRY_BSP_SCHEDULE_DELAY_MS": "200",
+    })
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+    from prometheus_client import CollectorRegistry
+
+    from wakanda_shared.telemetry import setup_telemetry
+
+    class CountingExporter(SpanExporter):
+        def __init__(self):
+            self.spans = 0
+
+        def export(self, spans):
+            self.spans += len(spans)
+            return SpanExportResult.SUCCESS
+
+    known = {"gestion_trafico", "gestion_energia", "gestion_agua", "gestion_residuos", "seguridad_vigilancia"}
+    configs = [
+        ("off", {"mode": "off"}),
+        ("100 %", {"sampler": "always_on"}),
+        ("100 % + etiquetas", {"sampler": "always_on", "label_params": {"service_name": known.__contains__}}),
+        (f"ratio {args.ratio}", {"sampler": "ratio"}),
+        (f"rate_limited {args.rate:g}/s", {"sampler": "rate_limited"}),
+    ]
+    paths = request_paths(args.requests)
+    print(f"{'configuración':>22} {'req/s':>8} {'µs extra':>9} {'spans exportados':>17} {'series':>7}")
+    baseline = None
+    for name, options in configs:
+        exporter, registry = CountingExporter(), CollectorRegistry()
+        options = {"mode": "eager", "span_exporter": exporter, "metrics_registry": registry, **options}
+        app = build_app(setup_telemetry, **options)
+        elapsed = asyncio.run(run(app, paths))
+        time.sleep(0.5)  # deja que el BatchSpanProcessor vacíe su cola
+        per_request = elapsed / len(paths) * 1e6
+        baseline = per_request if baseline is None else baseline
+        series = sum(len(metric.samples) for metric in registry.collect() if metric.name == "http_requests")
+        print(f"{name:>22} {len(paths) / elapsed:>8,.0f} {per_request - baseline:>9.0f} {exporter.spans:>17,} "
+              f"{series:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Benchmark del motor de simulación de tráfico: tiempo por tick según el número de intersecciones.
+
+Uso: python -m test.bench_traffic_engine [--sizes 1000 10000 100000] [--ticks 50]
+"""
+import argparse
+import statistics
+import time
+
+from services.gestion_trafico.simulation_engine import TrafficEngine
+
+
+def bench(size: int, ticks: int) -> dict:
+    engine = TrafficEngine(size, seed=42)
+    engine.tick(3.0)  # calentamiento
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        engine.tick(3.0)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "intersections": size,
+        "mean_ms": statistics.mean(samples),
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+        "ns_per_intersection": statistics.mean(samples) * 1e6 / size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--ticks", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'intersecciones':>15} {'media ms':>10} {'p95 ms':>10} {'ns/intersección':>16}")
+    for size in args.sizes:
+        r = bench(size, args.ticks)
+        print(f"{r['intersections']:>15} {r['mean_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['ns_per_intersection']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark del almacén de contenedores: memoria por contenedor y latencia de consultas
+espaciales (radio, caja) frente a un recorrido lineal, según el tamaño de la flota.
+
+Uso: python -m test.bench_waste_containers [--sizes 10000 100000 1000000] [--queries 200] [--radius 500]
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+
+from services.gestion_residuos.container_store import ContainerStore, simulated_fleet
+
+
+def median_ms(fn, args_list) -> float:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench(size: int, queries: int, radius: float) -> dict:
+    tracemalloc.start()
+    store = ContainerStore()
+    simulated_fleet(store, size, seed=42)
+    store.within_radius(store.origin[0], store.origin[1], 1.0)  # construye el índice
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    rng = np.random.default_rng(1)
+    points = [(store.origin[0] + dlat, store.origin[1] + dlon)
+              for dlat, dlon in rng.uniform(-0.04, 0.04, (queries, 2)).tolist()]
+    n = len(store)
+
+    def linear(lat, lon):
+        x, y = store.project(lat, lon)
+        return np.flatnonzero(np.hypot(store.x[:n] - x, store.y[:n] - y) <= radius)
+
+    return {
+        "containers": size,
+        "bytes_per_container": memory / size,
+        "radius_ms": median_ms(lambda lat, lon: store.within_radius(lat, lon, radius), points),
+        "bbox_ms": median_ms(lambda lat, lon: store.within_bbox(lat, lon, lat + 0.005, lon + 0.005), points),
+        "linear_ms": median_ms(linear, points),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=500.0)
+    args = parser.parse_args()
+
+    print(f"{'contenedores':>13} {'bytes/cont.':>12} {'radio ms':>10} {'caja ms':>10} {'lineal ms':>10}")
+    for size in args.sizes:
+        r = bench(size, args.queries, args.radius)
+        print(f"{r['containers']:>13} {r['bytes_per_container']:>12.0f} {r['radius_ms']:>10.3f} "
+              f"{r['bbox_ms']:>10.3f} {r['linear_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark de la telemetría de presión: ingesta de un lote por tick y pasada de detección de fugas.
+
+Uso: python -m test.bench_water_leak_detection [--sizes 1000 10000 100000] [--ticks 50] [--window 60]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from services.gestion_agua.pressure_monitor import PressureMonitor
+
+
+def bench(size: int, ticks: int, window: int) -> dict:
+    rng = np.random.default_rng(42)
+    monitor = PressureMonitor(window)
+    indices = monitor.indices_for([f"P-{i}" for i in range(size)], [f"sector_{i % 8}" for i in range(size)])
+    baseline = rng.uniform(35, 60, size)
+    for _ in range(window):  # ventanas llenas antes de medir
+        monitor.ingest(indices, baseline + rng.normal(0, 0.8, size))
+
+    ingest_ms, detect_ms, leaks = [], [], 0
+    for _ in range(ticks):
+        pressures = baseline + rng.normal(0, 0.8, size)
+        pressures[rng.integers(size)] -= 15.0
+        start = time.perf_counter()
+        monitor.ingest(indices, pressures)
+        ingest_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        leaks += len(monitor.detect())
+        detect_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "sensors": size,
+        "ingest_ms": statistics.mean(ingest_ms),
+        "detect_ms": statistics.mean(detect_ms),
+        "detect_p95_ms": sorted(detect_ms)[int(ticks * 0.95) - 1],
+        "leaks": leaks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--window", type=int, default=60)
+    args = parser.parse_args()
+
+    print(f"{'sensores':>10} {'ingesta ms':>12} {'detección ms':>14} {'p95 ms':>10} {'fugas':>8}")
+    for size in args.sizes:
+        r = bench(size, args.ticks, args.window)
+        print(f"{r['sensors']:>10} {r['ingest_ms']:>12.3f} {r['detect_ms']:>14.3f} {r['detect_p95_ms']:>10.3f} "
+              f"{r['leaks']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark del solver hidráulico: factorización, resolución tras un cambio de demanda
+(fuga) y tras un cambio de tubería (Woodbury), según el número de nudos.
+
+Uso: python -m test.bench_water_network [--sizes 1000 10000 100000] [--repeats 20]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from services.gestion_agua.hydraulic_network import HydraulicNetwork
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(size: int, repeats: int) -> dict:
+    rng = np.random.default_rng(42)
+    network = HydraulicNetwork.grid(size, seed=42)
+    demand_ms, pipe_ms = [], []
+    for _ in range(repeats):
+        node = int(rng.integers(1, size - 1))
+        network.set_demand(node, network.demand[node] + 2.0)
+        demand_ms.append(timed(network.solve))
+        pipe = int(rng.integers(len(network.conductance)))
+        pipe_ms.append(timed(lambda: (network.set_conductance(pipe, network.conductance[pipe] * 0.5), network.solve())))
+    return {
+        "nodes": size,
+        "factorize_ms": timed(network._factorize),
+        "demand_ms": statistics.median(demand_ms),
+        "pipe_ms": statistics.median(pipe_ms),
+        "factorizations": network.factorizations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'nudos':>8} {'factorizar ms':>14} {'demanda ms':>11} {'tubería ms':>11} {'factorizaciones':>16}")
+    for size in args.sizes:
+        r = bench(size, args.repeats)
+        print(f"{r['nodes']:>8} {r['factorize_ms']:>14.1f} {r['demand_ms']:>11.2f} {r['pipe_ms']:>11.2f} "
+              f"{r['factorizations']:>16}")
+
+
+if __name__ == "__main__":
+    main()
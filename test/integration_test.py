@@ -0,0 +1,289 @@
+"""
+Pila local para pruebas de integración y de carga, sin Docker.
+
+LocalStack arranca como procesos uvicorn en esta máquina el Service Registry y el Gateway reales
+y un sustituto (test.stub_upstream) por cada servicio de dominio, registrado con su nombre real.
+Los sustitutos permiten inyectar latencia y fallos, así que se prueba el camino completo del
+Gateway (discovery, balanceo, caché, breaker, bulkhead, snapshot) con upstreams controlados.
+
+Ejecutado como script comprueba ese camino: rutas proxificadas, snapshot completo, timeout de una
+sección lenta, deadline del cliente (también en una petición cacheable agrupada), apertura del
+breaker con Retry-After, reintentos de un GET y baja de una instancia que se detiene.
+
+Uso: python -m test.integration_test [--base-port 9500] [--keep-logs]
+"""
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+
+STUB_SERVICES = ["gestion_trafico", "gestion_energia", "gestion_agua", "gestion_residuos", "seguridad_vigilancia"]
+
+
+class LocalStack:
+    """Registro + Gateway + sustitutos, cada uno en su proceso; se usa como context manager."""
+
+    def __init__(self, base_port: int = 9500, stub_env: Optional[Dict[str, str]] = None,
+                 gateway_env: Optional[Dict[str, str]] = None, telemetry: str = "off",
+                 log_dir: Optional[str] = None, keep_logs: bool = False):
+        self.registry_port = base_port
+        self.gateway_port = base_port + 1
+        self.stub_ports = {name: base_port + 10 + i for i, name in enumerate(STUB_SERVICES)}
+        self.registry_url = f"http://127.0.0.1:{self.registry_port}"
+        self.gateway_url = f"http://127.0.0.1:{self.gateway_port}"
+        self.stub_env = stub_env or {}
+        self.gateway_env = gateway_env or {}
+        self.telemetry = telemetry
+        self.log_dir = log_dir or tempfile.mkdtemp(prefix="wakanda-stack-")
+        self.keep_logs = keep_logs
+        self.shm_dir = tempfile.mkdtemp(prefix="wakanda-stack-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        self.processes: Dict[str, subprocess.Popen] = {}
+
+    def _environment(self, **extra) -> dict:
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.getcwd(),
+            TELEMETRY_MODE=self.telemetry,
+            JAEGER_HOST="127.0.0.1",
+            WAKANDA_SHM_DIR=self.shm_dir,
+            REGISTRY_URL=f"{self.registry_url}/register",
+        )
+        env.update(extra)
+        return env
+
+    def _launch(self, name: str, module: str, port: int, env: dict):
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "wb")
+        self.processes[name] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+        log.close()
+
+    def _wait(self, condition, what: str, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if condition():
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"{what} no está listo tras {timeout:g} s (logs en {self.log_dir})")
+
+    def start(self, timeout: float = 60.0) -> "LocalStack":
+        self._launch("service_registry", "services.service_registry.registry_main", self.registry_port,
+                     self._environment(REGISTRY_HEALTH_CHECK_INTERVAL="1"))
+        self._wait(lambda: httpx.get(f"{self.registry_url}/health").status_code == 200, "El registro", timeout)
+        for name, port in self.stub_ports.items():
+            self.start_stub(name, port)
+        # El Gateway usa la URL base del registro (sin /register).
+        self._launch("gateway_api", "services.gateway_api.gateway_main", self.gateway_port,
+                     self._environment(REGISTRY_URL=self.registry_url, **self.gateway_env))
+        self._wait(lambda: httpx.get(f"{self.gateway_url}/health").status_code == 200, "El Gateway", timeout)
+        self._wait(lambda: set(self.registered_services()) >= set(STUB_SERVICES), "El registro de los stubs",
+                   timeout)
+        return self
+
+    def start_stub(self, name: str, port: Optional[int] = None):
+        port = port or self.stub_ports[name]
+        self._launch(name, "test.stub_upstream", port,
+                     self._environment(STUB_SERVICE=name, PORT=str(port), **self.stub_env))
+
+    def stop_process(self, name: str, sig: int = signal.SIGTERM, timeout: float = 10.0):
+        process = self.processes.pop(name, None)
+        if process is None:
+            return
+        try:
+            os.killpg(process.pid, sig)
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            # Con telemetría activa el exportador OTLP puede retrasar la salida indefinidamente.
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+        except ProcessLookupError:
+            pass
+
+    def stop(self, keep_logs: bool = False):
+        for name in list(self.processes):
+            self.stop_process(name)
+        shutil.rmtree(self.shm_dir, ignore_errors=True)
+        if keep_logs or self.keep_logs:
+            print(f"📄 Logs de la pila en {self.log_dir}")
+        else:
+            shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def registered_services(self) -> List[str]:
+        services = httpx.get(f"{self.registry_url}/services", timeout=2).json()
+        return [name for name, instances in services.items() if instances]
+
+    def configure_stub(self, name: str, **config) -> dict:
+        """Cambia en caliente la latencia y los fallos inyectados (ver test.stub_upstream)."""
+        url = f"http://127.0.0.1:{self.stub_ports[name]}/_stub/config"
+        return httpx.post(url, json=config, timeout=2).json()
+
+    def stub_state(self, name: str) -> dict:
+        """Configuración actual del sustituto y peticiones, errores y cuelgues inyectados hasta ahora."""
+        return httpx.get(f"http://127.0.0.1:{self.stub_ports[name]}/_stub/config", timeout=2).json()
+
+    def __enter__(self) -> "LocalStack":
+        try:
+            return self.start()
+        except BaseException:
+            self.stop(keep_logs=True)
+            raise
+
+    def __exit__(self, *exc):
+        self.stop(keep_logs=exc[0] is not None)
+
+
+GATEWAY_ROUTES = [
+    ("GET", "/gestion_trafico/status", None),
+    ("GET", "/gestion_trafico/summary", None),
+    ("POST", "/gestion_trafico/adjust_signal", {"intersection_id": "I-12", "duration": 40}),
+    ("GET", "/gestion_energia/energy/grid", None),
+    ("POST", "/gestion_energia/energy/report", {"zone_id": "Z-1", "consumption_kwh": 12.5}),
+    ("GET", "/gestion_agua/water/pressure", None),
+    ("POST", "/gestion_agua/water/leak_alert", {"zone_id": "sector_1", "severity": "HIGH"}),
+    ("GET", "/gestion_residuos/waste/containers?min_fill=70&limit=20", None),
+    ("POST", "/gestion_residuos/waste/request_pickup", {"container_id": "C-1", "fill_level_percent": 91}),
+    ("GET", "/seguridad_vigilancia/security/events?limit=20", None),
+    ("POST", "/seguridad_vigilancia/security/alert",
+     {"location": "Sector 3", "anomaly_type": "intrusion", "description": "prueba"}),
+]
+
+
+def check_routes(stack: LocalStack, client: httpx.Client) -> str:
+    failed = [f"{method} {path} → {status}" for method, path, body in GATEWAY_ROUTES
+              if (status := client.request(method, path, json=body).status_code) != 200]
+    assert not failed, ", ".join(failed)
+    return f"{len(GATEWAY_ROUTES)} rutas → 200"
+
+
+def check_snapshot(stack: LocalStack, client: httpx.Client) -> str:
+    snapshot = client.get("/city/snapshot").json()
+    statuses = {name: section["status"] for name, section in snapshot["sections"].items()}
+    assert snapshot["complete"], statuses
+    return "5 secciones ok"
+
+
+def check_slow_section(stack: LocalStack, client: httpx.Client) -> str:
+    stack.configure_stub("gestion_agua", latency_ms=3000, jitter_ms=0)
+    try:
+        started = time.perf_counter()
+        snapshot = client.get("/city/snapshot").json()
+        elapsed = time.perf_counter() - started
+    finally:
+        stack.configure_stub("gestion_agua")
+    assert snapshot["sections"]["water"]["status"] == "timeout", snapshot["sections"]["water"]
+    assert snapshot["sections"]["traffic"]["status"] == "ok", snapshot["sections"]["traffic"]
+    assert elapsed < 2.5, f"el snapshot tardó {elapsed:.2f} s"
+    return f"agua → timeout, respuesta en {elapsed:.2f} s"
+
+
+def check_deadline(stack: LocalStack, client: httpx.Client) -> str:
+    stack.configure_stub("gestion_agua", latency_ms=2000, jitter_ms=0)
+    try:
+        started = time.perf_counter()
+        response = client.get("/gestion_agua/water/pressure", headers={"x-deadline-ms": "300"})
+        elapsed = time.perf_counter() - started
+    finally:
+        stack.configure_stub("gestion_agua")
+    assert response.status_code == 504, response.status_code
+    assert elapsed < 1.0, f"la respuesta tardó {elapsed:.2f} s"
+    return f"x-deadline-ms: 300 → 504 en {elapsed:.2f} s"
+
+
+def check_coalesced_deadline(stack: LocalStack, client: httpx.Client) -> str:
+    # Un cliente con un deadline mínimo no debe hacer fallar a los que comparten su petición cacheable.
+    stack.configure_stub("gestion_energia", latency_ms=300, jitter_ms=0)
+    url = f"{stack.gateway_url}/gestion_energia/energy/grid?window_minutes=7"
+    try:
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(httpx.get, url, headers={"x-deadline-ms": "50"}, timeout=10)
+            time.sleep(0.05)
+            follower = pool.submit(httpx.get, url, headers={"x-deadline-ms": "5000"}, timeout=10)
+            leader, follower = leader.result(), follower.result()
+    finally:
+        stack.configure_stub("gestion_energia")
+    assert leader.status_code == 504, leader.status_code
+    assert follower.status_code == 200, follower.status_code
+    return f"líder → 504, agrupada → 200 ({follower.headers.get('x-cache')})"
+
+
+def check_breaker(stack: LocalStack, client: httpx.Client) -> str:
+    stack.configure_stub("gestion_trafico", error_rate=1.0)
+    try:
+        statuses = [client.get("/gestion_trafico/summary") for _ in range(5)]
+    finally:
+        stack.configure_stub("gestion_trafico")
+    codes = [response.status_code for response in statuses]
+    # Con GATEWAY_BREAKER_FAIL_MAX=3 la tercera llamada fallida ya abre el breaker y responde 503.
+    assert codes == [500, 500, 503, 503, 503], codes
+    assert "retry-after" in statuses[-1].headers, statuses[-1].headers
+    return f"{codes} con Retry-After: {statuses[-1].headers['retry-after']}"
+
+
+def check_retries(stack: LocalStack, client: httpx.Client) -> str:
+    before = stack.stub_state("gestion_residuos")["requests"]
+    stack.configure_stub("gestion_residuos", error_rate=1.0, error_status=503)
+    try:
+        status = client.get("/gestion_residuos/waste/pickup_queue").status_code
+        sent = stack.stub_state("gestion_residuos")["requests"] - before
+    finally:
+        stack.configure_stub("gestion_residuos")
+    # GATEWAY_RETRY_MAX_ATTEMPTS=3; el tercer fallo abre además el breaker, que corta los reintentos.
+    assert status == 503 and sent == 3, (status, sent)
+    return f"503 del upstream → {sent} intentos"
+
+
+def check_deregistration(stack: LocalStack, client: httpx.Client) -> str:
+    stack.stop_process("seguridad_vigilancia")
+    stack._wait(lambda: "seguridad_vigilancia" not in stack.registered_services(), "La baja", 10)
+    status = client.get("/seguridad_vigilancia/security/events").status_code
+    assert status == 503, status
+    return f"baja en el registro, Gateway → {status}"
+
+
+CHECKS = [
+    ("rutas del Gateway", check_routes),
+    ("snapshot completo", check_snapshot),
+    ("sección lenta", check_slow_section),
+    ("deadline", check_deadline),
+    ("deadline en caché", check_coalesced_deadline),
+    ("circuit breaker", check_breaker),
+    ("reintentos", check_retries),
+    ("baja de instancia", check_deregistration),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-port", type=int, default=9500)
+    parser.add_argument("--keep-logs", action="store_true")
+    args = parser.parse_args()
+
+    failures = 0
+    stack = LocalStack(args.base_port, gateway_env={"GATEWAY_CACHE_ROUTES": "gestion_energia/energy/grid=5"},
+                       keep_logs=args.keep_logs)
+    with stack, httpx.Client(base_url=stack.gateway_url, timeout=10) as client:
+        print(f"{'comprobación':>20}  resultado")
+        for name, check in CHECKS:
+            try:
+                print(f"{name:>20}  ✅ {check(stack, client)}")
+            except AssertionError as e:
+                failures += 1
+                print(f"{name:>20}  ❌ {e}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Prueba de carga del Gateway con mezclas de tráfico realistas e informe de SLO.
+
+Perfiles de usuario:
+- DashboardUser: paneles que sondean /city/snapshot y las lecturas de cada servicio.
+- MeterReporter: contadores de energía que envían lecturas sueltas y lotes NDJSON.
+- AlertBurstUser: ráfagas de alertas de seguridad y avisos de fuga.
+- PickupUser: solicitudes de recogida de contenedores y consulta de la cola.
+- TrafficOperator: ajustes de semáforos.
+
+Al terminar escribe un informe JSON con peticiones, fallos, req/s y p50/p95/p99 por ruta y lo
+compara con una línea base guardada (test/load_baselines.json): límites absolutos de SLO por ruta
+(bloque "slo", editado a mano) y empeoramiento de latencias, req/s y fallos respecto a la
+ejecución de referencia. Si algo no se cumple, locust sale con código 1.
+
+Uso (pila local: registro y Gateway reales + test.stub_upstream, sin Docker):
+    pip install locust
+    python -m test.load_test_locust [--users 50] [--spawn-rate 10] [--run-time 60s] [--stub-latency-ms 5]
+                                    [--stub-error-rate 0] [--update-baseline]
+
+Uso contra una pila ya levantada (docker-compose):
+    locust -f test/load_test_locust.py --headless --reset-stats -u 50 -r 10 -t 60s --host http://localhost:8080 \\
+           --report load_report.json --baseline test/load_baselines.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_baselines.json")
+PERCENTILES = {"p50_ms": 0.5, "p95_ms": 0.95, "p99_ms": 0.99}
+# Muestras mínimas para comparar cada percentil: con menos, el p99 es solo la peor petición.
+MIN_SAMPLES = {"p95_ms": 50, "p99_ms": 200}
+# Además del empeoramiento relativo se exige uno absoluto, para no fallar por ruido en rutas de pocos ms.
+LATENCY_SLACK_MS = 50
+
+
+def build_report(stats, environment_info: dict) -> dict:
+    """Resumen por ruta ("MÉTODO nombre") de las estadísticas de locust."""
+    def summary(entry) -> dict:
+        row = {
+            "requests": entry.num_requests,
+            "failures": entry.num_failures,
+            "failure_ratio": round(entry.fail_ratio, 4),
+            "rps": round(entry.total_rps, 2),
+            "avg_ms": round(entry.avg_response_time, 2),
+            "max_ms": round(entry.max_response_time or 0, 2),
+        }
+        for key, percentile in PERCENTILES.items():
+            row[key] = entry.get_response_time_percentile(percentile) if entry.num_requests else None
+        return row
+
+    routes = {f"{method} {name}": summary(entry) for (name, method), entry in sorted(stats.entries.items())}
+    return {**environment_info, "routes": routes, "total": summary(stats.total)}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Incumplimientos de la ejecución: límites absolutos del bloque "slo" de la línea base y
+    empeoramientos respecto a sus rutas (latencias, req/s y proporción de fallos).
+    """
+    regressions = []
+
+    def regression(route, metric, limit, current):
+        regressions.append({"route": route, "metric": metric, "baseline": limit, "current": current})
+
+    for route, limits in baseline.get("slo", {}).items():
+        current = report["total"] if route == "TOTAL" else report["routes"].get(route)
+        for metric, limit in limits.items():
+            if current and current.get(metric) is not None and current[metric] > limit:
+                regression(route, f"slo:{metric}", limit, current[metric])
+
+    # Las req/s dependen del número de usuarios: solo se comparan con una línea base equivalente.
+    same_load = baseline.get("users") == report.get("users") and baseline.get("run_time") == report.get("run_time")
+    for route, base in baseline.get("routes", {}).items():
+        current = report["routes"].get(route)
+        if current is None or not current["requests"]:
+            regression(route, "requests", base["requests"], 0)
+            continue
+        for metric, samples in MIN_SAMPLES.items():
+            if min(base["requests"], current["requests"]) < samples or not base.get(metric):
+                continue
+            if current[metric] > max(base[metric] * (1 + tolerance), base[metric] + LATENCY_SLACK_MS):
+                regression(route, metric, base[metric], current[metric])
+        if same_load and base.get("rps") and current["rps"] < base["rps"] * (1 - tolerance):
+            regression(route, "rps", base["rps"], current["rps"])
+        # Los fallos se comparan en valor absoluto: pasar de 0 % a un 1 % ya es una regresión.
+        if current["failure_ratio"] > base.get("failure_ratio", 0) + 0.01:
+            regression(route, "failure_ratio", base.get("failure_ratio", 0), current["failure_ratio"])
+    return regressions
+
+
+def print_report(report: dict, regressions: list):
+    print(f"\n{'ruta':>52} {'peticiones':>10} {'fallos':>7} {'req/s':>7} {'p50':>6} {'p95':>6} {'p99':>6}")
+    for route, row in list(report["routes"].items()) + [("TOTAL", report["total"])]:
+        p50, p95, p99 = (row[key] if row[key] is not None else float("nan") for key in PERCENTILES)
+        print(f"{route:>52} {row['requests']:>10,} {row['failures']:>7,} {row['rps']:>7.1f} "
+              f"{p50:>6.0f} {p95:>6.0f} {p99:>6.0f}")
+    for regression in regressions:
+        print(f"❌ Regresión en {regression['route']}: {regression['metric']} {regression['current']} "
+              f"(línea base {regression['baseline']})")
+
+
+# locust parchea la biblioteca estándar con gevent al importarse: el orquestador (main) no lo
+# importa y lanza locust en otro proceso, que es quien carga este fichero como locustfile.
+if __name__ != "__main__":
+    from locust import FastHttpUser, between, events, task
+
+    @events.init_command_line_parser.add_listener
+    def add_arguments(parser):
+        parser.add_argument("--report", default="load_report.json", help="Informe JSON de la ejecución")
+        parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Línea base con la que comparar")
+        parser.add_argument("--tolerance", type=float, default=0.5,
+                            help="Empeoramiento admitido en latencias y req/s (0,5 = 50 %%)")
+        parser.add_argument("--update-baseline", action="store_true",
+                            help="Guarda esta ejecución como nueva línea base")
+
+    @events.quitting.add_listener
+    def write_report(environment, **kwargs):
+        options = environment.parsed_options
+        if options is None or not environment.stats.total.num_requests:
+            return
+        report = build_report(environment.stats, {
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": environment.host,
+            "users": options.num_users,
+            "run_time": options.run_time,
+            "machine": {"cpus": os.cpu_count(), "python": platform.python_version(), "system": platform.system()},
+        })
+        baseline = {}
+        if os.path.exists(options.baseline):
+            with open(options.baseline) as f:
+                baseline = json.load(f)
+        regressions = []
+        if options.update_baseline:
+            # Los límites "slo" se escriben a mano y se conservan al regenerar la línea base.
+            with open(options.baseline, "w") as f:
+                json.dump({**report, "slo": baseline.get("slo", {})}, f, indent=2)
+            print(f"📌 Línea base actualizada en {options.baseline}")
+        elif baseline:
+            regressions = compare(report, baseline, options.tolerance)
+            report["comparison"] = {"baseline": options.baseline, "tolerance": options.tolerance,
+                                    "passed": not regressions, "regressions": regressions}
+            if regressions:
+                environment.process_exit_code = 1
+        with open(options.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print_report(report, regressions)
+        print(f"📄 Informe en {options.report}")
+
+    def zone_id() -> str:
+        return f"Z-{random.randrange(20)}"
+
+    class DashboardUser(FastHttpUser):
+        """Panel de control: snapshot de la ciudad y refresco de cada vista cada pocos segundos."""
+        weight = 6
+        wait_time = between(1, 3)
+
+        @task(4)
+        def city_snapshot(self):
+            self.client.get("/city/snapshot", name="/city/snapshot")
+
+        @task(2)
+        def traffic(self):
+            self.client.get("/gestion_trafico/status", name="/gestion_trafico/status")
+
+        @task(1)
+        def traffic_summary(self):
+            self.client.get("/gestion_trafico/summary", name="/gestion_trafico/summary")
+
+        @task(2)
+        def energy(self):
+            self.client.get("/gestion_energia/energy/grid", name="/gestion_energia/energy/grid")
+
+        @task(1)
+        def water(self):
+            self.client.get("/gestion_agua/water/pressure", name="/gestion_agua/water/pressure")
+
+        @task(1)
+        def containers(self):
+            self.client.get("/gestion_residuos/waste/containers?min_fill=70&limit=20",
+                            name="/gestion_residuos/waste/containers")
+
+        @task(1)
+        def security_events(self):
+            self.client.get("/seguridad_vigilancia/security/events?limit=20",
+                            name="/seguridad_vigilancia/security/events")
+
+    class MeterReporter(FastHttpUser):
+        """Contadores inteligentes: lecturas sueltas frecuentes y, de vez en cuando, un lote."""
+        weight = 3
+        wait_time = between(0.2, 0.6)
+        batch_size = 500
+
+        @task(10)
+        def report(self):
+            self.client.post("/gestion_energia/energy/report", name="/gestion_energia/energy/report",
+                             json={"zone_id": zone_id(), "consumption_kwh": round(random.uniform(0.1, 50), 2)})
+
+        @task(1)
+        def bulk(self):
+            lines = "".join(json.dumps({"zone_id": zone_id(), "consumption_kwh": round(random.uniform(0.1, 50), 2)})
+                            + "\n" for _ in range(self.batch_size))
+            self.client.post("/gestion_energia/energy/readings/bulk", name="/gestion_energia/energy/readings/bulk",
+                             data=lines, headers={"Content-Type": "application/x-ndjson"})
+
+    class AlertBurstUser(FastHttpUser):
+        """Incidentes: una ráfaga de alertas seguidas y después un periodo de calma."""
+        weight = 1
+        wait_time = between(5, 10)
+        burst_size = 20
+
+        @task(3)
+        def alert_burst(self):
+            location = f"Sector {random.randrange(7)}"
+            for _ in range(self.burst_size):
+                self.client.post("/seguridad_vigilancia/security/alert", name="/seguridad_vigilancia/security/alert",
+                                 json={"location": location, "anomaly_type": "intrusion",
+                                       "description": "Movimiento detectado fuera de horario"})
+
+        @task(1)
+        def leak_alert(self):
+            self.client.post("/gestion_agua/water/leak_alert", name="/gestion_agua/water/leak_alert",
+                             json={"zone_id": random.choice(["sector_1", "sector_2"]), "severity": "HIGH"})
+
+    class PickupUser(FastHttpUser):
+        """Contenedores que piden recogida al llenarse y operarios que consultan la cola."""
+        weight = 1
+        wait_time = between(1, 3)
+
+        @task(3)
+        def request_pickup(self):
+            self.client.post("/gestion_residuos/waste/request_pickup", name="/gestion_residuos/waste/request_pickup",
+                             json={"container_id": f"C-{random.randrange(2000)}",
+                                   "fill_level_percent": random.randint(80, 100)})
+
+        @task(1)
+        def pickup_queue(self):
+            self.client.get("/gestion_residuos/waste/pickup_queue", name="/gestion_residuos/waste/pickup_queue")
+
+    class TrafficOperator(FastHttpUser):
+        """Operador que ajusta la duración del verde de una intersección."""
+        weight = 1
+        wait_time = between(2, 5)
+
+        @task
+        def adjust_signal(self):
+            self.client.post("/gestion_trafico/adjust_signal", name="/gestion_trafico/adjust_signal",
+                             json={"intersection_id": f"I-{random.randrange(10000)}",
+                                   "duration": random.randint(15, 60)})
+
+
+def main():
+    """Levanta la pila local (test.integration_test.LocalStack) y ejecuta locust sin interfaz contra ella."""
+    from test.integration_test import LocalStack
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--spawn-rate", type=float, default=10)
+    parser.add_argument("--run-time", default="60s")
+    parser.add_argument("--base-port", type=int, default=9500)
+    parser.add_argument("--stub-latency-ms", type=float, default=5)
+    parser.add_argument("--stub-jitter-ms", type=float, default=2)
+    parser.add_argument("--stub-error-rate", type=float, default=0)
+    parser.add_argument("--report", default="load_report.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    stub_env = {"STUB_LATENCY_MS": str(args.stub_latency_ms), "STUB_JITTER_MS": str(args.stub_jitter_ms),
+                "STUB_ERROR_RATE": str(args.stub_error_rate)}
+    with LocalStack(args.base_port, stub_env=stub_env) as stack:
+        command = [sys.executable, "-m", "locust", "-f", os.path.abspath(__file__), "--headless", "--only-summary",
+                   "--reset-stats",
+                   "-u", str(args.users), "-r", str(args.spawn_rate), "-t", args.run_time, "--host", stack.gateway_url,
+                   "--report", args.report, "--baseline", args.baseline, "--tolerance", str(args.tolerance)]
+        if args.update_baseline:
+            command.append("--update-baseline")
+        code = subprocess.call(command)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Sustituto local de un microservicio de dominio para las pruebas de integración y de carga.
+
+Atiende las rutas del servicio indicado en STUB_SERVICE con cuerpos de forma y tamaño parecidos
+a los reales, se registra en el Service Registry real con el nombre del servicio auténtico y
+permite inyectar latencia y fallos, por entorno o en caliente con POST /_stub/config:
+
+- STUB_LATENCY_MS (5): latencia base; STUB_JITTER_MS (2): media de una cola exponencial añadida.
+- STUB_ERROR_RATE (0): fracción de respuestas con error, de código STUB_ERROR_STATUS (500).
+- STUB_HANG_RATE (0): fracción de peticiones que no responden en STUB_HANG_SECONDS (30).
+
+/health no sufre la inyección, para que el registro no retire la instancia. create_app() permite
+montar los sustitutos dentro del proceso (test.bench_gateway_overhead).
+
+Uso: STUB_SERVICE=gestion_trafico PORT=9511 REGISTRY_URL=http://127.0.0.1:9500/register \\
+     python -m uvicorn test.stub_upstream:app --port 9511
+"""
+import asyncio
+import itertools
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel
+
+from wakanda_shared.bootstrap import ServiceRegistration
+
+SERVICE_NAME = os.getenv("STUB_SERVICE", "gestion_trafico")
+SERVICE_PORT = int(os.getenv("PORT", 9511))
+
+
+class StubConfig(BaseModel):
+    latency_ms: float = float(os.getenv("STUB_LATENCY_MS", 5))
+    jitter_ms: float = float(os.getenv("STUB_JITTER_MS", 2))
+    error_rate: float = float(os.getenv("STUB_ERROR_RATE", 0))
+    error_status: int = int(os.getenv("STUB_ERROR_STATUS", 500))
+    hang_rate: float = float(os.getenv("STUB_HANG_RATE", 0))
+    hang_seconds: float = float(os.getenv("STUB_HANG_SECONDS", 30))
+
+
+ids = itertools.count(1)
+
+
+def now_iso() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+
+
+def traffic_status(_: dict) -> dict:
+    return {"intersection_id": "I-12", "timestamp": now_iso(), "vehicle_count": random.randint(0, 60),
+            "average_speed_kmh": round(random.uniform(10, 60), 2), "signal_phase": "GREEN",
+            "recommended_adjustment": {"new_green_seconds": 30}}
+
+
+def traffic_summary(_: dict) -> dict:
+    return {"intersections": 10000, "timestamp": now_iso(), "ticks": next(ids), "total_vehicles": 251_034,
+            "average_speed_kmh": 34.2, "phases": {"GREEN": 4012, "YELLOW": 981, "RED": 5007}}
+
+
+def energy_grid(_: dict) -> dict:
+    zones = {f"Z-{i}": {"energy_kwh": 812.5 + i, "load_mw": round(1.2 + i / 100, 3), "readings": 40 + i}
+             for i in range(20)}
+    return {"status": "STABLE", "total_load_mw": 512.3, "renewable_contribution_percent": 32.0,
+            "metered_load_mw": 61.8, "window_minutes": 15, "zones": zones}
+
+
+def bulk_readings(body: dict) -> dict:
+    lines = body.get("_lines", 0)
+    return {"accepted": lines, "rejected": 0, "errors": []}
+
+
+def water_pressure(_: dict) -> dict:
+    return {"sector_1_psi": round(random.uniform(80, 88), 2), "sector_2_psi": round(random.uniform(76, 84), 2),
+            "status": "NORMAL", "sensors": 2000, "leaking_sensors": 0, "detection_ms": 0.41,
+            "modeled": {"sector_1": 85.36, "sector_2": 80.76}}
+
+
+def waste_containers(_: dict) -> dict:
+    items = [{"container_id": f"C-{i}", "fill_level_percent": 70 + i % 30, "district": f"D-{i % 16}",
+              "lat": 40.41 + i / 1000, "lon": -3.70 - i / 1000} for i in range(20)]
+    return {"items": items, "total": 2000, "next_offset": 20}
+
+
+def pickup(body: dict) -> dict:
+    return {"status": "scheduled", "queue_length": random.randint(1, 50)}
+
+
+def security_events(_: dict) -> dict:
+    items = [{"id": i, "timestamp": time.time() - i, "location": f"Sector {i % 7}", "anomaly_type": "intrusion",
+              "description": "Movimiento detectado fuera de horario"} for i in range(20)]
+    return {"items": items, "next_cursor": "20"}
+
+
+def security_alert(_: dict) -> dict:
+    return {"status": "alert_broadcasted", "id": next(ids)}
+
+
+# servicio -> (método, ruta) -> generador de la respuesta a partir del cuerpo JSON
+ROUTES: Dict[str, Dict[Tuple[str, str], Callable[[dict], dict]]] = {
+    "gestion_trafico": {
+        ("GET", "status"): traffic_status,
+        ("GET", "summary"): traffic_summary,
+        ("POST", "adjust_signal"): lambda body: {"status": "updated", "new_duration": body.get("duration")},
+    },
+    "gestion_energia": {
+        ("GET", "energy/grid"): energy_grid,
+        ("POST", "energy/report"): lambda _: {"status": "received", "new_load": 512.3},
+        ("POST", "energy/readings/bulk"): bulk_readings,
+    },
+    "gestion_agua": {
+        ("GET", "water/pressure"): water_pressure,
+        ("POST", "water/leak_alert"): lambda _: {"status": "leak_registered", "id": next(ids)},
+    },
+    "gestion_residuos": {
+        ("GET", "waste/containers"): waste_containers,
+        ("POST", "waste/request_pickup"): pickup,
+        ("GET", "waste/pickup_queue"): lambda _: {"queue": [], "length": 0},
+        ("GET", "waste/routes"): lambda _: {"routes": []},
+    },
+    "seguridad_vigilancia": {
+        ("GET", "security/events"): security_events,
+        ("POST", "security/alert"): security_alert,
+    },
+}
+
+def create_app(service_name: str, port: int, register: bool = True) -> FastAPI:
+    """App sustituta de un servicio; con register=False no toca el registro (uso dentro del proceso)."""
+    registration = ServiceRegistration(service_name, port, host="127.0.0.1")
+    routes = ROUTES.get(service_name, {})
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if register:
+            registration.start()
+        yield
+        await registration.stop()
+
+    app = FastAPI(title=f"Stub {service_name}", lifespan=lifespan)
+    app.state.config = StubConfig()
+    app.state.counters = {"requests": 0, "errors": 0, "hangs": 0}
+
+    @app.get("/health")
+    async def health(): return {"status": "ok", "stub": service_name}
+
+    @app.get("/_stub/config")
+    async def get_config(): return {"service": service_name, **app.state.config.dict(), **app.state.counters}
+
+    @app.post("/_stub/config")
+    async def set_config(update: StubConfig):
+        app.state.config = update
+        return update
+
+    async def inject(route: str) -> Optional[HTTPException]:
+        config, counters = app.state.config, app.state.counters
+        counters["requests"] += 1
+        if random.random() < config.hang_rate:
+            counters["hangs"] += 1
+            await asyncio.sleep(config.hang_seconds)
+        delay = config.latency_ms + (random.expovariate(1 / config.jitter_ms) if config.jitter_ms > 0 else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if random.random() < config.error_rate:
+            counters["errors"] += 1
+            return HTTPException(status_code=config.error_status, detail=f"Injected failure in {route}")
+        return None
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def handle(path: str, request: Request):
+        handler = routes.get((request.method, path))
+        if handler is None:
+            raise HTTPException(status_code=404, detail=f"Route {request.method} /{path} not stubbed")
+        body = {}
+        if request.method != "GET":
+            raw = await request.body()
+            if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+                body = {"_lines": raw.count(b"\n")}
+            elif raw:
+                body = await request.json()
+        error = await inject(path)
+        if error is not None:
+            raise error
+        return handler(body)
+
+    return app
+
+
+app = create_app(SERVICE_NAME, SERVICE_PORT)
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from wakanda_shared import bootstrap, shared_state
+from wakanda_shared.bootstrap import ServiceRegistration
+
+
+@pytest.fixture
+def deletes(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state, "SHM_DIR", str(tmp_path))
+    calls = []
+
+    class RecordingClient:
+        def __init__(self, **_):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            pass
+
+        async def delete(self, url, params=None):
+            calls.append((url, params["url"]))
+
+    async def idle(self):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(bootstrap.httpx, "AsyncClient", RecordingClient)
+    monkeypatch.setattr(ServiceRegistration, "_run", idle)
+    return calls
+
+
+def test_only_the_last_worker_deregisters_the_shared_url(deletes):
+    async def run():
+        # Tres workers del mismo servicio (mismo espacio de nombres, misma URL).
+        workers = [ServiceRegistration("agua", 8003, "http://registry/register", host="agua") for _ in range(3)]
+        for worker in workers:
+            worker.start()
+            worker.registered = True
+        for worker in workers[:2]:
+            await worker.stop()
+            assert deletes == []
+        await workers[2].stop()
+
+    asyncio.run(run())
+    assert deletes == [("http://registry/register/agua", "http://agua:8003")]
+
+
+def test_a_single_worker_deregisters_on_stop(deletes):
+    async def run():
+        registration = ServiceRegistration("agua", 8003, "http://registry/register", host="agua")
+        registration.start()
+        registration.registered = True
+        await registration.stop()
+        await registration.stop()  # idempotente
+
+    asyncio.run(run())
+    assert len(deletes) == 1
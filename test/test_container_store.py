@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from services.gestion_residuos.container_store import MAX_GRID_CELLS, ContainerStore, simulated_fleet
+
+
+@pytest.mark.parametrize("columns", [
+    dict(ids=["C-1", "C-2"], lat=[6.5], lon=[3.4, 3.4], districts=["D-1", "D-1"]),
+    dict(ids=["C-1", "C-2"], lat=[6.5, "north"], lon=[3.4, 3.4], districts=["D-1", "D-1"]),
+    dict(ids=["C-1", "C-2"], lat=[6.5, float("nan")], lon=[3.4, 3.4], districts=["D-1", "D-1"]),
+    dict(ids=["C-1", 2], lat=[6.5, 6.5], lon=[3.4, 3.4], districts=["D-1", "D-1"]),
+    dict(ids=["C-1", "C-2"], lat=[6.5, 6.5], lon=[3.4, 3.4], districts=["D-1", "D-1"], fill=[10]),
+    dict(ids=["C-1"], lat=[1e6], lon=[1e6], districts=["D-1"]),
+    dict(ids=["C-1"], lat=[500], lon=[3.4], districts=["D-1"]),
+    dict(ids=["C-1"], lat=[6.5], lon=[-181], districts=["D-1"]),
+])
+def test_invalid_batches_leave_the_store_untouched(columns):
+    store = ContainerStore()
+    store.upsert(["C-0"], [6.5], [3.4], ["D-0"], [50])
+    with pytest.raises((TypeError, ValueError)):
+        store.upsert(**columns)
+    assert store.ids == ["C-0"]
+    assert list(store.index) == ["C-0"]
+    assert store.district_names == ["D-0"]
+    assert store.page(store.all(None), 0, 10)["total"] == 1
+
+
+def test_upsert_updates_existing_rows():
+    store = ContainerStore()
+    store.upsert(["C-0", "C-1"], [6.5, 6.5], [3.4, 3.4], ["D-0", "D-0"])
+    store.upsert(["C-1", "C-2"], [6.6, 6.6], [3.5, 3.5], ["D-1", "D-1"], [80, 20])
+    assert store.ids == ["C-0", "C-1", "C-2"]
+    assert store.lat[store.index["C-1"]] == 6.6
+    assert store.fill[store.index["C-1"]] == 80
+
+
+def test_outliers_do_not_blow_up_the_grid():
+    store = ContainerStore()
+    simulated_fleet(store, 5000, seed=1)
+    # Extremos válidos del globo: la rejilla se agranda en lugar de crecer con la extensión.
+    store.upsert(["far-1", "far-2"], [-89.9, 89.9], [-179.9, 179.9], ["D-far", "D-far"])
+    lat, lon = store.origin
+    rows, _ = store.within_radius(lat, lon, 2000)
+    nx, ny = store._grid_shape
+    assert nx * ny <= MAX_GRID_CELLS
+    x, y = store.project(lat, lon)
+    expected = np.flatnonzero(np.hypot(store.x[:len(store)] - float(x), store.y[:len(store)] - float(y)) <= 2000)
+    assert sorted(rows.tolist()) == expected.tolist()
+    assert store.within_bbox(89, 179, 90, 180).tolist() == [store.index["far-2"]]
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from services.gateway_api.deadlines import (DEADLINE_HEADER, Deadline, DeadlineExceeded, DeadlinePolicy,
+                                            parse_route_deadlines)
+
+
+def test_parse_route_deadlines_caps_at_the_maximum():
+    assert parse_route_deadlines("/agua/x/=2, bogus, energia/bulk=1000") == {"agua/x": 2.0, "energia/bulk": 60.0}
+
+
+@pytest.mark.parametrize("header, expected", [("250", 0.25), ("-5", 0.0), ("999999", 30.0), ("soon", 7.0)])
+def test_policy_uses_the_client_header_clamped_to_the_maximum(header, expected):
+    policy = DeadlinePolicy({"agua/x": 7.0}, default=1.0, maximum=30.0)
+    deadline = policy.for_request("agua/x", {DEADLINE_HEADER: header})
+    assert deadline.remaining() == pytest.approx(expected, abs=0.05)
+
+
+def test_policy_falls_back_to_the_route_and_then_the_default():
+    policy = DeadlinePolicy({"agua/x": 7.0}, default=1.0)
+    assert policy.for_request("agua/x", {}).remaining() == pytest.approx(7.0, abs=0.05)
+    assert policy.for_route("otra/ruta").remaining() == pytest.approx(1.0, abs=0.05)
+
+
+def test_remaining_budget_is_forwarded_and_bounds_the_timeouts():
+    deadline = Deadline.after(0.5)
+    [(name, value)] = deadline.headers()
+    assert name == DEADLINE_HEADER and 450 <= int(value) <= 500
+    timeout = deadline.timeout()
+    assert max(timeout.connect, timeout.read, timeout.write, timeout.pool) <= 0.5
+
+
+def test_run_cancels_the_work_when_the_deadline_expires():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await Deadline.after(0.05).run(slow())
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 1
+    assert cancelled == [True]
+
+
+def test_run_returns_in_time_and_nests_without_rearming():
+    async def run():
+        deadline = Deadline.after(1)
+
+        async def inner():
+            return await deadline.run(asyncio.sleep(0.01, "inner"))
+
+        result = await deadline.run(inner())
+        return result, deadline._armed
+
+    result, armed = asyncio.run(run())
+    assert result == "inner" and armed == set()
+
+
+def test_an_expired_deadline_fails_without_running_the_work():
+    started = []
+
+    async def work():
+        started.append(True)
+
+    async def run():
+        with pytest.raises(DeadlineExceeded):
+            await Deadline.after(0).run(work())
+
+    asyncio.run(run())
+    assert started == []
+
+
+def test_outside_cancellation_is_not_reported_as_a_deadline():
+    async def run():
+        task = asyncio.ensure_future(Deadline.after(5).run(asyncio.sleep(5)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from services.gateway_api.discovery_cache import DISCOVERY_REFRESH_ERRORS, DiscoveryCache, RegistryUnavailable
+
+
+class FakeRegistry:
+    def __init__(self, services=None):
+        self.services = services or {}
+        self.calls = []
+        self.error = None
+
+    async def fetch(self, service_name):
+        self.calls.append(service_name)
+        if self.error is not None:
+            raise self.error
+        return self.services.get(service_name)
+
+
+def test_fresh_entries_and_concurrent_misses_share_one_lookup():
+    registry = FakeRegistry({"agua": ["http://a:1"]})
+    cache = DiscoveryCache(registry.fetch, ttl=60)
+
+    async def run():
+        first = await asyncio.gather(*(cache.get("agua") for _ in range(5)))
+        return first, await cache.get("agua")
+
+    first, again = asyncio.run(run())
+    assert first == [["http://a:1"]] * 5 and again == ["http://a:1"]
+    assert registry.calls == ["agua"]
+
+
+def test_negative_entries_are_bounded():
+    registry = FakeRegistry({"agua": ["http://a:1"]})
+    cache = DiscoveryCache(registry.fetch, negative_ttl=60, max_negative=3)
+
+    async def run():
+        await cache.get("agua")
+        for n in range(10):
+            assert await cache.get(f"fake-{n}") is None
+
+    asyncio.run(run())
+    assert sorted(cache.entries) == ["agua", "fake-7", "fake-8", "fake-9"]
+    assert cache.entries["agua"].instances == ["http://a:1"]
+
+
+def test_expired_negative_entries_are_pruned():
+    registry = FakeRegistry()
+    cache = DiscoveryCache(registry.fetch, negative_ttl=0.01, max_negative=100)
+
+    async def run():
+        await cache.get("fake-1")
+        await cache.get("fake-2")
+        await asyncio.sleep(0.02)
+        await cache.get("fake-3")
+
+    asyncio.run(run())
+    assert list(cache.entries) == ["fake-3"]
+
+
+def test_a_registered_service_leaves_the_negative_cache():
+    registry = FakeRegistry()
+    cache = DiscoveryCache(registry.fetch, negative_ttl=0, max_negative=2)
+
+    async def run():
+        assert await cache.get("agua") is None
+        registry.services["agua"] = ["http://a:1"]
+        return await cache.get("agua")
+
+    assert asyncio.run(run()) == ["http://a:1"]
+    assert cache._negative == {}
+
+
+@pytest.mark.parametrize("error", [RegistryUnavailable("down"), ValueError("bad json")])
+def test_refresh_errors_serve_stale_instances_and_are_counted(error):
+    registry = FakeRegistry({"agua": ["http://a:1"]})
+    cache = DiscoveryCache(registry.fetch, ttl=0, negative_ttl=60)
+    errors = DISCOVERY_REFRESH_ERRORS._value.get()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        unhandled = []
+        loop.set_exception_handler(lambda _, context: unhandled.append(context))
+        await cache.get("agua")
+        registry.error = error
+        stale = await cache.get("agua")  # caducada: se sirve y se refresca en segundo plano
+        await asyncio.sleep(0.01)
+        return stale, await cache.get("unknown"), unhandled
+
+    stale, unknown, unhandled = asyncio.run(run())
+    assert stale == ["http://a:1"] and unknown is None
+    assert cache.entries["agua"].instances == ["http://a:1"]
+    assert DISCOVERY_REFRESH_ERRORS._value.get() == errors + 2
+    assert unhandled == []
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from services.gestion_energia.ingestion import MAX_ZONE_ID_LENGTH, ZoneLoadWindow, ingest, parse_ndjson
+from wakanda_shared.shared_state import TableFull
+
+NOW = 1_700_000_000.0
+
+
+def ndjson(*rows) -> bytes:
+    return b"\n".join(json.dumps(row).encode() for row in rows)
+
+
+def test_long_zone_ids_do_not_widen_the_batch():
+    batch = parse_ndjson(ndjson({"zone_id": "Z" * 1_000_000, "consumption_kwh": 1},
+                                {"zone_id": "A", "consumption_kwh": 2}))
+    assert batch.zone_ids.itemsize <= 4 * (MAX_ZONE_ID_LENGTH + 1)
+    result = ingest(ZoneLoadWindow(15), batch, now=NOW)
+    assert (result["accepted"], result["rejected"]) == (1, 1)
+    assert "zone_id inválido" in result["errors"][0]
+
+
+def test_non_numeric_values_reject_only_their_row():
+    batch = parse_ndjson(ndjson(
+        {"zone_id": "A", "consumption_kwh": "many"},
+        {"zone_id": "A", "consumption_kwh": 1.5, "timestamp": "yesterday"},
+        {"zone_id": "A", "consumption_kwh": [1]},
+        {"zone_id": "A", "consumption_kwh": "2.5", "timestamp": NOW},
+    ))
+    window = ZoneLoadWindow(15)
+    result = ingest(window, batch, now=NOW)
+    assert (result["accepted"], result["rejected"]) == (1, 3)
+    assert window.totals(NOW)["A"]["energy_kwh"] == 2.5
+
+
+def test_zone_window_is_bounded():
+    window = ZoneLoadWindow(15, max_zones=2)
+    ingest(window, parse_ndjson(ndjson({"zone_id": "A", "consumption_kwh": 1}, {"zone_id": "B", "consumption_kwh": 1})),
+           now=NOW)
+    with pytest.raises(TableFull):
+        ingest(window, parse_ndjson(ndjson({"zone_id": "A", "consumption_kwh": 1},
+                                           {"zone_id": "C", "consumption_kwh": 1})), now=NOW)
+    assert window.zone_names == ["A", "B"]
+    ingest(window, parse_ndjson(ndjson({"zone_id": "B", "consumption_kwh": 1})), now=NOW)
+    assert window.totals(NOW)["B"]["readings"] == 2
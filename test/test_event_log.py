@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+
+from services.seguridad_vigilancia.event_log import QUARANTINE_DIR, EventLog
+
+SEGMENT_BYTES = 4096
+
+
+def write_events(directory: str, count: int):
+    async def run():
+        log = EventLog(directory, SEGMENT_BYTES, max_segments=100, commit_interval=0, fsync=False)
+        log.open()
+        log.start()
+        await asyncio.gather(*(log.append({"location": "a", "anomaly_type": "b", "n": n}) for n in range(count)))
+        await log.close()
+
+    asyncio.run(run())
+
+
+def test_non_contiguous_segments_are_quarantined(tmp_path):
+    directory = str(tmp_path)
+    write_events(directory, 300)
+    segments = sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+    assert len(segments) >= 3
+    # Se pierde el segundo segmento: los siguientes ya no continúan la secuencia.
+    os.remove(os.path.join(directory, segments[1]))
+
+    log = EventLog(directory, SEGMENT_BYTES, max_segments=100)
+    log.open()
+    kept = len(log)
+    log.segments[0].close()
+
+    assert sorted(name for name in os.listdir(directory) if name.endswith(".log")) == segments[:1]
+    quarantined = os.listdir(os.path.join(directory, QUARANTINE_DIR))
+    assert sorted(name.split("-", 1)[1] for name in quarantined) == segments[2:]
+    assert 0 < kept < 300
+
+
+def test_close_waits_for_the_write_in_progress(tmp_path):
+    async def run():
+        log = EventLog(str(tmp_path), SEGMENT_BYTES, max_segments=100, commit_interval=0, fsync=False)
+        log.open()
+        write = log._write
+
+        def slow_write(batch):
+            time.sleep(0.1)
+            return write(batch)
+
+        log._write = slow_write
+        log.start()
+        appends = [asyncio.ensure_future(log.append({"n": n})) for n in range(10)]
+        await asyncio.sleep(0.02)  # el primer lote ya está en el hilo de escritura
+        late = asyncio.ensure_future(log.append({"n": 10}))
+        await asyncio.sleep(0)
+        await log.close()
+        return await asyncio.gather(*appends, late)
+
+    results = asyncio.run(run())
+    assert [result["n"] for result in results] == list(range(11))
+
+    log = EventLog(str(tmp_path), SEGMENT_BYTES, max_segments=100)
+    log.open()
+    assert len(log) == 11
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from services.gestion_agua.hydraulic_network import MAX_LOW_RANK_UPDATES, HydraulicNetwork
+
+
+def fresh_heads(network: HydraulicNetwork) -> np.ndarray:
+    """Alturas resolviendo desde cero con las conductancias actuales."""
+    return HydraulicNetwork(network.pipe_from, network.pipe_to, network.conductance.copy(), network.elevation,
+                            network.sectors, network.sector_names, network.source_nodes, network.source_head,
+                            network.demand).head
+
+
+def test_low_rank_updates_match_a_fresh_factorization():
+    network = HydraulicNetwork.grid(100, seed=3)
+    rng = np.random.default_rng(0)
+    for pipe in rng.choice(len(network.conductance), MAX_LOW_RANK_UPDATES + 4, replace=False).tolist():
+        network.set_conductance(pipe, network.conductance[pipe] * 0.3)
+        np.testing.assert_allclose(network.solve(), fresh_heads(network), rtol=1e-9)
+    assert network.factorizations == 2
+
+
+def test_closing_the_last_pipe_to_a_node_is_rejected_and_rolled_back():
+    network = HydraulicNetwork.grid(100, seed=3)
+    corner = 9  # esquina superior derecha: solo dos tuberías
+    pipes = np.flatnonzero((network.pipe_from == corner) | (network.pipe_to == corner)).tolist()
+    assert len(pipes) == 2
+    network.set_conductance(pipes[0], 0.0)
+    before = (network.conductance.copy(), network.solve().copy(), network.info())
+
+    with pytest.raises(ValueError):
+        network.set_conductance(pipes[1], 0.0)
+
+    np.testing.assert_array_equal(network.conductance, before[0])
+    np.testing.assert_allclose(network.solve(), before[1])
+    assert network.info()["pending_pipe_updates"] == before[2]["pending_pipe_updates"]
+    np.testing.assert_allclose(network.head, fresh_heads(network), rtol=1e-9)
+
+
+@pytest.mark.parametrize("value", [-1.0, float("nan"), float("inf")])
+def test_invalid_conductance_is_rejected(value):
+    network = HydraulicNetwork.grid(16, seed=1)
+    conductance = network.conductance.copy()
+    with pytest.raises(ValueError):
+        network.set_conductance(0, value)
+    np.testing.assert_array_equal(network.conductance, conductance)
+
+
+def test_singular_updates_are_rolled_back(monkeypatch):
+    network = HydraulicNetwork.grid(16, seed=1)
+    heads, conductance = network.solve().copy(), network.conductance.copy()
+
+    def singular(matrix):
+        raise np.linalg.LinAlgError("Singular matrix")
+
+    monkeypatch.setattr(np.linalg, "inv", singular)
+    with pytest.raises(ValueError):
+        network.set_conductance(3, 0.1)
+    monkeypatch.undo()
+
+    np.testing.assert_array_equal(network.conductance, conductance)
+    assert network.info()["pending_pipe_updates"] == 0
+    np.testing.assert_allclose(network.solve(), heads)
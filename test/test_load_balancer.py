@@ -0,0 +1,69 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from services.gateway_api.load_balancer import LoadBalancer
+from services.gateway_api.resilience import BREAKER_FAIL_MAX, UpstreamGuards, UpstreamServerError
+
+INSTANCES = ["http://a:1", "http://b:1", "http://c:1"]
+
+
+def busy(guards: UpstreamGuards, url: str, in_flight: int):
+    guards.guard_for("agua", url).bulkhead.in_flight = in_flight
+
+
+def open_breaker(guards: UpstreamGuards, url: str):
+    guard = guards.guard_for("agua", url)
+
+    async def fail():
+        raise UpstreamServerError(None)
+
+    async def run():
+        for _ in range(BREAKER_FAIL_MAX):
+            try:
+                await guard.call(fail)
+            except Exception:
+                pass
+
+    asyncio.run(run())
+    assert guard.is_open()
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        LoadBalancer(UpstreamGuards(), "random")
+
+
+def test_round_robin_cycles_per_service():
+    balancer = LoadBalancer(UpstreamGuards(), "round_robin")
+    assert [balancer.choose("agua", INSTANCES) for _ in range(4)] == INSTANCES + INSTANCES[:1]
+    assert balancer.choose("energia", INSTANCES) == INSTANCES[0]
+
+
+def test_least_outstanding_counts_in_flight_and_queued():
+    guards = UpstreamGuards()
+    balancer = LoadBalancer(guards, "least_outstanding")
+    busy(guards, INSTANCES[0], 3)
+    guards.guard_for("agua", INSTANCES[1]).bulkhead.waiting = 2
+    busy(guards, INSTANCES[2], 1)
+    assert {balancer.choose("agua", INSTANCES) for _ in range(20)} == {INSTANCES[2]}
+
+
+def test_p2c_never_picks_the_busiest_of_three():
+    guards = UpstreamGuards()
+    balancer = LoadBalancer(guards, "p2c")
+    busy(guards, INSTANCES[0], 10)
+    picks = Counter(balancer.choose("agua", INSTANCES) for _ in range(300))
+    assert INSTANCES[0] not in picks
+    assert picks[INSTANCES[1]] > 50 and picks[INSTANCES[2]] > 50
+
+
+def test_open_breakers_are_skipped_unless_all_are_open():
+    guards = UpstreamGuards()
+    balancer = LoadBalancer(guards, "round_robin")
+    open_breaker(guards, INSTANCES[0])
+    assert INSTANCES[0] not in {balancer.choose("agua", INSTANCES) for _ in range(6)}
+    for url in INSTANCES[1:]:
+        open_breaker(guards, url)
+    assert {balancer.choose("agua", INSTANCES) for _ in range(6)} == set(INSTANCES)
@@ -0,0 +1,24 @@
+import pytest
+
+from services.gestion_agua.pressure_monitor import PressureMonitor
+
+
+@pytest.mark.parametrize("sensor_ids, sectors", [
+    (["S-1", "S-2", 3], ["norte", "norte", "sur"]),
+    (["S-1", "S-2", "S-3"], ["norte", None, "sur"]),
+    (["S-1", "S-2", "S-3"], ["norte", "sur"]),
+])
+def test_invalid_batches_register_no_sensor(sensor_ids, sectors):
+    monitor = PressureMonitor(initial_sensors=2)
+    with pytest.raises(ValueError):
+        monitor.indices_for(sensor_ids, sectors)
+    assert monitor.size == 0
+    assert monitor.sensor_index == {} and monitor.sector_names == []
+
+
+def test_indices_for_registers_new_sensors_once():
+    monitor = PressureMonitor(initial_sensors=2)
+    assert monitor.indices_for(["S-1", "S-2", "S-1"], ["norte", "sur", "sur"]).tolist() == [0, 1, 0]
+    assert monitor.indices_for(["S-3", "S-2"]).tolist() == [2, 1]
+    assert monitor.sector_names == ["norte", "sur", "unknown"]
+    assert monitor.sector_details()["norte"]["sensors"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from services.service_registry import registry_main
+from services.service_registry.registry_main import ServiceInstance, check_instances, remove_instance, services_db
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    services_db.clear()
+    yield
+    services_db.clear()
+
+
+def add_instance(url: str, lease_left: float = 30.0, health_url: str = "") -> ServiceInstance:
+    now = time.time()
+    instance = ServiceInstance(service_name="svc", url=url, health_url=health_url or f"{url}/health",
+                               registered_at=now, lease_expires_at=now + lease_left)
+    services_db.setdefault("svc", {})[url] = instance
+    return instance
+
+
+def run_pass(client):
+    async def main():
+        await check_instances(client, asyncio.Semaphore(10))
+
+    asyncio.run(main())
+
+
+class FailingClient:
+    """Cliente cuyas sondas fallan con excepciones que no son de httpx."""
+
+    async def get(self, url: str):
+        if url.endswith("/boom"):
+            raise RuntimeError("malformed health_url")
+        raise ValueError(url)
+
+
+def test_unexpected_probe_errors_count_as_failures_without_stopping_the_pass():
+    first = add_instance("http://a", health_url="http://a/boom")
+    second = add_instance("http://b")
+    run_pass(FailingClient())
+    assert first.consecutive_failures == second.consecutive_failures == 1
+
+
+def test_expired_lease_does_not_remove_a_newer_registration():
+    stale = add_instance("http://a", lease_left=-1)
+
+    class ReRegisteringClient:
+        async def get(self, url):
+            # Mientras se sondea, la instancia se da de baja y vuelve a registrarse con la misma URL.
+            remove_instance("svc", "http://a")
+            add_instance("http://a")
+            raise ValueError(url)
+
+    run_pass(ReRegisteringClient())
+    current = services_db["svc"]["http://a"]
+    assert current is not stale
+
+    assert remove_instance("svc", "http://a", registered_at=stale.registered_at) is None
+    assert remove_instance("svc", "http://a", registered_at=current.registered_at) is current
+    assert "svc" not in services_db
+
+
+def test_health_check_loop_survives_a_failing_pass(monkeypatch):
+    passes = []
+
+    async def failing_pass(client, semaphore):
+        passes.append(1)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(registry_main, "check_instances", failing_pass)
+    monkeypatch.setattr(registry_main, "HEALTH_CHECK_INTERVAL", 0.01)
+
+    async def run():
+        loop = asyncio.ensure_future(registry_main.health_check_loop())
+        await asyncio.sleep(0.1)
+        assert not loop.done()
+        loop.cancel()
+
+    asyncio.run(run())
+    assert len(passes) > 1
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import timedelta
+
+import httpx
+import pytest
+
+from services.gateway_api.resilience import (BREAKER_FAIL_MAX, Bulkhead, BulkheadFull, CircuitOpen,
+                                             UpstreamGuards, UpstreamServerError)
+
+
+def response(status_code: int) -> httpx.Response:
+    return httpx.Response(status_code, request=httpx.Request("GET", "http://a:1/x"))
+
+
+async def fail(status_code: int = 500):
+    raise UpstreamServerError(response(status_code))
+
+
+async def client_error():
+    raise httpx.HTTPStatusError("bad request", request=httpx.Request("GET", "http://a:1/x"), response=response(404))
+
+
+async def ok():
+    return "ok"
+
+
+def trip(guard):
+    async def run():
+        for _ in range(BREAKER_FAIL_MAX - 1):
+            with pytest.raises(UpstreamServerError):
+                await guard.call(fail)
+        with pytest.raises(CircuitOpen) as opened:
+            await guard.call(fail)
+        return opened.value
+
+    return asyncio.run(run())
+
+
+def test_guards_are_per_instance():
+    guards = UpstreamGuards()
+    first = guards.guard_for("agua", "http://a:1/water/x")
+    assert guards.guard_for("agua", "http://a:1/other") is first
+    assert guards.guard_for("agua", "http://b:1/water/x") is not first
+    assert guards.peek("agua", "http://c:1/") is None
+
+
+def test_client_errors_do_not_open_the_breaker():
+    guard = UpstreamGuards().guard_for("agua", "http://a:1")
+
+    async def run():
+        for _ in range(BREAKER_FAIL_MAX * 2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await guard.call(client_error)
+        return await guard.call(ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert not guard.is_open()
+
+
+def test_circuit_open_carries_retry_after_of_the_breaker_that_rejected():
+    guards = UpstreamGuards()
+    slow, fast = guards.guard_for("agua", "http://a:1"), guards.guard_for("agua", "http://b:1")
+    fast.breaker.timeout_duration = timedelta(seconds=5)
+
+    opened = trip(slow)
+    assert opened.instance == "a:1" and opened.retry_after == 30
+    trip(fast)
+    assert slow.is_open() and fast.is_open()
+
+    async def rejected(guard):
+        with pytest.raises(CircuitOpen) as error:
+            await guard.call(ok)
+        return error.value
+
+    error = asyncio.run(rejected(fast))
+    assert (error.instance, error.retry_after) == ("b:1", 5)
+    assert asyncio.run(rejected(slow)).retry_after == 30
+
+
+def test_bulkhead_sheds_when_the_queue_is_full_or_too_slow():
+    async def run():
+        bulkhead = Bulkhead("agua", max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        await bulkhead.acquire()
+        waiter = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(BulkheadFull) as full:
+            await bulkhead.acquire()
+        with pytest.raises(BulkheadFull) as timed_out:
+            await waiter
+        bulkhead.release()
+        async with bulkhead.slot():
+            assert bulkhead.in_flight == 1
+        return full.value.reason, timed_out.value.reason, bulkhead
+
+    full, timed_out, bulkhead = asyncio.run(run())
+    assert (full, timed_out) == ("queue_full", "queue_timeout")
+    assert bulkhead.in_flight == 0 and bulkhead.waiting == 0
+
+
+def test_bulkhead_rejections_do_not_count_as_breaker_failures():
+    guard = UpstreamGuards().guard_for("agua", "http://a:1")
+    guard.bulkhead = Bulkhead("agua", max_concurrency=1, max_queue=0)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def held():
+            await release.wait()
+
+        holder = asyncio.ensure_future(guard.call(held))
+        await asyncio.sleep(0)
+        for _ in range(BREAKER_FAIL_MAX + 1):
+            with pytest.raises(BulkheadFull):
+                await guard.call(ok)
+        release.set()
+        await holder
+        return await guard.call(ok)
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_streamed_calls_keep_the_slot_until_released():
+    guard = UpstreamGuards().guard_for("agua", "http://a:1")
+
+    async def run():
+        result, release = await guard.call_stream(ok)
+        in_flight = guard.bulkhead.in_flight
+        release()
+        return result, in_flight
+
+    assert asyncio.run(run()) == ("ok", 1)
+    assert guard.bulkhead.in_flight == 0
@@ -0,0 +1,126 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from services.gateway_api.response_cache import CachedResponse, ResponseCache, parse_cache_routes
+
+ROUTE = "gestion_energia/energy/grid"
+
+
+def upstream(body: bytes = b'{"ok": true}', status_code: int = 200, **headers) -> httpx.Response:
+    headers = {name.replace("_", "-"): value for name, value in headers.items()}
+    return httpx.Response(status_code, content=body, headers={"content-type": "application/json", **headers})
+
+
+def client_request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+class Upstream:
+    def __init__(self, response: httpx.Response, delay: float = 0.0):
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.response
+
+
+def load(cache: ResponseCache, fetch, concurrent: int = 1, key: str = "k"):
+    async def run():
+        return await asyncio.gather(*(cache.fetch(ROUTE, key, fetch) for _ in range(concurrent)))
+
+    return asyncio.run(run())
+
+
+def test_parse_cache_routes():
+    assert parse_cache_routes(" /gestion_energia/energy/grid/=5, bogus ,agua/x=0.5") == {ROUTE: 5.0, "agua/x": 0.5}
+    assert parse_cache_routes("") == {}
+
+
+def test_route_for_skips_unlisted_routes_and_private_requests():
+    cache = ResponseCache({ROUTE: 5})
+    assert cache.route_for("gestion_energia", "/energy/grid/") == ROUTE
+    assert cache.route_for("gestion_energia", "energy/other") is None
+    assert cache.route_for("gestion_energia", "energy/grid", client_request(authorization="Bearer x").headers) is None
+    assert cache.route_for("gestion_energia", "energy/grid", client_request(cookie="s=1").headers) is None
+    assert cache.route_for("gestion_energia", "energy/grid", client_request(accept="*/*").headers) == ROUTE
+
+
+def test_concurrent_loads_share_one_upstream_call_and_are_stored():
+    cache = ResponseCache({ROUTE: 5})
+    fetch = Upstream(upstream(etag='"v1"'), delay=0.01)
+    results = load(cache, fetch, concurrent=3)
+    assert fetch.calls == 1
+    assert sorted(status for _, status in results) == ["COALESCED", "COALESCED", "MISS"]
+    assert cache.get("k") is results[0][0]
+    assert cache.get("other") is None
+
+
+@pytest.mark.parametrize("headers", [
+    {"set_cookie": "session=abc"},
+    {"cache_control": "private, max-age=60"},
+    {"cache_control": "no-store"},
+    {"vary": "Authorization"},
+    {"vary": "*"},
+])
+def test_private_responses_are_neither_stored_nor_shared(headers):
+    cache = ResponseCache({ROUTE: 5})
+    fetch = Upstream(upstream(**headers), delay=0.01)
+    results = load(cache, fetch, concurrent=2)
+    assert [status for _, status in results] == ["MISS", "MISS"]
+    assert fetch.calls == 2
+    assert results[0][0] is not results[1][0]
+    assert cache.get("k") is None and cache.total_bytes == 0
+
+
+def test_vary_accept_encoding_is_still_cacheable():
+    cache = ResponseCache({ROUTE: 5})
+    load(cache, Upstream(upstream(vary="Accept-Encoding", cache_control="max-age=5")))
+    assert cache.get("k") is not None
+
+
+def test_only_200_responses_are_stored():
+    cache = ResponseCache({ROUTE: 5})
+    (entry, _), = load(cache, Upstream(upstream(b"boom", status_code=500)))
+    assert entry.status_code == 500
+    assert cache.get("k") is None
+
+
+def test_entries_expire_after_the_route_ttl():
+    cache = ResponseCache({ROUTE: 0})
+    load(cache, Upstream(upstream()))
+    assert "k" in cache.entries and cache.get("k") is None
+
+
+def test_lru_is_bounded_by_bytes():
+    body = b"x" * 100
+    size = CachedResponse(ROUTE, upstream(body, etag='"e"'), 5).size
+    cache = ResponseCache({ROUTE: 5}, max_bytes=2 * size)
+    for key in ("a", "b"):
+        load(cache, Upstream(upstream(body, etag='"e"')), key=key)
+    assert cache.get("a") is not None  # "a" pasa a ser la más reciente
+    load(cache, Upstream(upstream(body, etag='"e"')), key="c")
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.total_bytes == 2 * size
+    load(cache, Upstream(upstream(b"y" * (3 * size))), key="huge")
+    assert "huge" not in cache.entries
+
+
+def test_cached_response_headers_and_conditional_requests():
+    entry = CachedResponse(ROUTE, upstream(b"{}", etag='"v1"', content_encoding="identity", x_upstream="a"), 5)
+    response = entry.to_response(client_request(), "HIT")
+    headers = response.headers
+    assert headers["etag"] == '"v1"' and headers["x-cache"] == "HIT" and headers["x-upstream"] == "a"
+    assert "content-encoding" not in headers and headers["content-length"] == "2"
+
+    not_modified = entry.to_response(client_request(if_none_match='W/"v1"'), "HIT")
+    assert not_modified.status_code == 304 and not_modified.body == b""
+
+    generated = CachedResponse(ROUTE, upstream(b"{}"), 5)
+    assert generated.etag and generated.to_response(client_request(), "MISS").headers["etag"] == generated.etag
@@ -0,0 +1,142 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.gateway_api import retries
+from services.gateway_api.deadlines import Deadline, DeadlineExceeded
+from services.gateway_api.resilience import BulkheadFull, UpstreamServerError
+from services.gateway_api.retries import RetryBudget, RetryPolicy, is_retryable
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(retries, "RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(retries, "RETRY_MAX_DELAY", 0.002)
+
+
+def server_error(status_code: int) -> UpstreamServerError:
+    return UpstreamServerError(httpx.Response(status_code, request=httpx.Request("GET", "http://a:1/")))
+
+
+class Attempts:
+    """attempt() que falla con los errores dados (en orden) y después responde."""
+
+    def __init__(self, *errors, delays=()):
+        self.errors = list(errors)
+        self.delays = list(delays)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        number = self.calls
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"ok-{number}"
+
+
+def call(policy, attempt, deadline=None, **kwargs):
+    async def run():
+        return await policy.call("agua", "agua/x", attempt, deadline or Deadline.after(5), **kwargs)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (server_error(503), True),
+    (server_error(500), False),
+    (httpx.ConnectError("refused"), True),
+    (httpx.PoolTimeout("pool"), False),
+    (BulkheadFull("agua", "queue_full"), False),
+    (DeadlineExceeded(), False),
+])
+def test_only_transient_failures_are_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_transient_failures_are_retried_up_to_max_attempts():
+    attempt = Attempts(server_error(503), httpx.ConnectError("refused"))
+    assert call(RetryPolicy(set(), max_attempts=3), attempt) == "ok-3"
+
+    attempt = Attempts(*[server_error(502)] * 3)
+    with pytest.raises(UpstreamServerError):
+        call(RetryPolicy(set(), max_attempts=3), attempt)
+    assert attempt.calls == 3
+
+
+def test_non_idempotent_and_permanent_failures_are_not_retried():
+    attempt = Attempts(server_error(503))
+    with pytest.raises(UpstreamServerError):
+        call(RetryPolicy(set(), max_attempts=3), attempt, idempotent=False)
+    assert attempt.calls == 1
+
+    attempt = Attempts(server_error(500))
+    with pytest.raises(UpstreamServerError):
+        call(RetryPolicy(set(), max_attempts=3), attempt)
+    assert attempt.calls == 1
+
+
+def test_retries_stop_when_the_budget_is_exhausted():
+    policy = RetryPolicy(set(), max_attempts=3)
+    policy.budgets["agua"] = RetryBudget(ratio=0, min_per_second=0, burst=1)
+    first = Attempts(server_error(503))
+    assert call(policy, first) == "ok-2"
+
+    second = Attempts(server_error(503))
+    with pytest.raises(UpstreamServerError):
+        call(policy, second)
+    assert second.calls == 1
+
+
+def test_budget_refills_with_traffic_up_to_the_burst():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, burst=2)
+    assert budget.withdraw() and budget.withdraw() and not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+def test_no_retry_without_time_left():
+    attempt = Attempts(server_error(503), delays=[0.05])
+    with pytest.raises(UpstreamServerError):
+        call(RetryPolicy(set(), max_attempts=3), attempt, deadline=Deadline.after(0.051))
+    assert attempt.calls == 1
+
+
+def test_attempts_are_bounded_by_the_deadline():
+    attempt = Attempts(delays=[5])
+    with pytest.raises(DeadlineExceeded):
+        call(RetryPolicy(set(), max_attempts=3), attempt, deadline=Deadline.after(0.05))
+    assert attempt.calls == 1
+
+
+def test_slow_primary_is_hedged_and_the_hedge_wins():
+    policy = RetryPolicy({"agua/x"}, max_attempts=2)
+    policy.latencies["agua/x"].value = 0.01
+    attempt = Attempts(delays=[0.2, 0])
+    assert call(policy, attempt) == "ok-2"
+    assert attempt.calls == 2
+
+
+def test_hedges_spend_from_the_retry_budget():
+    policy = RetryPolicy({"agua/x"}, max_attempts=2)
+    policy.latencies["agua/x"].value = 0.01
+    policy.budgets["agua"] = RetryBudget(ratio=0, min_per_second=0, burst=0)
+    attempt = Attempts(delays=[0.05])
+    assert call(policy, attempt) == "ok-1"
+    assert attempt.calls == 1
+
+
+def test_hedging_needs_latency_samples():
+    policy = RetryPolicy({"agua/x"}, max_attempts=1)
+    assert policy.hedge_delay("agua/x") is None
+    for _ in range(retries.HEDGE_MIN_SAMPLES):
+        policy.latencies["agua/x"].observe(0.02)
+    assert policy.hedge_delay("agua/x") == pytest.approx(0.02)
+    assert policy.hedge_delay("otra/ruta") is None
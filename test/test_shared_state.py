@@ -0,0 +1,274 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from wakanda_shared import shared_state
+from wakanda_shared.shared_state import CommandChannel, SeqLock, SharedRegion, WriterLease
+
+
+@pytest.fixture(autouse=True)
+def shm_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state, "SHM_DIR", str(tmp_path))
+    monkeypatch.setattr(shared_state, "_worker_slot", None)
+    return tmp_path
+
+
+def test_seqlock_retries_a_torn_read():
+    region = SharedRegion("seqlock", {"version": (np.uint64, (1,)), "values": (np.int64, (2,))})
+    lock = SeqLock(region["version"])
+    values = region["values"]
+    reads = []
+
+    def read_pair():
+        first = int(values[0])
+        if not reads:
+            # El escritor actualiza la pareja entre las dos lecturas del primer intento.
+            with lock.write():
+                values[:] = 7
+        second = int(values[1])
+        reads.append((first, second))
+        return first, second
+
+    assert lock.read(read_pair) == (7, 7)
+    assert reads == [(0, 7), (7, 7)]
+
+
+def test_seqlock_waits_for_the_writer_without_spinning():
+    region = SharedRegion("seqlock", {"version": (np.uint64, (1,)), "values": (np.int64, (1,))})
+    lock = SeqLock(region["version"])
+    calls = []
+
+    def write_slowly():
+        with lock.write():
+            time.sleep(0.05)
+            region["values"][0] = 1
+
+    writer = threading.Thread(target=write_slowly)
+    writer.start()
+    time.sleep(0.01)
+    value = lock.read(lambda: calls.append(1) or int(region["values"][0]))
+    writer.join()
+    assert value == 1
+    assert len(calls) == 1
+
+
+def test_seqlock_reads_anyway_if_the_writer_died_mid_write():
+    region = SharedRegion("seqlock", {"version": (np.uint64, (1,)), "values": (np.int64, (1,))})
+    region["version"][0] = 3  # impar: escritura que nunca terminó
+    lock = SeqLock(region["version"], stale_after=0.05)
+    started = time.monotonic()
+    assert lock.read(lambda: int(region["values"][0])) == 0
+    assert 0.05 <= time.monotonic() - started < 1
+
+
+def test_writer_lease_fails_over_when_the_writer_goes_away():
+    first, second = WriterLease("svc"), WriterLease("svc")
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert not second.is_writer
+
+    async def failover():
+        waiting = asyncio.ensure_future(second.wait(poll=0.01))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        # El SO libera el flock cuando el proceso escritor muere (aquí, al cerrar su descriptor).
+        first._lock.close()
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(failover())
+    assert second.is_writer
+
+
+def make_channels(**options):
+    """Escritor y otro worker del mismo servicio; en el test ambos viven en el mismo proceso."""
+    writer_lease, worker_lease = WriterLease("svc"), WriterLease("svc")
+    assert writer_lease.try_acquire()
+    server = CommandChannel("svc", writer_lease, **options)
+    client = CommandChannel("svc", worker_lease, **options)
+
+    @server.handler("echo")
+    async def echo(payload):
+        await asyncio.sleep(0.01)
+        return {"echo": payload}
+
+    @server.handler("missing")
+    def missing(_):
+        raise HTTPException(status_code=404, detail="Sector not found")
+
+    @server.handler("broken")
+    def broken(_):
+        raise ZeroDivisionError("boom")
+
+    return server, client
+
+
+def run_with_server(server, scenario):
+    async def main():
+        serving = asyncio.ensure_future(server.serve())
+        try:
+            return await scenario()
+        finally:
+            serving.cancel()
+
+    return asyncio.run(main())
+
+
+def test_command_channel_round_trip_without_polling():
+    server, client = make_channels(slots=4, slot_bytes=4096)
+
+    async def scenario():
+        started = time.monotonic()
+        results = await asyncio.gather(*(client.call("echo", n) for n in range(4)))
+        return results, time.monotonic() - started
+
+    results, elapsed = run_with_server(server, scenario)
+    assert results == [{"echo": n} for n in range(4)]
+    assert elapsed < 0.5
+    assert (client.region["state"] == 0).all()
+
+
+def test_command_channel_propagates_handler_errors():
+    server, client = make_channels(slots=2, slot_bytes=4096)
+
+    async def scenario():
+        errors = []
+        for op in ("missing", "broken"):
+            with pytest.raises(HTTPException) as error:
+                await client.call(op)
+            errors.append(error.value)
+        return errors
+
+    missing, broken = run_with_server(server, scenario)
+    assert (missing.status_code, missing.detail) == (404, "Sector not found")
+    assert broken.status_code == 500 and "ZeroDivisionError" in broken.detail
+
+
+def test_command_channel_rejects_oversized_requests_and_full_slots():
+    server, client = make_channels(slots=1, slot_bytes=64, timeout=0.2)
+
+    @server.handler("slow")
+    async def slow(_):
+        await asyncio.sleep(0.3)
+
+    async def scenario():
+        with pytest.raises(HTTPException) as too_large:
+            await client.call("echo", "x" * 100)
+        # Sin escritor atendiendo: la llamada caduca y suelta la ranura.
+        with pytest.raises(HTTPException) as unavailable:
+            await client.call("echo", 1)
+        assert client.region["state"][0] == shared_state.FREE
+        serving = asyncio.ensure_future(server.serve())
+        try:
+            pending = asyncio.ensure_future(client.call("slow"))
+            await asyncio.sleep(0.05)
+            with pytest.raises(HTTPException) as busy:
+                await client.call("echo", 2)
+            await asyncio.gather(pending, return_exceptions=True)
+        finally:
+            serving.cancel()
+        return too_large.value, unavailable.value, busy.value
+
+    too_large, unavailable, busy = asyncio.run(scenario())
+    assert too_large.status_code == 413
+    assert (unavailable.status_code, unavailable.detail) == (503, "Writer unavailable")
+    assert (busy.status_code, busy.detail) == (503, "Writer busy")
+
+
+def test_cancelled_calls_free_their_slots():
+    server, client = make_channels(slots=1, slot_bytes=4096)
+    started = []
+
+    @server.handler("slow")
+    async def slow(payload):
+        started.append(payload)
+        await asyncio.sleep(0.1)
+        return payload
+
+    async def scenario():
+        # Cancelada antes de que el escritor la atienda: la ranura queda libre al momento.
+        queued = asyncio.ensure_future(client.call("slow", "queued"))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert client.region["state"][0] == shared_state.FREE
+
+        serving = asyncio.ensure_future(server.serve())
+        try:
+            # Cancelada mientras se ejecuta: la marca ABANDONED y el escritor la libera al terminar.
+            running = asyncio.ensure_future(client.call("slow", "running"))
+            await asyncio.sleep(0.05)
+            running.cancel()
+            await asyncio.gather(running, return_exceptions=True)
+            assert client.region["state"][0] == shared_state.ABANDONED
+            await asyncio.sleep(0.1)
+            assert client.region["state"][0] == shared_state.FREE
+            return await client.call("slow", "next")
+        finally:
+            serving.cancel()
+
+    assert asyncio.run(scenario()) == "next"
+    assert started == ["running", "next"]
+
+
+def test_stale_claims_never_take_a_running_slot():
+    server, client = make_channels(slots=1, slot_bytes=4096, timeout=0.05)
+    region = client.region
+    region["state"][0] = shared_state.RUNNING
+    region["claimed_at"][0] = time.time() - 60
+    assert client._claim() is None
+
+    # Una ranura READY de un llamante muerto sí se recupera, con otra generación.
+    region["state"][0] = shared_state.READY
+    generation = int(region["generation"][0])
+    assert client._claim() == (0, generation + 1)
+
+
+def test_late_reply_for_a_reclaimed_slot_is_discarded():
+    server, client = make_channels(slots=1, slot_bytes=4096)
+    region = server.region
+    request = shared_state.dumps({"op": "echo", "payload": "old"})
+
+    async def scenario():
+        slot, generation = client._claim()
+        region["data"][slot, :len(request)] = np.frombuffer(request, np.uint8)
+        region["length"][slot] = len(request)
+        region["state"][slot] = shared_state.RUNNING
+        running = asyncio.ensure_future(server._execute(slot, generation))
+        await asyncio.sleep(0)
+        # Mientras el escritor trabaja, la ranura pasa a otra generación (otro llamante).
+        region["generation"][slot] = generation + 1
+        region["state"][slot] = shared_state.CLAIMED
+        await running
+        return slot
+
+    slot = asyncio.run(scenario())
+    assert region["state"][slot] == shared_state.CLAIMED
+    assert region["data"][slot, :len(request)].tobytes() == request
+
+
+def test_new_writer_fails_requests_left_running_by_the_previous_one():
+    server, client = make_channels(slots=2, slot_bytes=4096)
+    region = server.region
+    region["state"][:] = [shared_state.RUNNING, shared_state.ABANDONED]
+    server._recover()
+    assert region["state"].tolist() == [shared_state.DONE, shared_state.FREE]
+    assert int(region["status"][0]) == 503
+
+
+def test_command_channel_serves_requests_queued_before_the_writer_starts():
+    server, client = make_channels(slots=2, slot_bytes=4096)
+
+    async def scenario():
+        pending = asyncio.ensure_future(client.call("echo", "late"))
+        await asyncio.sleep(0.05)
+        serving = asyncio.ensure_future(server.serve())
+        try:
+            return await pending
+        finally:
+            serving.cancel()
+
+    assert asyncio.run(scenario()) == {"echo": "late"}
@@ -0,0 +1,12 @@
+from wakanda_shared.snapshot import Snapshot, etag_matches
+
+
+def test_etag_matches_lists_wildcard_and_weak_tags():
+    etag = Snapshot({"a": 1}).etag
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert etag_matches(etag, f"W/{etag}")
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(etag, "")
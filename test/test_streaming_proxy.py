@@ -0,0 +1,117 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from services.gateway_api import streaming_proxy
+from services.gateway_api.deadlines import DEADLINE_HEADER, Deadline
+from services.gateway_api.resilience import UpstreamGuards, UpstreamServerError
+from services.gateway_api.retries import RetryPolicy
+from services.gateway_api.streaming_proxy import buffered_error_response, filter_headers, raw_headers, stream_proxy
+from services.gateway_api.upstream_pool import UpstreamPool
+
+
+def streamed(status_code: int, body: bytes, headers=()) -> httpx.Response:
+    """Respuesta con cuerpo en streaming (como la de un upstream real, sin leer de antemano)."""
+    async def chunks():
+        yield body
+
+    return httpx.Response(status_code, headers=list(headers), content=chunks())
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Upstream en proceso: guarda cada petición recibida y responde con `reply(request)`."""
+    received = []
+    state = {"reply": lambda request: streamed(200, b"ok")}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        received.append((request, await request.aread()))
+        return state["reply"](request)
+
+    pool = UpstreamPool()
+    pool.transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(streaming_proxy, "upstream_pool", pool)
+    monkeypatch.setattr(streaming_proxy, "upstream_guards", UpstreamGuards())
+    monkeypatch.setattr(streaming_proxy, "retry_policy", RetryPolicy(set(), max_attempts=2))
+    state["received"] = received
+    return state
+
+
+def client_request(method: str = "GET", query: str = "", body: bytes = b"", **headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    if body:
+        raw.append((b"content-length", str(len(body)).encode()))
+    chunks = [body]
+
+    async def receive():
+        return {"type": "http.request", "body": chunks.pop() if chunks else b"", "more_body": False}
+
+    return Request({"type": "http", "method": method, "path": "/", "query_string": query.encode(),
+                    "headers": raw, "client": ("10.0.0.7", 5000)}, receive)
+
+
+def proxy(request: Request):
+    async def pick():
+        return "http://agua:8003/water/x"
+
+    async def run():
+        response = await stream_proxy("agua", "agua/water/x", pick, request, Deadline.after(5))
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        await response.background()
+        return response, body
+
+    return asyncio.run(run())
+
+
+def test_hop_by_hop_and_dropped_headers_are_filtered():
+    headers = [("Connection", "keep-alive"), ("TE", "trailers"), ("Host", "gw"), ("X-Trace", "1"),
+               ("Set-Cookie", "a=1"), ("Set-Cookie", "b=2")]
+    assert filter_headers(headers, drop=("host",)) == [("X-Trace", "1"), ("Set-Cookie", "a=1"), ("Set-Cookie", "b=2")]
+    assert raw_headers(headers[3:]) == [(b"x-trace", b"1"), (b"set-cookie", b"a=1"), (b"set-cookie", b"b=2")]
+
+
+def test_request_and_response_are_passed_through(upstream):
+    upstream["reply"] = lambda request: streamed(
+        201, b"created", [("x-upstream", "a"), ("set-cookie", "a=1"), ("set-cookie", "b=2"), ("connection", "close")])
+    request = client_request("POST", "page=2", b'{"n": 1}', host="gateway", x_trace="t", connection="keep-alive",
+                             **{DEADLINE_HEADER.replace("-", "_"): "99999"})
+    response, body = proxy(request)
+
+    assert (response.status_code, body) == (201, b"created")
+    headers = response.raw_headers
+    assert (b"x-upstream", b"a") in headers and headers.count((b"set-cookie", b"a=1")) == 1
+    assert (b"set-cookie", b"b=2") in headers and not any(k == b"connection" for k, _ in headers)
+
+    [(sent, sent_body)] = upstream["received"]
+    assert str(sent.url) == "http://agua:8003/water/x?page=2" and sent_body == b'{"n": 1}'
+    assert sent.headers["x-trace"] == "t" and sent.headers["x-forwarded-for"] == "10.0.0.7"
+    assert sent.headers["host"] == "agua:8003"
+    # El deadline del cliente no se reenvía tal cual: va el presupuesto que queda.
+    [deadline_ms] = sent.headers.get_list(DEADLINE_HEADER)
+    assert int(deadline_ms) <= 5000
+
+
+def test_get_server_errors_are_retried_before_streaming(upstream):
+    replies = iter([streamed(503, b"busy"), streamed(200, b"ok")])
+    upstream["reply"] = lambda request: next(replies)
+    response, body = proxy(client_request())
+    assert (response.status_code, body) == (200, b"ok")
+    assert len(upstream["received"]) == 2
+
+
+def test_requests_with_a_body_are_not_retried(upstream):
+    upstream["reply"] = lambda request: streamed(503, b"busy")
+    with pytest.raises(UpstreamServerError) as error:
+        proxy(client_request("POST", body=b"{}"))
+    assert error.value.response.status_code == 503
+    assert len(upstream["received"]) == 1
+
+
+def test_buffered_error_response_keeps_the_upstream_error():
+    upstream_response = httpx.Response(502, content=b'{"detail": "down"}',
+                                       headers={"content-type": "application/json", "x-upstream": "a"})
+    response = buffered_error_response(UpstreamServerError(upstream_response))
+    assert (response.status_code, response.body) == (502, b'{"detail": "down"}')
+    assert response.headers["x-upstream"] == "a" and response.headers["content-length"] == "18"
@@ -0,0 +1,51 @@
+import numpy as np
+
+from services.gestion_trafico.simulation_engine import GREEN, MAX_QUEUE, SATURATION_FLOW, TrafficEngine
+
+
+def test_queues_drain_with_short_ticks():
+    engine = TrafficEngine(1000, seed=1)
+    engine.arrival_rate[:] = 0.0
+    engine.vehicle_count[:] = 50
+    engine.phase[:] = GREEN
+    engine.green_seconds[:] = 600
+    engine.phase_elapsed[:] = 0.0
+
+    for _ in range(200):
+        engine.tick(1.0)
+
+    assert engine.vehicle_count.sum() == 0
+
+
+def test_departures_do_not_depend_on_tick_length():
+    # Las salidas medias por segundo en verde deben ser SATURATION_FLOW con cualquier dt.
+    for dt in (0.5, 1.0, 3.0):
+        engine = TrafficEngine(2000, seed=2)
+        engine.arrival_rate[:] = 0.0
+        engine.vehicle_count[:] = MAX_QUEUE
+        engine.phase[:] = GREEN
+        engine.green_seconds[:] = 600
+        engine.phase_elapsed[:] = 0.0
+        seconds = 60.0
+        for _ in range(int(seconds / dt)):
+            engine.tick(dt)
+        rate = (MAX_QUEUE - engine.vehicle_count.mean()) / seconds
+        assert np.isclose(rate, SATURATION_FLOW, rtol=0.05), (dt, rate)
+
+
+def test_saturation_stays_low_at_one_second_ticks():
+    engine = TrafficEngine(2000, seed=3)
+    for _ in range(600):
+        engine.tick(1.0)
+    saturated = (engine.vehicle_count >= MAX_QUEUE).mean()
+    reference = TrafficEngine(2000, seed=3)
+    for _ in range(200):
+        reference.tick(3.0)
+    assert saturated <= (reference.vehicle_count >= MAX_QUEUE).mean() + 0.05
+
+
+def test_index_of_rejects_non_ascii_digits():
+    engine = TrafficEngine(10, seed=4)
+    assert engine.index_of("I-3") == 3
+    for intersection_id in ("I-²", "I-٣", "I-", "I-10", "X-1", "I--1"):
+        assert engine.index_of(intersection_id) is None
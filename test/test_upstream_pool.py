@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.gateway_api.upstream_pool import POOL_TIMEOUTS, UpstreamPool
+
+
+def test_one_client_per_upstream_host():
+    pool = UpstreamPool()
+    first = pool.client_for("http://agua:8003/water/x")
+    assert pool.client_for("http://agua:8003/other?q=1") is first
+    assert pool.client_for("http://agua:8004/water/x") is not first
+    assert sorted(pool.clients) == ["agua:8003", "agua:8004"]
+    asyncio.run(pool.aclose())
+    assert pool.clients == {}
+
+
+def test_requests_reuse_the_host_client_and_count_pool_timeouts():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        if request.url.path == "/full":
+            raise httpx.PoolTimeout("no free connection")
+        return httpx.Response(200, json={"ok": True})
+
+    pool = UpstreamPool()
+    pool.transport = httpx.MockTransport(handler)
+    timeouts = POOL_TIMEOUTS.labels(upstream="agua:8003")._value.get()
+
+    async def run():
+        response = await pool.request("GET", "http://agua:8003/a")
+        streamed = await pool.stream("GET", "http://agua:8003/b")
+        await streamed.aread()
+        await streamed.aclose()
+        with pytest.raises(httpx.PoolTimeout):
+            await pool.request("GET", "http://agua:8003/full")
+        await pool.aclose()
+        return response.json(), streamed.content
+
+    assert asyncio.run(run()) == ({"ok": True}, b'{"ok": true}')
+    assert len(seen) == 3
+    assert POOL_TIMEOUTS.labels(upstream="agua:8003")._value.get() == timeouts + 1
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from services.gestion_residuos import waste_main
+from services.gestion_residuos.pickup_scheduler import PickupScheduler
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    scheduler = PickupScheduler()
+    monkeypatch.setattr(waste_main, "scheduler", scheduler)
+    monkeypatch.setattr(waste_main, "routes", {})
+    monkeypatch.setattr(waste_main, "assigned", {})
+    monkeypatch.setattr(waste_main, "TRUCKS", 2)
+    monkeypatch.setattr(waste_main, "TRUCK_CAPACITY", 2)
+    for n in range(4):
+        scheduler.request(f"C-{n}", 90 - n, (0.0, 0.001 * n), now=1000.0 + n)
+    return scheduler
+
+
+def test_failed_route_planning_releases_the_batch_and_the_truck(planner, monkeypatch):
+    def broken_plan_route(depot, stops):
+        raise RuntimeError("solver crashed")
+
+    monkeypatch.setattr(waste_main, "plan_route", broken_plan_route)
+    with pytest.raises(RuntimeError):
+        asyncio.run(waste_main.plan_routes())
+
+    assert waste_main.routes == {} and waste_main.assigned == {}
+    assert waste_main.free_trucks() == ["T-1", "T-2"]
+    queued = planner.peek(10)
+    assert [item["container_id"] for item in queued] == ["C-0", "C-1", "C-2", "C-3"]
+    assert queued[0]["requested_at"] == 1000.0 and queued[0]["location"] == (0.0, 0.0)
+
+
+def test_planning_assigns_every_free_truck(planner):
+    asyncio.run(waste_main.plan_routes())
+    assert sorted(route["truck_id"] for route in waste_main.routes.values()) == ["T-1", "T-2"]
+    assert all(route["status"] == "assigned" for route in waste_main.routes.values())
+    assert sorted(waste_main.assigned) == ["C-0", "C-1", "C-2", "C-3"]
+    assert len(planner) == 0 and waste_main.free_trucks() == []
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import random
+from typing import Iterator, Optional
+
+import httpx
+
+from wakanda_shared.shared_state import FileLock, shared_path
+
+logger = logging.getLogger("bootstrap")
+
+DEFAULT_REGISTRY_URL = "http://service_registry:8000/register"
+# 0 = un tercio del lease que devuelve el registro.
+HEARTBEAT_INTERVAL = float(os.getenv("REGISTRY_HEARTBEAT_INTERVAL", 0))
+RETRY_BASE_DELAY = float(os.getenv("REGISTRY_RETRY_BASE_DELAY", 0.2))
+RETRY_MAX_DELAY = float(os.getenv("REGISTRY_RETRY_MAX_DELAY", 10.0))
+REQUEST_TIMEOUT = float(os.getenv("REGISTRY_REQUEST_TIMEOUT", 2.0))
+# Tiempo máximo esperando a que el propio /health responda antes de registrarse igualmente.
+READY_TIMEOUT = float(os.getenv("REGISTRY_READY_TIMEOUT", 10.0))
+READY_POLL_INTERVAL = 0.05
+
+
+def backoff_delays(base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> Iterator[float]:
+    """Esperas exponenciales con jitter completo: uniforme en [0, min(cap, base·2^n)]."""
+    attempt = 0
+    while True:
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
+        attempt += 1
+
+
+class ServiceRegistration:
+    """
+    Ciclo de vida de un servicio en el Service Registry.
+
+    `start()` (en el lifespan) espera a que el propio /health responda, se registra con
+    reintentos y renueva el lease con heartbeats; si el registro ya no conoce la instancia
+    (reinicio del registro, lease caducado) vuelve a registrarse. `stop()` da de baja la
+    instancia para que el Gateway deje de enviarle tráfico sin esperar a que caduque el lease.
+
+    Con varios workers todos registran la misma URL: cada uno mantiene un flock compartido
+    mientras vive y solo el último en pararse (el que logra el flock exclusivo) la da de baja.
+    """
+
+    def __init__(self, service_name: str, port: int, registry_url: Optional[str] = None,
+                 host: Optional[str] = None):
+        self.service_name = service_name
+        self.port = port
+        self.url = f"http://{host or os.getenv('SERVICE_HOST') or service_name}:{port}"
+        self.health_url = f"{self.url}/health"
+        self.registry_url = registry_url or os.getenv("REGISTRY_URL", DEFAULT_REGISTRY_URL)
+        self.heartbeat_url = self.registry_url.rsplit("/register", 1)[0] + "/heartbeat"
+        self.registered = False
+        self.lease_ttl: Optional[float] = None
+        self.attempts = 0
+        self._task: Optional[asyncio.Task] = None
+        self._workers: Optional[FileLock] = None
+
+    def start(self):
+        self._workers = FileLock(shared_path(f"{self.service_name}-registration", ".lock"))
+        self._workers.acquire(shared=True)
+        self._task = asyncio.create_task(self._run())
+
+    def _last_worker(self) -> bool:
+        """Suelta el flock compartido de este worker; es el último si nadie más lo mantiene."""
+        lock, self._workers = self._workers, None
+        if lock is None:
+            return True
+        lock.release()
+        last = lock.acquire(blocking=False)
+        if last:
+            lock.release()
+        os.close(lock.fd)
+        return last
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        last = self._last_worker()
+        if not self.registered:
+            return
+        if not last:
+            # Los demás workers siguen sirviendo la misma URL: la baja la hará el último.
+            self.registered = False
+            return
+        self.registered = False
+        try:
+            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+                await client.delete(f"{self.registry_url}/{self.service_name}", params={"url": self.url})
+            logger.info(f"👋 {self.service_name} dado de baja")
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ No se pudo dar de baja {self.service_name}: {e}")
+
+    async def _run(self):
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+            await self._wait_until_ready(client)
+            while True:
+                await self._register(client)
+                await self._heartbeat(client)
+
+    async def _wait_until_ready(self, client: httpx.AsyncClient):
+        # El lifespan termina antes de que uvicorn abra el socket: se espera al primer /health correcto
+        # para que el registro no sondee (ni el Gateway enrute) una instancia que aún no escucha.
+        local = f"http://127.0.0.1:{self.port}/health"
+        deadline = asyncio.get_running_loop().time() + READY_TIMEOUT
+        while asyncio.get_running_loop().time() < deadline:
+            try:
+                if (await client.get(local, timeout=READY_POLL_INTERVAL * 10)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(READY_POLL_INTERVAL)
+        logger.warning(f"⚠️ {self.service_name}: /health no responde, se registra igualmente")
+
+    async def _register(self, client: httpx.AsyncClient):
+        payload = {"service_name": self.service_name, "url": self.url, "health_url": self.health_url}
+        for delay in backoff_delays():
+            self.attempts += 1
+            try:
+                response = await client.post(self.registry_url, json=payload)
+                response.raise_for_status()
+                self.lease_ttl = response.json().get("lease_ttl")
+                self.registered = True
+                logger.info(f"✅ {self.service_name} registrado en {self.registry_url} (intento {self.attempts})")
+                return
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"⚠️ Fallo registro {self.service_name} (intento {self.attempts}): {e}; "
+                               f"reintento en {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _heartbeat_interval(self) -> float:
+        interval = HEARTBEAT_INTERVAL or (self.lease_ttl or 30.0) / 3
+        # ±10 % para que las instancias arrancadas a la vez no latan sincronizadas.
+        return interval * random.uniform(0.9, 1.1)
+
+    async def _heartbeat(self, client: httpx.AsyncClient):
+        """Renueva el lease hasta que el registro deje de conocer la instancia."""
+        payload = {"service_name": self.service_name, "url": self.url}
+        delays = backoff_delays()
+        wait = self._heartbeat_interval()
+        while True:
+            await asyncio.sleep(wait)
+            try:
+                response = await client.post(self.heartbeat_url, json=payload)
+                if response.status_code == 404:
+                    logger.warning(f"⚠️ El registro no conoce {self.service_name}; se vuelve a registrar")
+                    self.registered = False
+                    return
+                response.raise_for_status()
+                delays = backoff_delays()
+                wait = self._heartbeat_interval()
+            except httpx.HTTPError as e:
+                # Registro caído: se reintenta antes del siguiente latido, sin superar el intervalo.
+                wait = min(next(delays), self._heartbeat_interval())
+                logger.warning(f"⚠️ Heartbeat de {self.service_name} fallido: {e}")
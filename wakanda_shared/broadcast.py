@@ -0,0 +1,156 @@
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Callable, Iterable, Optional, Set, Tuple
+
+# Por debajo del timeout de lectura del Gateway (10 s) para que no corte flujos inactivos.
+KEEPALIVE_SECONDS = 5.0
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+_CLOSED = object()
+_KEEPALIVE = object()
+
+
+def format_event(event_id: int, event: str, data: dict) -> bytes:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class _Subscriber:
+    __slots__ = ("queue",)
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+
+class Broadcaster:
+    """
+    Difusión de eventos a suscriptores Server-Sent Events.
+
+    Cada evento se serializa una sola vez y se encola tal cual en cada suscriptor.
+    Las colas están acotadas; con un cliente lento se aplica `policy`:
+    - "drop_oldest": se descarta su evento más antiguo (el cliente ve un hueco de ids).
+    - "disconnect": se cierra su flujo; el cliente puede reconectar con Last-Event-ID.
+    Los últimos `history` eventos se guardan para reanudar desde un id; si el id es
+    más antiguo, `backfill` (opcional) aporta los eventos que faltan.
+    """
+
+    def __init__(self, queue_size: int = 100, policy: str = DROP_OLDEST, history: int = 1024):
+        if policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.subscribers: Set[_Subscriber] = set()
+        self.history: deque = deque(maxlen=history)
+        self.last_id = 0
+        self.dropped = 0
+        self.disconnected = 0
+        # Si se asigna, recibe (id, bytes) de cada evento publicado aquí (p. ej. para otros workers).
+        self.on_publish: Optional[Callable[[int, bytes], None]] = None
+
+    def publish(self, event: str, data: dict, event_id: Optional[int] = None) -> int:
+        event_id = event_id if event_id is not None else self.last_id + 1
+        payload = format_event(event_id, event, data)
+        if self.on_publish is not None:
+            self.on_publish(event_id, payload)
+        return self.publish_formatted(event_id, payload)
+
+    def publish_formatted(self, event_id: int, payload: bytes) -> int:
+        """Difunde un evento ya formateado (format_event) con su id."""
+        self.last_id = event_id
+        item = (event_id, payload)
+        self.history.append(item)
+        slow = []
+        for subscriber in self.subscribers:
+            queue = subscriber.queue
+            if queue.full():
+                if self.policy == DISCONNECT:
+                    slow.append(subscriber)
+                    continue
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(item)
+        for subscriber in slow:
+            self._disconnect(subscriber)
+        return self.last_id
+
+    def _disconnect(self, subscriber: _Subscriber):
+        # Se vacía la cola para dejar sitio a la marca de cierre.
+        self.subscribers.discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(_CLOSED)
+        self.disconnected += 1
+
+    @staticmethod
+    def _keepalive(queue: asyncio.Queue):
+        if queue.empty():
+            queue.put_nowait(_KEEPALIVE)
+
+    def _replay(self, last_event_id: int,
+                backfill: Optional[Callable[[int], Iterable[Tuple[int, bytes]]]]) -> Iterable[Tuple[int, bytes]]:
+        oldest = self.history[0][0] if self.history else self.last_id + 1
+        cursor = last_event_id
+        if oldest > last_event_id + 1 and backfill is not None:
+            for event_id, payload in backfill(last_event_id):
+                cursor = event_id
+                yield event_id, payload
+        for event_id, payload in list(self.history):
+            if event_id > cursor:
+                yield event_id, payload
+
+    async def stream(self, last_event_id: Optional[int] = None,
+                     backfill: Optional[Callable[[int], Iterable[Tuple[int, bytes]]]] = None) -> AsyncIterator[bytes]:
+        """Generador para StreamingResponse(media_type="text/event-stream")."""
+        subscriber = _Subscriber(self.queue_size)
+        # Primero se suscribe y después se reenvía el histórico: no se pierde nada entre ambos.
+        self.subscribers.add(subscriber)
+        try:
+            delivered = last_event_id if last_event_id is not None else self.last_id
+            if last_event_id is not None:
+                for event_id, payload in self._replay(last_event_id, backfill):
+                    delivered = event_id
+                    yield payload
+            loop = asyncio.get_running_loop()
+            queue = subscriber.queue
+            while True:
+                if queue.empty():
+                    # Un temporizador por espera es mucho más barato que wait_for (que crea una Task).
+                    timer = loop.call_later(KEEPALIVE_SECONDS, self._keepalive, queue)
+                    item = await queue.get()
+                    timer.cancel()
+                else:
+                    item = queue.get_nowait()
+                if item is _KEEPALIVE:
+                    yield b": keepalive\n\n"
+                    continue
+                # Se vacía lo acumulado en una sola escritura al cliente.
+                chunks = []
+                while True:
+                    if item is _CLOSED:
+                        if chunks:
+                            yield b"".join(chunks)
+                        return
+                    if item is not _KEEPALIVE:
+                        event_id, payload = item
+                        if event_id > delivered:
+                            delivered = event_id
+                            chunks.append(payload)
+                    if queue.empty():
+                        break
+                    item = queue.get_nowait()
+                if chunks:
+                    yield b"".join(chunks)
+        finally:
+            self.subscribers.discard(subscriber)
+
+    def info(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "last_event_id": self.last_id,
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+        }
@@ -0,0 +1,231 @@
+"""
+Diagnóstico opcional de los servicios (DIAGNOSTICS_ENABLED=true).
+
+- Retraso del bucle de eventos: una tarea duerme DIAGNOSTICS_LAG_INTERVAL y mide cuánto tarda de
+  más en despertar (histograma event_loop_lag_seconds).
+- Corrutinas que bloquean: un hilo vigilante detecta cuando el bucle lleva más de
+  DIAGNOSTICS_BLOCKED_THRESHOLD_MS sin despertar y guarda la pila del hilo del bucle en ese
+  momento (event_loop_blocked_total, GET /debug/blocked y un aviso en el log).
+- Saturación del threadpool de Starlette (handlers `def`): hilos en uso, límite y tareas en cola.
+- GET /debug/profile?seconds=N: profiler por muestreo de todos los hilos; devuelve pilas
+  colapsadas ("marco;marco;marco N"), el formato de flamegraph.pl y speedscope.
+
+Desactivado no añade rutas, tareas, hilos ni métricas.
+"""
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from fastapi import APIRouter, FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger("diagnostics")
+
+DIAGNOSTICS_ENABLED = os.getenv("DIAGNOSTICS_ENABLED", "false").lower() in ("1", "true", "yes")
+LAG_INTERVAL = float(os.getenv("DIAGNOSTICS_LAG_INTERVAL", 0.1))
+BLOCKED_THRESHOLD = float(os.getenv("DIAGNOSTICS_BLOCKED_THRESHOLD_MS", 100)) / 1000
+PROFILE_MAX_SECONDS = float(os.getenv("DIAGNOSTICS_PROFILE_MAX_SECONDS", 60))
+PROFILE_INTERVAL_MS = float(os.getenv("DIAGNOSTICS_PROFILE_INTERVAL_MS", 5))
+BLOCKED_HISTORY = 20
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Marcos superiores de un hilo que está esperando (selector del bucle, colas, locks): no es trabajo.
+IDLE_FUNCTIONS = frozenset({"select", "poll", "wait", "_wait_for_tstate_lock", "get", "accept", "_worker"})
+
+_metrics = None
+
+
+def _prometheus_metrics():
+    """Métricas en el registro por defecto (las expone /metrics de la telemetría); se crean una vez."""
+    global _metrics
+    if _metrics is None:
+        from prometheus_client import REGISTRY, Counter, Histogram
+
+        _metrics = {
+            "lag": Histogram("event_loop_lag_seconds", "Retraso del bucle de eventos al despertar una tarea",
+                             buckets=LAG_BUCKETS),
+            "blocked": Counter("event_loop_blocked_total",
+                               "Veces que el bucle de eventos ha estado bloqueado más del umbral"),
+        }
+        REGISTRY.register(ThreadpoolCollector())
+    return _metrics
+
+
+class ThreadpoolCollector:
+    """Límite, hilos en uso y tareas esperando del CapacityLimiter de AnyIO (run_in_threadpool)."""
+
+    limiter = None
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        limiter = ThreadpoolCollector.limiter
+        if limiter is None:
+            return
+        # Lectura sin lock desde el hilo del scrape: valores aproximados, suficientes para un gauge.
+        limit = GaugeMetricFamily("threadpool_threads_limit", "Hilos máximos del threadpool")
+        limit.add_metric([], limiter.total_tokens)
+        busy = GaugeMetricFamily("threadpool_threads_busy", "Hilos del threadpool ejecutando un handler")
+        busy.add_metric([], limiter.borrowed_tokens)
+        waiting = GaugeMetricFamily("threadpool_tasks_waiting", "Handlers esperando un hilo libre")
+        waiting.add_metric([], limiter.statistics().tasks_waiting)
+        yield limit
+        yield busy
+        yield waiting
+
+
+_labels: Dict[object, str] = {}
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for prefix in sorted(sys.path, key=len, reverse=True):
+            if prefix and filename.startswith(prefix):
+                filename = filename[len(prefix):].lstrip(os.sep)
+                break
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+    return label
+
+
+def collapse_stack(frame) -> list:
+    """Pila de un frame como lista de etiquetas, de la raíz a la hoja."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class LoopMonitor:
+    """Mide el retraso del bucle y, desde otro hilo, detecta los bloqueos y captura su pila."""
+
+    def __init__(self, interval: float = LAG_INTERVAL, threshold: float = BLOCKED_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.blocked: Deque[dict] = collections.deque(maxlen=BLOCKED_HISTORY)
+        self.loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+
+    async def run(self):
+        metrics = _prometheus_metrics()
+        self.loop_thread_id = threading.get_ident()
+        ThreadpoolCollector.limiter = _current_thread_limiter()
+        watchdog = threading.Thread(target=self._watch, name="diagnostics-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                started = time.monotonic()
+                self._last_beat = started
+                await asyncio.sleep(self.interval)
+                metrics["lag"].observe(max(0.0, time.monotonic() - started - self.interval))
+        finally:
+            self._stop.set()
+
+    def _watch(self):
+        episode_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or beat == episode_beat:
+                continue
+            # Un aviso por bloqueo: mientras no vuelva a latir, es el mismo episodio.
+            episode_beat = beat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = collapse_stack(frame) if frame is not None else []
+            _prometheus_metrics()["blocked"].inc()
+            self.blocked.append({"detected_at": time.time(), "blocked_ms": round(stalled * 1000, 1),
+                                 "stack": stack})
+            logger.warning(f"⚠️ Bucle de eventos bloqueado {stalled * 1000:.0f} ms en: "
+                           f"{stack[-1] if stack else '?'}")
+
+
+def _current_thread_limiter():
+    try:
+        from anyio.to_thread import current_default_thread_limiter
+        return current_default_thread_limiter()
+    except Exception:
+        return None
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False,
+                  stop: Optional[threading.Event] = None) -> Dict[str, int]:
+    """Muestrea las pilas de todos los hilos (menos este) y cuenta cada pila colapsada."""
+    stop = stop or threading.Event()
+    me = threading.get_ident()
+    names = {}
+    counts: Dict[str, int] = collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline and not stop.is_set():
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            if not include_idle and frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            if thread_id not in names:
+                names.update({thread.ident: thread.name.replace(" ", "_") for thread in threading.enumerate()})
+            name = names.get(thread_id, str(thread_id))
+            counts[";".join([name] + collapse_stack(frame))] += 1
+        stop.wait(interval)
+    return counts
+
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+_profiling = False
+monitor: Optional[LoopMonitor] = None
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = Query(5.0, gt=0), interval_ms: float = Query(PROFILE_INTERVAL_MS, ge=1),
+                  idle: bool = False):
+    """Pilas colapsadas de N segundos de muestreo: `flamegraph.pl perfil.txt > perfil.svg`."""
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {PROFILE_MAX_SECONDS:g}")
+    global _profiling
+    if _profiling:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    _profiling = True
+    stop = threading.Event()
+    try:
+        # El muestreo va en un hilo: el bucle sigue atendiendo peticiones (y aparece en el perfil).
+        counts = await asyncio.get_running_loop().run_in_executor(
+            None, sample_stacks, seconds, interval_ms / 1000, idle, stop)
+    finally:
+        # Si el cliente corta la petición, el hilo deja de muestrear.
+        stop.set()
+        _profiling = False
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+
+@router.get("/blocked")
+async def blocked():
+    """Últimos bloqueos del bucle de eventos detectados, con la pila del hilo del bucle."""
+    return {"threshold_ms": BLOCKED_THRESHOLD * 1000, "events": list(monitor.blocked) if monitor else []}
+
+
+def setup_diagnostics(app: FastAPI, enabled: bool = DIAGNOSTICS_ENABLED):
+    global monitor
+    if not enabled:
+        return
+    monitor = LoopMonitor()
+    app.include_router(router)
+
+    service_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan_with_diagnostics(app_):
+        async with service_lifespan(app_) as state:
+            task = asyncio.create_task(monitor.run())
+            yield state
+            task.cancel()
+
+    app.router.lifespan_context = lifespan_with_diagnostics
@@ -0,0 +1,70 @@
+"""
+Métricas HTTP de Prometheus con etiquetas de cardinalidad acotada (se importa en diferido).
+
+Mismos nombres y tipos que las métricas por defecto de prometheus_fastapi_instrumentator, pero:
+- `handler` es la plantilla de la ruta ("none" si no hay ruta). Los parámetros listados en
+  `label_params` se sustituyen por su valor solo si su predicado lo acepta, y por "other" si no.
+  Así el catch-all del Gateway queda como "/gestion_trafico/{path:path}" sin abrir una serie
+  por nombre inventado.
+- `method` se limita a los métodos HTTP estándar.
+"""
+import re
+from typing import Callable, Dict, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, Summary
+from prometheus_fastapi_instrumentator.metrics import Info
+
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+LATENCY_HIGHR_BUCKETS = (0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5,
+                         7.5, 10, 30, 60)
+LATENCY_LOWR_BUCKETS = (0.1, 0.5, 1)
+
+
+def _content_length(headers) -> int:
+    try:
+        return int(headers.get("content-length", 0))
+    except ValueError:
+        return 0
+
+
+def http_metrics(label_params: Optional[Dict[str, Callable[[str], bool]]] = None,
+                 registry: CollectorRegistry = REGISTRY) -> Callable[[Info], None]:
+    """Instrumentación para Instrumentator().add(...)."""
+    patterns = {name: re.compile(r"\{" + re.escape(name) + r"(:[^}]*)?\}") for name in (label_params or {})}
+
+    requests_total = Counter("http_requests_total", "Total number of requests by method, status and handler.",
+                             ["method", "status", "handler"], registry=registry)
+    request_size = Summary("http_request_size_bytes", "Content length of incoming requests by handler.",
+                           ["handler"], registry=registry)
+    response_size = Summary("http_response_size_bytes", "Content length of outgoing responses by handler.",
+                            ["handler"], registry=registry)
+    latency_highr = Histogram("http_request_duration_highr_seconds",
+                              "Latency with many buckets but no API specific labels.",
+                              buckets=LATENCY_HIGHR_BUCKETS, registry=registry)
+    latency = Histogram("http_request_duration_seconds", "Latency with only few buckets by handler.",
+                        ["method", "handler"], buckets=LATENCY_LOWR_BUCKETS, registry=registry)
+
+    def handler_label(info: Info) -> str:
+        handler = info.modified_handler
+        if not patterns or handler == "none":
+            return handler
+        # El router ya ha escrito los path_params en el scope compartido cuando se llama a esto.
+        path_params = info.request.scope.get("path_params") or {}
+        for name, pattern in patterns.items():
+            value = path_params.get(name)
+            if value is not None:
+                label = value if label_params[name](value) else "other"
+                handler = pattern.sub(lambda _: label, handler)
+        return handler
+
+    def instrumentation(info: Info) -> None:
+        handler = handler_label(info)
+        method = info.method if info.method in METHODS else "other"
+        requests_total.labels(method, info.modified_status, handler).inc()
+        request_size.labels(handler).observe(_content_length(info.request.headers))
+        if info.response is not None:
+            response_size.labels(handler).observe(_content_length(info.response.headers))
+        latency_highr.observe(info.modified_duration)
+        latency.labels(method, handler).observe(info.modified_duration)
+
+    return instrumentation
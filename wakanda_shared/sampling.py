@@ -0,0 +1,132 @@
+"""
+Muestreo de trazas para wakanda_shared.telemetry (se importa junto con OpenTelemetry, en diferido).
+
+- ratio: ParentBased(TraceIdRatioBased); la decisión se toma al empezar y las trazas
+  descartadas apenas cuestan.
+- rate_limited: como mucho N trazas/s muestreadas al empezar; el resto se registra sin exportar
+  y TailKeepSpanProcessor las exporta igualmente si la petición falla (status ERROR) o es lenta.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.sampling import (ALWAYS_ON, Decision, ParentBased, Sampler, SamplingResult,
+                                              StaticSampler, TraceIdRatioBased)
+from opentelemetry.trace import Link, SpanContext, SpanKind, TraceFlags, get_current_span
+from opentelemetry.trace.status import StatusCode
+from opentelemetry.util.types import Attributes
+
+# Trazas pendientes de decisión (y spans por traza) que TailKeepSpanProcessor guarda como máximo.
+MAX_PENDING_TRACES = 1024
+MAX_SPANS_PER_TRACE = 128
+
+RECORD_ONLY = StaticSampler(Decision.RECORD_ONLY)
+
+
+class RateLimitedSampler(Sampler):
+    """Cubo de tokens: muestrea hasta `rate` trazas/s (ráfagas de hasta `rate`); el resto, RECORD_ONLY."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = max(rate, 1.0)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def should_sample(self, parent_context: Optional[Context], trace_id: int, name: str,
+                      kind: Optional[SpanKind] = None, attributes: Attributes = None,
+                      links: Optional[Sequence[Link]] = None, trace_state=None) -> SamplingResult:
+        decision = Decision.RECORD_AND_SAMPLE if self._take() else Decision.RECORD_ONLY
+        parent_state = get_current_span(parent_context).get_span_context().trace_state
+        return SamplingResult(decision, attributes, parent_state)
+
+    def get_description(self) -> str:
+        return f"RateLimitedSampler{{{self.rate}}}"
+
+
+def build_sampler(kind: str, ratio: float, rate: float) -> Optional[Sampler]:
+    """None deja que el SDK use OTEL_TRACES_SAMPLER (por defecto, todo muestreado)."""
+    if kind == "always_on":
+        return ParentBased(ALWAYS_ON)
+    if kind == "ratio":
+        return ParentBased(TraceIdRatioBased(ratio))
+    if kind == "rate_limited":
+        # Lo no muestreado se registra igualmente para poder rescatar errores y peticiones lentas.
+        return ParentBased(RateLimitedSampler(rate), remote_parent_not_sampled=RECORD_ONLY,
+                           local_parent_not_sampled=RECORD_ONLY)
+    if kind:
+        raise ValueError(f"TELEMETRY_SAMPLER desconocido: {kind}")
+    return None
+
+
+def _as_sampled(span: ReadableSpan) -> ReadableSpan:
+    context = span.context
+    sampled = SpanContext(context.trace_id, context.span_id, context.is_remote,
+                          TraceFlags(context.trace_flags | TraceFlags.SAMPLED), context.trace_state)
+    return ReadableSpan(
+        name=span.name, context=sampled, parent=span.parent, resource=span.resource,
+        attributes=span.attributes, events=span.events, links=span.links, kind=span.kind,
+        status=span.status, start_time=span.start_time, end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
+
+
+class TailKeepSpanProcessor(SpanProcessor):
+    """
+    Delante del BatchSpanProcessor: los spans muestreados pasan tal cual; los registrados sin
+    muestrear se retienen por traza hasta que termina el span raíz local, y se exportan todos
+    si ese span acabó en error o duró al menos `slow_seconds`. Si no, se descartan.
+    """
+
+    def __init__(self, delegate: SpanProcessor, slow_seconds: float):
+        self.delegate = delegate
+        self.slow_ns = int(slow_seconds * 1e9)
+        self.kept = 0
+        self._pending: "OrderedDict[int, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context: Optional[Context] = None) -> None:
+        self.delegate.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context.trace_flags.sampled:
+            self.delegate.on_end(span)
+            return
+        trace_id = span.context.trace_id
+        local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            if not local_root:
+                spans = self._pending.get(trace_id)
+                if spans is None:
+                    if len(self._pending) >= MAX_PENDING_TRACES:
+                        self._pending.popitem(last=False)
+                    spans = self._pending[trace_id] = []
+                if len(spans) < MAX_SPANS_PER_TRACE:
+                    spans.append(span)
+                return
+            children = self._pending.pop(trace_id, [])
+        failed = span.status.status_code is StatusCode.ERROR
+        slow = span.end_time is not None and span.end_time - span.start_time >= self.slow_ns
+        if failed or slow:
+            self.kept += 1
+            for child in children:
+                self.delegate.on_end(_as_sampled(child))
+            self.delegate.on_end(_as_sampled(span))
+
+    def shutdown(self) -> None:
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
@@ -0,0 +1,636 @@
+import asyncio
+import fcntl
+import hashlib
+import inspect
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from wakanda_shared.snapshot import Snapshot, dumps, loads
+
+logger = logging.getLogger("shared_state")
+
+# Estado compartido entre los workers de un servicio (`uvicorn --workers N`).
+# Cada región es un fichero en tmpfs mapeado en memoria con un layout fijo de arrays NumPy.
+SHM_DIR = os.getenv("WAKANDA_SHM_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+# Los workers de `uvicorn --workers N` son procesos hijos (spawn) del master y comparten su pid como
+# espacio de nombres; un proceso único usa el suyo, así dos servicios lanzados desde la misma shell no se
+# mezclan. WAKANDA_SHM_NAMESPACE lo fija a mano (p. ej. con gunicorn, que no usa multiprocessing).
+_master = multiprocessing.parent_process()
+NAMESPACE = os.getenv("WAKANDA_SHM_NAMESPACE") or str(_master.pid if _master is not None else os.getpid())
+MAX_WORKERS = int(os.getenv("WAKANDA_MAX_WORKERS", 16))
+RPC_SLOTS = int(os.getenv("WAKANDA_RPC_SLOTS", 16))
+RPC_SLOT_BYTES = int(os.getenv("WAKANDA_RPC_SLOT_BYTES", 1024 * 1024))
+RPC_TIMEOUT = float(os.getenv("WAKANDA_RPC_TIMEOUT", 10.0))
+
+# Espera inicial y máxima de un lector del seqlock mientras el escritor tiene la sección abierta.
+READ_BACKOFF = 0.00001
+READ_MAX_BACKOFF = 0.001
+
+MAGIC = b"WKSHM001"
+HEADER_BYTES = 64
+ALIGNMENT = 64
+
+Layout = Dict[str, Tuple[Any, Tuple[int, ...]]]
+
+
+def shared_path(name: str, suffix: str = ".shm") -> str:
+    return os.path.join(SHM_DIR, f"wakanda-{NAMESPACE}-{name}{suffix}")
+
+
+def _remove_stale_namespaces():
+    """Borra las regiones de ejecuciones anteriores cuyo proceso padre ya no existe."""
+    pattern = re.compile(r"^wakanda-(\d+)-")
+    for entry in os.listdir(SHM_DIR):
+        match = pattern.match(entry)
+        if not match or match.group(1) == NAMESPACE or int(match.group(1)) <= 1:
+            continue
+        try:
+            os.kill(int(match.group(1)), 0)
+        except ProcessLookupError:
+            try:
+                os.remove(os.path.join(SHM_DIR, entry))
+            except FileNotFoundError:
+                pass
+        except PermissionError:
+            pass
+
+
+class FileLock:
+    """flock sobre un fichero (exclusivo o compartido) entre procesos; el SO lo libera si el proceso muere."""
+
+    def __init__(self, path: str):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.held = False
+
+    def acquire(self, blocking: bool = True, shared: bool = False) -> bool:
+        mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(self.fd, mode if blocking else mode | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.held = True
+        return True
+
+    def release(self):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.held = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SharedRegion:
+    """
+    Arrays NumPy con nombre sobre un fichero compartido (layout fijo: {nombre: (dtype, shape)}).
+
+    El primer proceso crea el fichero y lo inicializa con `initialize(arrays)` bajo un flock;
+    los demás se adjuntan al mismo contenido. La cabecera guarda una huella del layout: si
+    cambia (otra versión del código), la región se recrea.
+    """
+
+    _cleaned = False
+
+    def __init__(self, name: str, layout: Layout, initialize: Optional[Callable[[Dict[str, np.ndarray]], None]] = None):
+        if not SharedRegion._cleaned:
+            _remove_stale_namespaces()
+            SharedRegion._cleaned = True
+        self.name = name
+        self.path = shared_path(name)
+        specs, offset = [], HEADER_BYTES
+        for field, (dtype, shape) in layout.items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            specs.append((field, dtype, shape, count, offset))
+            offset += -(-count * dtype.itemsize // ALIGNMENT) * ALIGNMENT
+        self.size = offset
+        fingerprint = hashlib.blake2b(json.dumps([(f, d.str, list(s)) for f, d, s, _, _ in specs]).encode(),
+                                      digest_size=16).digest()
+
+        lock = FileLock(shared_path(name, ".lock"))
+        with lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                self.created = os.pread(fd, len(MAGIC) + len(fingerprint), 0) != MAGIC + fingerprint
+                if self.created:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.size)
+                self.mm = mmap.mmap(fd, self.size)
+            finally:
+                os.close(fd)
+            self.arrays = {field: np.frombuffer(self.mm, dtype, count, start).reshape(shape)
+                           for field, dtype, shape, count, start in specs}
+            if self.created:
+                if initialize is not None:
+                    initialize(self.arrays)
+                # La cabecera se escribe al final: una región a medio inicializar se recrea.
+                self.mm[:len(MAGIC) + len(fingerprint)] = MAGIC + fingerprint
+        lock.close()
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.arrays[field]
+
+    def close(self):
+        self.arrays = {}
+        self.mm.close()
+
+
+class SeqLock:
+    """
+    Un escritor, lectores sin bloqueo: el contador es impar mientras se escribe y el
+    lector repite la lectura si cambió. Si el escritor murió a mitad de escritura, tras
+    `stale_after` segundos se lee igualmente.
+    """
+
+    def __init__(self, counter: np.ndarray, stale_after: float = 0.5):
+        self._counter = counter
+        self.stale_after = stale_after
+
+    @property
+    def version(self) -> int:
+        return int(self._counter[0])
+
+    @contextmanager
+    def write(self):
+        self._counter[0] += 1
+        try:
+            yield
+        finally:
+            self._counter[0] += 1
+
+    def read(self, fn: Callable, *args):
+        # Cada reintento espera el doble (hasta 1 ms): un escritor lento no deja al lector girando en vacío.
+        deadline, delay = None, 0.0
+        while True:
+            before = int(self._counter[0])
+            if before & 1:
+                deadline = deadline or time.monotonic() + self.stale_after
+                if time.monotonic() < deadline:
+                    time.sleep(delay)
+                    delay = min(max(delay * 2, READ_BACKOFF), READ_MAX_BACKOFF)
+                    continue
+            result = fn(*args)
+            if int(self._counter[0]) == before or (deadline and time.monotonic() >= deadline):
+                return result
+            time.sleep(delay)
+            delay = min(max(delay * 2, READ_BACKOFF), READ_MAX_BACKOFF)
+
+
+_worker_slot: Optional[Tuple[int, FileLock]] = None
+
+
+def worker_slot() -> int:
+    """Índice (0..MAX_WORKERS-1) exclusivo de este proceso mientras viva."""
+    global _worker_slot
+    if _worker_slot is None:
+        for slot in range(MAX_WORKERS):
+            lock = FileLock(shared_path(f"worker-{slot}", ".lock"))
+            if lock.acquire(blocking=False):
+                _worker_slot = (slot, lock)
+                break
+            lock.close()
+        else:
+            raise RuntimeError(f"Más de {MAX_WORKERS} procesos usan el estado compartido (WAKANDA_MAX_WORKERS)")
+    return _worker_slot[0]
+
+
+class ShardedCounters:
+    """Contadores sin bloqueo: cada proceso suma en su propia fila y la lectura suma todas."""
+
+    def __init__(self, name: str, counters: Sequence[str]):
+        self.columns = {counter: i for i, counter in enumerate(counters)}
+        self.region = SharedRegion(f"{name}-counters", {"values": (np.int64, (MAX_WORKERS, len(counters)))})
+        self._row = self.region["values"][worker_slot()]
+
+    def add(self, counter: str, n: int = 1):
+        self._row[self.columns[counter]] += n
+
+    def value(self, counter: str) -> int:
+        return int(self.region["values"][:, self.columns[counter]].sum())
+
+
+class TableFull(RuntimeError):
+    pass
+
+
+class SharedNameTable:
+    """Nombres → índice compartidos (solo altas). Las lecturas no bloquean; un alta toma un flock."""
+
+    def __init__(self, name: str, capacity: int, width: int = 64):
+        self.capacity = capacity
+        self.width = width
+        self.region = SharedRegion(f"{name}-names", {"count": (np.int64, (1,)), "names": (f"S{width}", (capacity,))})
+        self._lock = FileLock(shared_path(f"{name}-names", ".write.lock"))
+        self._index: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def _sync(self):
+        count, names = int(self.region["count"][0]), self.region["names"]
+        for i in range(len(self._names), count):
+            name = names[i].decode()
+            self._index[name] = i
+            self._names.append(name)
+
+    def index_of(self, name: str, create: bool = True) -> Optional[int]:
+        index = self._index.get(name)
+        if index is not None:
+            return index
+        self._sync()
+        index = self._index.get(name)
+        if index is not None or not create:
+            return index
+        encoded = name.encode()
+        if len(encoded) > self.width:
+            raise ValueError(f"Name longer than {self.width} bytes: {name[:20]}...")
+        with self._lock:
+            self._sync()
+            if name not in self._index:
+                count = int(self.region["count"][0])
+                if count >= self.capacity:
+                    raise TableFull(f"Shared table full ({self.capacity} names)")
+                # Primero el nombre y después el contador: un lector nunca ve una entrada vacía.
+                self.region["names"][count] = encoded
+                self.region["count"][0] = count + 1
+                self._sync()
+        return self._index[name]
+
+    def names(self) -> List[str]:
+        self._sync()
+        return self._names
+
+    def __len__(self):
+        self._sync()
+        return len(self._names)
+
+
+class WriterLease:
+    """
+    Elige un único proceso escritor por servicio: quien consigue el flock. Si ese worker
+    muere, el SO libera el lock y otro lo toma en su siguiente intento (`wait`).
+    """
+
+    def __init__(self, name: str):
+        self._lock = FileLock(shared_path(name, ".writer.lock"))
+
+    @property
+    def is_writer(self) -> bool:
+        return self._lock.held
+
+    def try_acquire(self) -> bool:
+        return self._lock.held or self._lock.acquire(blocking=False)
+
+    async def wait(self, poll: float = 1.0):
+        while not self.try_acquire():
+            await asyncio.sleep(poll)
+        logger.info(f"✍️ Worker {os.getpid()} es el escritor")
+
+
+class SharedSnapshot(Snapshot):
+    """Snapshot que publica el escritor en memoria compartida; cualquier worker sirve sus bytes."""
+
+    def __init__(self, name: str, capacity: int = 1024 * 1024):
+        super().__init__()
+        self.capacity = capacity
+        self.region = SharedRegion(f"{name}-snapshot", {
+            "version": (np.uint64, (1,)), "length": (np.int64, (1,)),
+            "etag": ("S32", (1,)), "body": (np.uint8, (capacity,)),
+        })
+        self.lock = SeqLock(self.region["version"])
+        self._seen = -1
+        self._decoded: Tuple[str, Any] = ("", None)
+
+    def update(self, data: Any) -> bool:
+        if not super().update(data):
+            return False
+        if len(self.body) > self.capacity:
+            raise ValueError(f"Snapshot de {len(self.body)} bytes mayor que la región ({self.capacity})")
+        with self.lock.write():
+            self.region["length"][0] = len(self.body)
+            self.region["etag"][0] = self.etag.encode()
+            self.region["body"][:len(self.body)] = np.frombuffer(self.body, np.uint8)
+        self._seen = self.lock.version
+        return True
+
+    def _read(self) -> Tuple[bytes, str]:
+        length = int(self.region["length"][0])
+        return self.region["body"][:length].tobytes(), self.region["etag"][0].decode()
+
+    def refresh(self):
+        version = self.lock.version
+        if version != self._seen and not version & 1 and self.region["length"][0]:
+            self.body, self.etag = self.lock.read(self._read)
+            self._seen = version
+
+    def response(self, request=None):
+        self.refresh()
+        return super().response(request)
+
+    def data(self) -> Any:
+        """Último estado publicado ya decodificado (una vez por versión), para servir solo una parte."""
+        self.refresh()
+        if self._decoded[0] != self.etag:
+            self._decoded = (self.etag, loads(self.body))
+        return self._decoded[1]
+
+
+class SharedEventRing:
+    """
+    Últimos `slots` eventos SSE (ya formateados) que publica el escritor. Los demás
+    workers los leen periódicamente y los reenvían a sus propios suscriptores.
+    """
+
+    def __init__(self, name: str, slots: int = 1024, slot_bytes: int = 8192):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.region = SharedRegion(f"{name}-events", {
+            "head": (np.int64, (1,)), "ids": (np.int64, (slots,)),
+            "lengths": (np.int64, (slots,)), "data": (np.uint8, (slots, slot_bytes)),
+        })
+        self.position = int(self.region["head"][0])
+
+    def publish(self, event_id: int, payload: bytes):
+        if len(payload) > self.slot_bytes:
+            logger.warning(f"Evento {event_id} de {len(payload)} bytes no cabe en el anillo compartido")
+            return
+        head = int(self.region["head"][0]) + 1
+        slot = head % self.slots
+        # El id se invalida mientras se reescribe la ranura: un lector la salta.
+        self.region["ids"][slot] = -1
+        self.region["data"][slot, :len(payload)] = np.frombuffer(payload, np.uint8)
+        self.region["lengths"][slot] = len(payload)
+        self.region["ids"][slot] = event_id
+        self.region["head"][0] = head
+        self.position = head
+
+    def read_new(self) -> List[Tuple[int, bytes]]:
+        head = int(self.region["head"][0])
+        start = max(self.position + 1, head - self.slots + 1)
+        events = []
+        for position in range(start, head + 1):
+            slot = position % self.slots
+            event_id = int(self.region["ids"][slot])
+            payload = self.region["data"][slot, :int(self.region["lengths"][slot])].tobytes()
+            if event_id >= 0 and int(self.region["ids"][slot]) == event_id:
+                events.append((event_id, payload))
+        self.position = head
+        return events
+
+    async def follow(self, lease: WriterLease, deliver: Callable[[int, bytes], None], interval: float = 0.05):
+        """Bucle de los workers no escritores: reenvía cada evento nuevo con `deliver(id, payload)`."""
+        while True:
+            await asyncio.sleep(interval)
+            if lease.is_writer:
+                self.position = int(self.region["head"][0])
+                continue
+            for event_id, payload in self.read_new():
+                deliver(event_id, payload)
+
+
+# ABANDONED: el llamante se fue (cancelado o sin respuesta a tiempo) mientras el escritor ejecutaba la
+# petición; el escritor la libera al terminar. Las ranuras RUNNING/ABANDONED solo las toca el escritor.
+FREE, CLAIMED, READY, RUNNING, DONE, ABANDONED = range(6)
+
+
+def _open_fifo(path: str) -> int:
+    """Abre (y crea si hace falta) un FIFO de avisos para leerlo sin bloquear; O_RDWR evita el EOF sin escritores."""
+    try:
+        os.mkfifo(path, 0o600)
+    except FileExistsError:
+        pass
+    return os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+
+def _drain(fd: int):
+    try:
+        while os.read(fd, 4096):
+            pass
+    except BlockingIOError:
+        pass
+
+
+def _notify(path: str):
+    """Despierta a quien tenga abierto el FIFO. Si nadie lo lee o ya tiene avisos pendientes, no hace falta."""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:  # ENOENT / ENXIO: todavía no hay lector
+        return
+    try:
+        os.write(fd, b"\0")
+    except (BlockingIOError, BrokenPipeError):
+        pass
+    finally:
+        os.close(fd)
+
+
+class CommandChannel:
+    """
+    Llamadas de cualquier worker al proceso escritor por memoria compartida.
+
+    Las operaciones que modifican el estado privado del escritor se registran con
+    `@channel.handler("op")`. En el escritor, `call()` invoca el handler directamente;
+    en otro worker reserva una ranura (flock de microsegundos) y escribe la petición.
+    Nadie sondea: cada lado avisa al otro con un byte en un FIFO que el event loop vigila
+    (el escritor tiene uno para peticiones y cada worker uno para sus respuestas).
+    Las HTTPException del handler llegan al llamante.
+
+    Cada reserva incrementa la generación de la ranura; la respuesta solo vale para la
+    generación con la que se pidió, así que un resultado tardío nunca llega a otro llamante.
+    """
+
+    def __init__(self, name: str, lease: WriterLease, slots: int = RPC_SLOTS, slot_bytes: int = RPC_SLOT_BYTES,
+                 timeout: float = RPC_TIMEOUT):
+        self.name = name
+        self.lease = lease
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+        self.handlers: Dict[str, Callable[[Any], Any]] = {}
+        self.region = SharedRegion(f"{name}-rpc", {
+            "state": (np.int32, (slots,)), "status": (np.int32, (slots,)), "owner": (np.int32, (slots,)),
+            "claimed_at": (np.float64, (slots,)), "generation": (np.uint64, (slots,)), "length": (np.int64, (slots,)),
+            "data": (np.uint8, (slots, slot_bytes)),
+        })
+        self._claim_lock = FileLock(shared_path(f"{name}-rpc", ".claim.lock"))
+        self._waiting: Dict[int, Tuple[int, asyncio.Future]] = {}
+        self._replies: Optional[Tuple[asyncio.AbstractEventLoop, int]] = None
+        self.calls = 0
+
+    def handler(self, op: str):
+        def register(fn):
+            self.handlers[op] = fn
+            return fn
+        return register
+
+    def _fifo(self, worker: Optional[int] = None) -> str:
+        return shared_path(f"{self.name}-rpc" if worker is None else f"{self.name}-rpc-{worker}", ".fifo")
+
+    async def _invoke(self, op: str, payload: Any) -> Any:
+        result = self.handlers[op](payload)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def call(self, op: str, payload: Any = None) -> Any:
+        if self.lease.is_writer:
+            return await self._invoke(op, payload)
+        request = dumps({"op": op, "payload": payload})
+        if len(request) > self.slot_bytes:
+            raise HTTPException(status_code=413, detail=f"Request larger than {self.slot_bytes} bytes")
+        claimed = self._claim()
+        if claimed is None:
+            raise HTTPException(status_code=503, detail="Writer busy")
+        slot, generation = claimed
+        state, data = self.region["state"], self.region["data"]
+        data[slot, :len(request)] = np.frombuffer(request, np.uint8)
+        self.region["length"][slot] = len(request)
+        self.region["owner"][slot] = worker_slot()
+        reply = asyncio.get_running_loop().create_future()
+        self._waiting[slot] = (generation, reply)
+        self._listen()
+        state[slot] = READY
+        _notify(self._fifo())
+        self.calls += 1
+        try:
+            await asyncio.wait_for(reply, self.timeout)
+        except asyncio.TimeoutError:
+            if state[slot] != DONE:
+                self._abandon(slot, generation)
+                raise HTTPException(status_code=503, detail="Writer unavailable")
+        except asyncio.CancelledError:
+            # Cliente desconectado o deadline del gateway: la ranura no puede quedarse ocupada.
+            self._abandon(slot, generation)
+            raise
+        finally:
+            self._waiting.pop(slot, None)
+        status = int(self.region["status"][slot])
+        response = loads(data[slot, :int(self.region["length"][slot])].tobytes())
+        state[slot] = FREE
+        if status != 200:
+            raise HTTPException(status_code=status, detail=response.get("detail"))
+        return response
+
+    def _abandon(self, slot: int, generation: int):
+        """Suelta una ranura sin esperar la respuesta: libre si el escritor no la está ejecutando, si no ABANDONED."""
+        state = self.region["state"]
+        with self._claim_lock:
+            if self.region["generation"][slot] != generation:
+                return
+            state[slot] = ABANDONED if state[slot] == RUNNING else FREE
+
+    def _listen(self):
+        """Abre el FIFO de respuestas de este worker y lo vigila desde el event loop actual."""
+        loop = asyncio.get_running_loop()
+        if self._replies is not None and self._replies[0] is loop:
+            return
+        fd = self._replies[1] if self._replies is not None else _open_fifo(self._fifo(worker_slot()))
+        loop.add_reader(fd, self._on_reply, fd)
+        self._replies = (loop, fd)
+
+    def _on_reply(self, fd: int):
+        # Un aviso puede cubrir varias respuestas (o ser de una llamada ya caducada): se miran todas.
+        _drain(fd)
+        state, generations = self.region["state"], self.region["generation"]
+        for slot, (generation, reply) in list(self._waiting.items()):
+            if state[slot] == DONE and generations[slot] == generation and not reply.done():
+                reply.set_result(None)
+
+    def _claim(self) -> Optional[Tuple[int, int]]:
+        state, claimed_at, generation = self.region["state"], self.region["claimed_at"], self.region["generation"]
+        now = time.time()
+        with self._claim_lock:
+            # Solo se recuperan ranuras de llamantes que murieron sin soltarlas; nunca una que ejecuta el escritor.
+            stale = (claimed_at < now - 2 * self.timeout) & (state != RUNNING) & (state != ABANDONED)
+            free = np.flatnonzero((state == FREE) | stale)
+            if not len(free):
+                return None
+            slot = int(free[0])
+            state[slot] = CLAIMED
+            claimed_at[slot] = now
+            generation[slot] += 1
+            return slot, int(generation[slot])
+
+    async def serve(self):
+        """Bucle del escritor: despierta con cada aviso y atiende cada petición lista como una tarea propia."""
+        loop = asyncio.get_running_loop()
+        fd = _open_fifo(self._fifo())
+        wakeup = asyncio.Event()
+        loop.add_reader(fd, wakeup.set)
+        state, generation = self.region["state"], self.region["generation"]
+        self._recover()
+        try:
+            while True:
+                # Se vacía el FIFO antes de mirar las ranuras: un aviso posterior provoca otra pasada.
+                _drain(fd)
+                wakeup.clear()
+                with self._claim_lock:
+                    ready = np.flatnonzero(state == READY).tolist()
+                    state[ready] = RUNNING
+                    started = [(slot, int(generation[slot])) for slot in ready]
+                for slot, slot_generation in started:
+                    asyncio.create_task(self._execute(slot, slot_generation))
+                await wakeup.wait()
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+    def _recover(self):
+        """Al tomar el relevo: lo que el escritor anterior dejó a medias no terminará nunca."""
+        state = self.region["state"]
+        with self._claim_lock:
+            orphaned = np.flatnonzero((state == RUNNING) | (state == ABANDONED)).tolist()
+            for slot in orphaned:
+                self._reply(slot, dumps({"detail": "Writer restarted"}), 503)
+        if orphaned:
+            logger.warning(f"⚠️ {len(orphaned)} peticiones compartidas interrumpidas por el relevo del escritor")
+
+    async def _execute(self, slot: int, generation: int):
+        data, length = self.region["data"], self.region["length"]
+        try:
+            request = loads(data[slot, :int(length[slot])].tobytes())
+            result, status = await self._invoke(request["op"], request["payload"]), 200
+        except HTTPException as e:
+            result, status = {"detail": e.detail}, e.status_code
+        except Exception as e:
+            logger.exception(f"Error en la operación compartida de la ranura {slot}")
+            result, status = {"detail": f"{type(e).__name__}: {e}"}, 500
+        body = dumps(result)
+        if len(body) > self.slot_bytes:
+            body, status = dumps({"detail": "Response too large for the shared channel"}), 500
+        with self._claim_lock:
+            if self.region["generation"][slot] == generation:
+                self._reply(slot, body, status)
+
+    def _reply(self, slot: int, body: bytes, status: int):
+        """Publica la respuesta de una ranura RUNNING, o la libera si su llamante ya la abandonó."""
+        state = self.region["state"]
+        if state[slot] == ABANDONED:
+            state[slot] = FREE
+            return
+        self.region["data"][slot, :len(body)] = np.frombuffer(body, np.uint8)
+        self.region["length"][slot] = len(body)
+        self.region["status"][slot] = status
+        state[slot] = DONE
+        _notify(self._fifo(int(self.region["owner"][slot])))
+
+
+async def run_as_writer(lease: WriterLease, *loops: Callable[[], Awaitable[None]]):
+    """Espera a ser el escritor (ya, o cuando caiga el actual) y lanza los bucles exclusivos del escritor."""
+    await lease.wait()
+    await asyncio.gather(*(loop() for loop in loops))
@@ -0,0 +1,67 @@
+import hashlib
+import json
+from typing import Any, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+
+    def dumps(data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    loads = orjson.loads
+except ImportError:
+    def dumps(data: Any) -> bytes:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+    loads = json.loads
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """¿Coincide If-None-Match con el ETag? Admite "*", varias etiquetas y la forma débil (W/"...")."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # La forma débil la añaden algunos proxies; para un GET basta la comparación débil (RFC 9110).
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class Snapshot:
+    """
+    Respuesta JSON precalculada para endpoints de solo lectura que cambian por ticks.
+
+    `update()` se llama cuando cambia el estado (tick de simulación, ingesta...): serializa
+    una vez y calcula el ETag. `response()` devuelve esos bytes tal cual, o 304 si el
+    cliente envía If-None-Match con el ETag vigente.
+    """
+
+    def __init__(self, data: Optional[Any] = None):
+        self.body = b"null"
+        self.etag = ""
+        self.updates = 0
+        if data is not None:
+            self.update(data)
+
+    def update(self, data: Any) -> bool:
+        """Publica el nuevo estado; devuelve False si los bytes no han cambiado (se conserva el ETag)."""
+        body = dumps(data)
+        if body == self.body:
+            return False
+        self.body = body
+        self.etag = make_etag(body)
+        self.updates += 1
+        return True
+
+    def response(self, request: Optional[Request] = None) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if request is not None and etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
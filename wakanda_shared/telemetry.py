@@ -1,23 +1,120 @@
-from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from prometheus_fastapi_instrumentator import Instrumentator
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
 from fastapi import FastAPI
 
+logger = logging.getLogger("telemetry")
+
+# deferred: la instrumentación se carga en segundo plano tras el arranque (no retrasa el /health).
+# eager: se carga al importar el servicio (comportamiento anterior). off: sin telemetría.
+TELEMETRY_MODE = os.getenv("TELEMETRY_MODE", "deferred").lower()
+JAEGER_HOST = os.getenv("JAEGER_HOST", "jaeger")
+
+# Muestreo: "" (OTEL_TRACES_SAMPLER del SDK, por defecto todo), always_on, ratio o rate_limited.
+SAMPLER = os.getenv("TELEMETRY_SAMPLER", "").lower()
+SAMPLE_RATIO = float(os.getenv("TELEMETRY_SAMPLE_RATIO", 0.1))
+SAMPLE_RATE = float(os.getenv("TELEMETRY_SAMPLE_RATE", 10.0))  # trazas/s en rate_limited
+# En rate_limited se exportan además todas las peticiones con error o que duren al menos esto.
+SLOW_REQUEST_MS = float(os.getenv("TELEMETRY_SLOW_REQUEST_MS", 500.0))
+# Rutas sin trazas (expresiones separadas por comas): sondas del registro y scrapes de Prometheus.
+EXCLUDED_URLS = os.getenv("TELEMETRY_EXCLUDED_URLS", "/health,/metrics")
+
+# BatchSpanProcessor (mismos valores por defecto que el SDK).
+BSP_MAX_QUEUE_SIZE = int(os.getenv("TELEMETRY_BSP_MAX_QUEUE_SIZE", 2048))
+BSP_MAX_EXPORT_BATCH_SIZE = int(os.getenv("TELEMETRY_BSP_MAX_EXPORT_BATCH_SIZE", 512))
+BSP_SCHEDULE_DELAY_MS = float(os.getenv("TELEMETRY_BSP_SCHEDULE_DELAY_MS", 5000))
+BSP_EXPORT_TIMEOUT_MS = float(os.getenv("TELEMETRY_BSP_EXPORT_TIMEOUT_MS", 30000))
+
+# Parámetros de ruta que pueden aparecer en la etiqueta `handler`, con su predicado de admisión.
+LabelParams = Dict[str, Callable[[str], bool]]
+
+
+def _load_instrumentation():
+    # OpenTelemetry (sobre todo el exportador gRPC y pkg_resources) tarda ~0,3 s en importarse.
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from prometheus_fastapi_instrumentator import Instrumentator
+    from wakanda_shared import http_metrics, sampling
+    return (trace, TracerProvider, BatchSpanProcessor, OTLPSpanExporter, FastAPIInstrumentor, Instrumentator,
+            http_metrics, sampling)
+
 
-def setup_telemetry(app: FastAPI, service_name: str, jaeger_host: str = "jaeger", jaeger_port: int = 4317):
+def _instrument(app: FastAPI, service_name: str, jaeger_host: str, jaeger_port: int, modules,
+                label_params: Optional[LabelParams] = None, span_exporter=None, metrics_registry=None,
+                sampler: Optional[str] = None) -> None:
+    (trace, TracerProvider, BatchSpanProcessor, OTLPSpanExporter, FastAPIInstrumentor, Instrumentator,
+     http_metrics, sampling) = modules
+    sampler = SAMPLER if sampler is None else sampler
 
-    provider = TracerProvider()
+    provider = TracerProvider(sampler=sampling.build_sampler(sampler, SAMPLE_RATIO, SAMPLE_RATE))
 
-    processor = BatchSpanProcessor(OTLPSpanExporter(endpoint=f"http://{jaeger_host}:{jaeger_port}"))
+    processor = BatchSpanProcessor(
+        span_exporter or OTLPSpanExporter(endpoint=f"http://{jaeger_host}:{jaeger_port}"),
+        max_queue_size=BSP_MAX_QUEUE_SIZE,
+        max_export_batch_size=BSP_MAX_EXPORT_BATCH_SIZE,
+        schedule_delay_millis=BSP_SCHEDULE_DELAY_MS,
+        export_timeout_millis=BSP_EXPORT_TIMEOUT_MS,
+    )
+    if sampler == "rate_limited":
+        processor = sampling.TailKeepSpanProcessor(processor, SLOW_REQUEST_MS / 1000)
     provider.add_span_processor(processor)
 
     trace.set_tracer_provider(provider)
 
-    FastAPIInstrumentor.instrument_app(app)
+    # Si la app ya arrancó, Starlette no admite middleware nuevo: se descarta la pila construida
+    # y la siguiente petición la reconstruye con la instrumentación incluida.
+    app.middleware_stack = None
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=provider, excluded_urls=EXCLUDED_URLS)
+
+    registry_kwargs = {} if metrics_registry is None else {"registry": metrics_registry}
+    instrumentator = Instrumentator(excluded_handlers=["/metrics"], **registry_kwargs)
+    instrumentator.add(http_metrics.http_metrics(label_params, **registry_kwargs))
+    instrumentator.instrument(app).expose(app)
+
+    print(f"🔭 Telemetría configurada para: {service_name}")
+
+
+async def _instrument_in_background(app: FastAPI, service_name: str, jaeger_host: str, jaeger_port: int,
+                                    **options):
+    try:
+        # Los imports pesados van a un hilo; el montaje (barato) se hace en el bucle de eventos.
+        modules = await asyncio.get_running_loop().run_in_executor(None, _load_instrumentation)
+        _instrument(app, service_name, jaeger_host, jaeger_port, modules, **options)
+    except Exception as e:
+        logger.error(f"❌ No se pudo configurar la telemetría de {service_name}: {e}")
+
+
+def setup_telemetry(app: FastAPI, service_name: str, jaeger_host: str = JAEGER_HOST, jaeger_port: int = 4317,
+                    label_params: Optional[LabelParams] = None, mode: str = TELEMETRY_MODE, **options):
+    """
+    Trazas (OTLP → Jaeger) y métricas de Prometheus en /metrics.
+
+    `label_params` acota la etiqueta `handler` de las rutas con parámetros libres (ver
+    wakanda_shared.http_metrics). `options` (span_exporter, metrics_registry, sampler) permite a
+    los benchmarks sustituir el exportador, el registro de métricas o el muestreo.
+    """
+    options["label_params"] = label_params
+    if mode == "off":
+        return
+    if mode == "eager":
+        _instrument(app, service_name, jaeger_host, jaeger_port, _load_instrumentation(), **options)
+        return
+
+    # Se envuelve el lifespan del servicio: en cuanto termina su arranque se lanza la carga.
+    service_lifespan = app.router.lifespan_context
 
-    Instrumentator().instrument(app).expose(app)
+    @asynccontextmanager
+    async def lifespan_with_telemetry(app_):
+        async with service_lifespan(app_) as state:
+            task = asyncio.create_task(_instrument_in_background(app, service_name, jaeger_host, jaeger_port,
+                                                                 **options))
+            yield state
+            task.cancel()
 
-    print(f"🔭 Telemetría configurada para: {service_name}")
\ No newline at end of file
+    app.router.lifespan_context = lifespan_with_telemetry